@@ -0,0 +1,40 @@
+"""Micro-benchmark of the App Home view templates.
+
+Compares the cost of home.home_view when every block is built from scratch, as before the blocks were memoized, with
+the cost when the view is assembled from cached blocks, as on every App Home open after the first.
+
+Run it from the root of the component, with the package installed:
+    python benchmarks/home_view_benchmark.py
+"""
+
+import timeit
+
+from paper_recommender.slack_templates import home
+
+PROJECTS = [
+    {"project_id": f"{index:024x}", "title": f"Project {index}", "description": "A project description. " * 40}
+    for index in range(5)
+]
+
+
+def uncached():
+    """Build the view with empty caches, as every call did before the blocks were memoized."""
+    home._project_blocks.cache_clear()
+    home._add_project_blocks.cache_clear()
+    return home.home_view(PROJECTS, True)
+
+
+def cached():
+    """Assemble the view from the cached blocks."""
+    return home.home_view(PROJECTS, True)
+
+
+def main(number: int = 20000):
+    assert uncached() == cached()
+    for name, function in (("uncached", uncached), ("cached", cached)):
+        seconds = min(timeit.repeat(function, number=number, repeat=5)) / number
+        print(f"home_view with {len(PROJECTS)} projects, {name}: {seconds * 1e6:.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark of the page parsing of the scraping extractors.
+
+Compares the per-page time of each extractor's extract_from_response with the implementation before the fast parser,
+which built the full tree of the page with html.parser, on saved pages named after the extractor modules, e.g.
+"nature.html". The fixture pages of the tests are used by default. The JMLR, IJCAI and NeurIPS pages follow the markup
+of the real pages, trimmed; the others reproduce the structure of their source with synthetic content. Real pages can
+be saved to another directory, e.g. with curl, and passed as an argument.
+
+Run it from the root of the component, with the package installed:
+    python benchmarks/page_parser_benchmark.py [pages_dir]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+from bs4 import BeautifulSoup
+from requests import Response
+
+from paper_recommender.paper_extraction import page_parser
+from paper_recommender.paper_extraction.aaai import AAAI
+from paper_recommender.paper_extraction.acl_anthology import ACLAnthology
+from paper_recommender.paper_extraction.ijcai import IJCAI
+from paper_recommender.paper_extraction.jmlr import JMLR
+from paper_recommender.paper_extraction.nature import Nature
+from paper_recommender.paper_extraction.neurips import NeurIPS
+from paper_recommender.paper_extraction.pmlr import PMLR
+
+EXTRACTORS = {
+    "nature": Nature,
+    "pmlr": PMLR,
+    "jmlr": JMLR,
+    "ijcai": IJCAI,
+    "aaai": AAAI,
+    "neurips": NeurIPS,
+    "acl_anthology": ACLAnthology,
+}
+DEFAULT_PAGES = Path(__file__).parent.parent.parent.parent / "tests/test_paper_recommender/fixtures"
+
+
+def before(extractor, response: Response):
+    """The extraction before the fast parser."""
+    soup = BeautifulSoup(response.content, "html.parser")
+    return extractor._extract_abstract(soup), extractor._extract_title(soup), extractor._extract_authors(soup)
+
+
+def main(pages_dir: Path, number: int = 20):
+    print(f"parser: {page_parser.FAST_PARSER}")
+    for name, extractor in EXTRACTORS.items():
+        path = pages_dir / f"{name}.html"
+        if not path.exists():
+            continue
+        response = Response()
+        response.status_code = 200
+        response._content = path.read_bytes()
+        old = min(timeit.repeat(lambda: before(extractor, response), number=number, repeat=3)) / number
+        new = (
+            min(timeit.repeat(lambda: extractor.extract_from_response(str(path), response), number=number, repeat=3))
+            / number
+        )
+        print(
+            f"{name:14} {len(response.content) / 1024:6.0f} KiB: "
+            f"{old * 1000:6.2f} ms before, {new * 1000:6.2f} ms after ({old / new:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES)
@@ -5,44 +5,25 @@ Handles all the events and actions that the app is subscribed to.
 
 import os
 import logging
-import datetime
-import configparser
-from pathlib import Path
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
 
 # Use the slack_bolt package to create the app
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-# from slack_bolt.async_app import AsyncApp
-# from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-
-from .paper_extraction.from_url import extract_abstract_from_url, known_domain
-from .engine.open_ai import paper_recommendation
+from .settings import configs, configure_logging
+from .paper_extraction.from_url import known_domain
+from .paper_extraction.pdf import extract_from_slack_file, shared_in_channel
 from .mangodb import crud as db_crud
-from .slack_templates import home, modal, message as message_block
-
-
-### Load the configurations from the configs.ini file ###
-project_dir = Path(__file__).parent.parent.parent
-config_path = (project_dir / "configs/configs.ini").resolve()
-configs = configparser.ConfigParser(allow_no_value=True)
-configs.read(config_path)
-if not configs["App"]["app_log"]:
-    Path(str((project_dir / "logs").resolve())).mkdir(parents=True, exist_ok=True)
-    configs["App"]["app_log"] = str((project_dir / "logs/app.log").resolve())
-if not configs["App"]["unknown_domains"]:
-    configs["App"]["unknown_domains"] = str((project_dir / "logs/unknown_domains.txt").resolve())
-
-### Initialise the app and database ###
-# create a MongoClient instance
-# Set the Stable API version when creating a new client
-mongo_client = MongoClient(configs["App"]["mongodb_connect_str"], server_api=ServerApi("1"))  # type: MongoClient
-# connect to the paper_recommender database
-# A new database with the specified name will be created if it doesn't exist, when inserting a document
-db = mongo_client["paper_recommender"]
-
+from .mangodb.indexes import ensure_indexes, find_collection_scans
+from .slack_templates import home, modal
+from .delivery import feedback_recommendation_id
+from .home_publisher import HomePublisher
+from .pipeline import resolve_extracted_paper, get_project_targets, log_fetches_saved
+from .recommender import db, dm_sender, recommend_papers, recommend_resolved_papers
+
+### Initialise the app ###
 # Initialize the app with the bot token and signing secret
 # Signing secret token is only used when the standard http mode is used,
 # instead of Socket model.
@@ -52,29 +33,52 @@ app = App(
     token=os.environ.get("SLACK_BOT_TOKEN"),
     signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),  # not used since we are using Socket Mode
 )
-# app = AsyncApp(
-#     token=os.environ.get("SLACK_BOT_TOKEN"),
-#     signing_secret=os.environ.get("SLACK_SIGNING_SECRET")
-# )
+# Messages are processed outside the listener threads, so that Slack events are acknowledged immediately.
+# The engine calls of a message are fanned out to a separate pool (see recommender.py), bounded by the
+# `max_concurrency` setting. The two pools are separate so that a message waiting on its engine calls can never
+# starve the engine pool.
+message_executor = ThreadPoolExecutor(
+    max_workers=configs["App"].getint("message_workers", fallback=4), thread_name_prefix="message"
+)
+# The PDF files shared in the channels are downloaded and parsed by their own pool, so that large files cannot hold
+# up the messages with URLs.
+pdf_executor = ThreadPoolExecutor(
+    max_workers=configs["App"].getint("pdf_workers", fallback=2), thread_name_prefix="pdf"
+)
+
+
+def render_home_view(user_id: str) -> dict:
+    """Renders the home view of a user from their current projects.
+
+    Args:
+        user_id: The user ID.
+
+    Returns:
+        The home view of the user.
+    """
+    # get projects of the user, and whether the user exists, with a single (cached) query
+    projects, exists = db_crud.get_user_projects(db, user_id)
+    return home.home_view(projects, exists)
+
+
+# The home views are published by views.publish, which is the method that the app uses to push a view to the Home
+# tab. The publishes for a user within `home_publish_seconds` are collapsed into one, and unchanged views are skipped.
+home_publisher = HomePublisher(
+    app.client.views_publish,
+    render_home_view,
+    window=configs["App"].getfloat("home_publish_seconds", fallback=0.5),
+)
 
 
 # open app home view
 @app.event("app_home_opened")
-def home_tab(client, event, logger):
+def home_tab(event):
     """Displays the app's app home when the user opens the app's app home.
 
     Shows the projects of the user if any exists.
     """
-    try:
-        # the user that opened the app's app home
-        user_id = event["user"]
-        # get projects of the user
-        projects = db_crud.get_projects_for_user(db, user_id)
-
-        # views.publish is the method that the app uses to push a view to the Home tab
-        client.views_publish(user_id=user_id, view=home.home_view(projects, db_crud.user_exists(db, user_id)))
-    except Exception:
-        logger.exception("Error publishing home tab.")
+    # the user that opened the app's app home
+    home_publisher.schedule(event["user"])
 
 
 # open a modal view for the user to enter the project description
@@ -94,26 +98,21 @@ def open_home_modal(ack, body, client):
 
 # handles requests to delete a project for user
 @app.action("delete_project")
-def delete_user_project(ack, body, say, client, logger):
+def delete_user_project(ack, body, say):
     """Delete a project for user."""
     ack()
     user_id = body["user"]["id"]
     if not db_crud.delete_project(db, user_id, body["actions"][0]["block_id"]):
         say(channel=user_id, text="Error deleting the project... Please contact the APP developer.")
     else:
-        # update the home tab with the project description
-        try:
-            projects = db_crud.get_projects_for_user(db, user_id)
-            # views.publish is the method that the app uses to push a view to the Home tab
-            client.views_publish(user_id=user_id, view=home.home_view(projects, True))
-        except Exception:
-            logger.exception("Error updating home tab with new project.")
+        # update the home tab without the project
+        home_publisher.schedule(user_id)
 
 
 # Handle a modal view_submission request for creating a new project
 # refer to the correct callback_id of a modal view
 @app.view("project_modal")
-def handle_home_submission(ack, body, client, view, logger):
+def handle_home_submission(ack, body, view):
     """Handles the request for creating a new project.
 
     Add a new project for user in the database and updates the home tab with the new project information.
@@ -152,11 +151,7 @@ def handle_home_submission(ack, body, client, view, logger):
     ack()
 
     # update the home tab with the new project
-    try:
-        projects = db_crud.get_projects_for_user(db, user_id)
-        client.views_publish(user_id=user_id, view=home.home_view(projects, True))
-    except Exception:
-        logger.exception("Error updating home tab with new project.")
+    home_publisher.schedule(user_id)
 
 
 # This will match any message posted in the subscribed channels that contains a URL
@@ -181,6 +176,10 @@ def extract_urls(say, message, logger):
     Both papers and recommendations are recorded in the database. If the URL contains unknown domains it will
     be ignored, however, the domain and the URL are logged for further investigation and future decision of
     adding new sources for papers.
+
+    The event is acknowledged as soon as the URLs are extracted. The rest of the work is handed over to the
+    message executor so that the listener thread is not blocked by the paper extraction and the engine. If the
+    `job_queue` setting is enabled, the work is enqueued in the database instead, and done by the worker processes.
     """
     # extract urls from the message
     urls = []
@@ -190,100 +189,28 @@ def extract_urls(say, message, logger):
                 url = el["url"]
                 if known_domain(url, configs["App"]["unknown_domains"]):
                     urls.append(url)
+    if not urls:
+        return
 
-    try:
-        # if the message starts with "#dev", only send the message to the message sender
-        if message["text"].startswith("#dev"):
-            users_curser = db.users.find(
-                {
-                    "_id": message["user"],
-                },
-                projection={
-                    "_id": 1,
-                    "projects": 1,
-                    "vip": 1,
-                },
-            )
+    # with the job queue, the message is processed by a worker process (see worker.py), which survives restarts
+    if configs["App"].getboolean("job_queue", fallback=False):
+        if not db_crud.enqueue_job(db, message, urls):
+            logger.error("Failed to enqueue the URLs of message '%s'; processing them in this process.", message["ts"])
         else:
-            # get all users
-            users_curser = db.users.find(
-                projection={
-                    "_id": 1,
-                    "projects": 1,
-                    "vip": 1,
-                }
-            )
-        # iterate over the curser object of all users to get the user id and project description
-        # NOTE: curser object is not list; it can only be iterated once and indexing would be very inefficient
-        for user in users_curser:
-            for project in user["projects"]:
-                user_id, project_description, project_id, vip_status = (
-                    user["_id"],
-                    project["description"],
-                    project["project_id"],
-                    user["vip"],
-                )
-
-                for url in urls:
-                    # extract paper info from the url
-                    paper = extract_abstract_from_url(url)
-                    if paper:
-                        # record the paper in the database
-                        paper_id = db_crud.insert_paper(db, paper)
-                        # if not paper_id it means paper insertion or retrieval failed
-                        # in that case, skip the recommendation process
-                        if not paper_id:
-                            continue
-
-                        recommendation = paper_recommendation(project_description, paper.abstract, configs)
-                        if recommendation is None:
-                            continue
-                        decision, explanation = recommendation.decision, recommendation.explanation
-                        # record recommendation history regardless of the decision
-                        record = {
-                            "user_id": user_id,
-                            "project_id": project_id,
-                            "paper_id": paper_id,
-                            "project_description": project_description,
-                            "paper_abstract": paper.abstract,
-                            "paper_url": url,
-                            "recommend": decision,
-                            "explanation": explanation,
-                            "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
-                        }
-                        recommendation_id = db_crud.insert_recommendation(db, record)
-                        # if recommendation insertion failed, skip the message posting
-                        if not recommendation_id:
-                            continue
-
-                        # send a private message to the user if it is a recommendation
-                        if decision:
-                            say(
-                                channel=user_id,
-                                blocks=message_block.positive_recommendation_block(user_id, url, explanation),
-                                text=(
-                                    f"Hi there, <@{user_id}>! Here is a paper you might be "
-                                    f"interested in: {url}\n{explanation}"
-                                ),  # fallback text
-                                metadata={
-                                    "event_type": "recommendation_created",
-                                    "event_payload": {"recommendation_id": str(recommendation_id)},
-                                },
-                            )
-                        else:
-                            if vip_status:
-                                say(
-                                    channel=user_id,
-                                    blocks=message_block.negative_recommendation_block(user_id, url, explanation),
-                                    text=(
-                                        f"Hi there, <@{user_id}>! I don't think this paper is relevant to "
-                                        f"your project, but you might disagree: {url}\n{explanation}"
-                                    ),  # fallback text
-                                    metadata={
-                                        "event_type": "recommendation_created",
-                                        "event_payload": {"recommendation_id": str(recommendation_id)},
-                                    },
-                                )
+            return
+    message_executor.submit(process_message, message, urls, logger)
+
+
+def process_message(message: dict, urls: List[str], logger: logging.Logger):
+    """Recommends the papers shared in a message to users, logging any error instead of raising it.
+
+    Args:
+        message: The Slack message event.
+        urls: The URLs of known domains extracted from the message.
+        logger: The logger of the listener that received the message.
+    """
+    try:
+        recommend_papers(message, urls)
     except Exception:
         logger.exception("Failed to post the recommendation message.")
 
@@ -317,43 +244,65 @@ def handle_message_im_events(say, event):
         )
 
 
-##### Replace this with the new event handler or remove file_shared event type #####
+# Handles papers shared in PDF files
 @app.event("file_shared")
-def handle_file_shared_events(body, logger):
-    """Logs file_shared events from the subscribed channel."""
-    logger.info(body)
+def extract_pdfs(event, logger):
+    """Handles the event whenever someone shares a pdf file in subscribed channels.
 
+    It extracts paper information from the shared PDF file, including the abstract. A recommendation engine is
+    then used to recommend the paper to users based on their project descriptions, along with explanations.
+    The recommmendation is sent through Slack private channels to the users. Both papers and recommendations are
+    recorded in the database.
 
-# Handles papers shared in PDF files
-# @app.event("file_shared")
-# def extract_pdfs(say, client, event, logger):
-#     """Handles the event whenever someone shares a pdf file in subscribed channels.
-
-#     It extracts paper information from the shared PDF file, including the abstract. A recommendation engine is
-#     then used to recommend the paper to users based on their project descriptions, along with explanations.
-#     The recommmendation is sent through Slack private channels to the users. Both papers and recommendations are
-#     recorded in the database.
-
-#     By default, a message is only sent to users if the paper is recommended. However, if the user is a VIP member,
-#     they will receive messages regardless of the recommendation decision. All messages will include buttons for the
-#     user to provide feedback on the recommendation.
-
-#     By adding "#dev" at the beginning of the message, the message will only be sent to the message sender. This is a
-#     feature for development and testing purposes, to avoid spaming users.
-#     """
-#     try:
-#         file_id = event["file_id"]
-#         file = client.files_info(file=file_id)
-#         if not file["ok"]:
-#             raise ValueError("Failed to retrieve the file information.")
-#         file = file["file"]
-#         if file["filetype"] != "pdf":
-#             return
-#         url = file["url_private"]
-#         url_download = file["url_private_download"]
-
-#     except Exception:
-#         logger.exception("Failed to post the recommendation message.")
+    By default, a message is only sent to users if the paper is recommended. However, if the user is a VIP member,
+    they will receive messages regardless of the recommendation decision. All messages will include buttons for the
+    user to provide feedback on the recommendation.
+
+    As for the links, only the files shared in public channels are handled; files shared in private channels and
+    direct messages are ignored.
+
+    The event is acknowledged immediately. The file is downloaded and parsed by the PDF executor, bounded by the
+    `pdf_workers` setting, and files larger than `pdf_max_mb` are ignored.
+
+    By adding "#dev" at the beginning of the comment of the file, the message will only be sent to the user who
+    shared the file. This is a feature for development and testing purposes, to avoid spaming users.
+    """
+    pdf_executor.submit(process_pdf, event["file_id"], event.get("channel_id"), logger)
+
+
+def process_pdf(file_id: str, channel_id: Union[str, None], logger: logging.Logger):
+    """Recommends the paper shared in a PDF file to users, logging any error instead of raising it.
+
+    Args:
+        file_id: The ID of the shared file.
+        channel_id: The channel of the file_shared event.
+        logger: The logger of the listener that received the event.
+    """
+    try:
+        file = app.client.files_info(file=file_id)["file"]
+        if file.get("filetype") != "pdf" or not shared_in_channel(file, channel_id):
+            return
+        comment = file.get("initial_comment", {}).get("comment", "")
+        if comment.startswith("#dev"):
+            targets = get_project_targets(db, file["user"])
+        else:
+            targets = get_project_targets(db)
+
+        # the file is only downloaded if the paper is not already in the database
+        resolved = resolve_extracted_paper(
+            db,
+            file["permalink"],
+            lambda: extract_from_slack_file(
+                file,
+                app.client.token,
+                max_bytes=int(configs["App"].getfloat("pdf_max_mb", fallback=20) * 1024 * 1024),
+                max_pages=configs["App"].getint("pdf_max_pages", fallback=2),
+            ),
+        )
+        log_fetches_saved(resolved, len(targets))
+        recommend_resolved_papers(targets, resolved)
+    except Exception:
+        logger.exception("Failed to recommend the paper shared in the PDF file '%s'.", file_id)
 
 
 # respond to joining Lab-Rats VIP Club!
@@ -407,7 +356,7 @@ def positive_feedback(ack, body):
     Updates the associated recommendation in the database with the user's feedback.
     """
     ack()
-    recommendation_id = body["message"]["metadata"]["event_payload"]["recommendation_id"]
+    recommendation_id = feedback_recommendation_id(body)
     # update the database with the user's feedback
     db_crud.update_recommendation_feedback(db, recommendation_id, True)
 
@@ -420,7 +369,7 @@ def negative_feedback(ack, body):
     Updates the associated recommendation in the database with the user's feedback.
     """
     ack()
-    recommendation_id = body["message"]["metadata"]["event_payload"]["recommendation_id"]
+    recommendation_id = feedback_recommendation_id(body)
 
     # update the database with the user's feedback
     db_crud.update_recommendation_feedback(db, recommendation_id, False)
@@ -434,7 +383,7 @@ def open_feedback_modal(ack, body, client):
     Creates a modal view for the user to enter their explanation for the negative feedback.
     """
     ack()
-    recommendation_id = body["message"]["metadata"]["event_payload"]["recommendation_id"]
+    recommendation_id = feedback_recommendation_id(body)
 
     # open modal view for the user to enter feedback explanation
     client.views_open(
@@ -475,11 +424,6 @@ def handle_message_events(body, logger):
     logger.info(body)
 
 
-# async def start_app():
-#     handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
-#     await handler.start_async()
-
-
 def start_app():
     """Entry point to start the Slack app. Once the package has been installed using pip,
     the app can be started by simply running `paper_recommender` in the terminal.
@@ -505,14 +449,15 @@ def start_app():
 
     Other configurations are set in the /configs/configs.ini file.
     The required one is the connection string to the MongoDB database.
+
+    An asynchronous version of the app, which handles many events concurrently in a single thread, is started with
+    `paper_recommender_async` instead (see async_app.py).
     """
     # set up logging level and location
-    logging.basicConfig(
-        level=logging.WARNING,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%d/%m/%Y %H:%M:%S %z",
-        filename=configs["App"]["app_log"],
-    )
+    configure_logging()
+    # create the indexes needed by the queries of the app, and report the queries that still scan whole collections
+    ensure_indexes(db)
+    find_collection_scans(db)
 
     # The HTTP server is using a built-in development adapter, which is responsible for
     # handling and parsing incoming events from Slack.
@@ -530,11 +475,11 @@ def start_app():
     handler = SocketModeHandler(
         app, os.environ["SLACK_APP_TOKEN"]
     )  # SLACK_APP_TOKEN must be used with Socket Mode. Will be automatically searched if not provided.
-    handler.start()
-
-    # # async app
-    # import asyncio
-    # asyncio.run(main())
+    try:
+        handler.start()
+    finally:
+        # send the recommendations still waiting for their coalescing window
+        dm_sender.flush(timeout=configs["App"].getfloat("dm_coalesce_seconds", fallback=5) * 2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,552 @@
+"""Asynchronous entry point for the paper_recommender Slack app.
+
+Handles the same events and actions as app.py, but every listener is a coroutine running on a single event loop:
+the paper extractors use a shared httpx.AsyncClient, the database is accessed through Motor and the engine uses the
+async OpenAI client. A listener therefore never blocks a Socket Mode worker thread while waiting on the network, and
+many messages with URLs can be processed concurrently by one process.
+"""
+
+import os
+import asyncio
+import logging
+import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set, Union
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+# Use the async version of the slack_bolt app and Socket Mode adapter
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+from .settings import configs, configure_logging
+from .paper_extraction.from_url import known_domain
+from .paper_extraction.http_session import close_async_client
+from .paper_extraction.pdf import extract_from_slack_file, shared_in_channel
+from .engine.base import RecommendationOutput
+from .engine.open_ai import async_paper_recommendation, async_paper_recommendation_batch
+from .mangodb import async_crud as db_crud
+from .mangodb.indexes import ensure_indexes, find_collection_scans
+from .slack_templates import home, modal
+from .delivery import AsyncDirectMessageSender, RecommendationItem, feedback_recommendation_id
+from .home_publisher import AsyncHomePublisher
+from .pipeline import (
+    ProjectTarget,
+    ResolvedPaper,
+    MessagePapers,
+    PendingDelivery,
+    RecommendationBuffer,
+    log_fetches_saved,
+    all_pairs,
+)
+from .async_pipeline import (
+    async_resolve_papers,
+    async_resolve_extracted_paper,
+    async_get_project_targets,
+    async_fan_out_batch_recommendations,
+    async_prefilter_pairs,
+)
+
+logger = logging.getLogger(__name__)
+
+
+### Initialise the app and database ###
+# Motor connects lazily, so the client can be created before the event loop is running
+mongo_client = AsyncIOMotorClient(
+    configs["App"]["mongodb_connect_str"], server_api=ServerApi("1")
+)  # type: AsyncIOMotorClient
+db = mongo_client["paper_recommender"]
+
+app = AsyncApp(
+    token=os.environ.get("SLACK_BOT_TOKEN"),
+    signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),  # not used since we are using Socket Mode
+)
+# the engine calls of all the messages share this bound, set by the `max_concurrency` setting
+# created in start_app, so that it is bound to the running event loop
+engine_semaphore = None  # type: Union[asyncio.Semaphore, None]
+# keep a reference to the running message tasks, so that they are not garbage collected before completion
+message_tasks = set()  # type: Set[asyncio.Task]
+# the shared PDF files are downloaded and parsed in their own threads, bounded by the `pdf_workers` setting
+pdf_executor = ThreadPoolExecutor(
+    max_workers=configs["App"].getint("pdf_workers", fallback=2), thread_name_prefix="pdf"
+)
+# the recommendation messages are coalesced per user and sent within the rate limits of chat.postMessage
+dm_sender = AsyncDirectMessageSender(
+    app.client.chat_postMessage,
+    rate=configs["App"].getfloat("dm_rate_per_second", fallback=5),
+    burst=configs["App"].getint("dm_burst", fallback=10),
+    window=configs["App"].getfloat("dm_coalesce_seconds", fallback=5),
+    max_retries=configs["App"].getint("dm_max_retries", fallback=3),
+)
+
+
+async def render_home_view(user_id: str) -> dict:
+    """Async version of app.render_home_view."""
+    projects, exists = await db_crud.get_user_projects(db, user_id)
+    return home.home_view(projects, exists)
+
+
+# the publishes of a user's home view within `home_publish_seconds` are collapsed into one
+home_publisher = AsyncHomePublisher(
+    app.client.views_publish,
+    render_home_view,
+    window=configs["App"].getfloat("home_publish_seconds", fallback=0.5),
+)
+
+
+# the listener matchers of an AsyncApp must be coroutine functions
+async def in_channel(event) -> bool:
+    """Matches the events from channels."""
+    return event["channel_type"] == "channel"
+
+
+async def in_direct_message(event) -> bool:
+    """Matches the events from direct messages."""
+    return event["channel_type"] == "im"
+
+
+# open app home view
+@app.event("app_home_opened")
+async def home_tab(event):
+    """Displays the app's app home when the user opens the app's app home.
+
+    Shows the projects of the user if any exists.
+    """
+    home_publisher.schedule(event["user"])
+
+
+# open a modal view for the user to enter the project description
+@app.action("add_project")
+async def open_home_modal(ack, body, client):
+    """Opens a modal view for the user to enter or update the project description."""
+    await ack()
+    await client.views_open(trigger_id=body["trigger_id"], view=modal.project_modal())
+
+
+# handles requests to delete a project for user
+@app.action("delete_project")
+async def delete_user_project(ack, body, say):
+    """Delete a project for user."""
+    await ack()
+    user_id = body["user"]["id"]
+    if not await db_crud.delete_project(db, user_id, body["actions"][0]["block_id"]):
+        await say(channel=user_id, text="Error deleting the project... Please contact the APP developer.")
+    else:
+        home_publisher.schedule(user_id)
+
+
+# Handle a modal view_submission request for creating a new project
+@app.view("project_modal")
+async def handle_home_submission(ack, body, view):
+    """Handles the request for creating a new project.
+
+    Add a new project for user in the database and updates the home tab with the new project information.
+    If the user does not exist, a new user is created first, then add the new project.
+    """
+    project_description = view["state"]["values"]["input_description"]["ml_input"]["value"]
+    project_title = view["state"]["values"]["input_title"]["sl_input"]["value"]
+    user_id = body["user"]["id"]
+    # Validate the inputs
+    errors = {}
+    if project_description is None or len(project_description) < 10:
+        errors["input_description"] = "The project description seems too short. Was there a mistake?"
+        await ack(response_action="errors", errors=errors)
+        return
+    if project_title is None or len(project_title) < 1:
+        errors["input_title"] = "The project title seems too short. Was there a mistake?"
+        await ack(response_action="errors", errors=errors)
+        return
+
+    if not await db_crud.user_exists(db, user_id):
+        if not await db_crud.create_user(db, user_id):
+            errors["input_description"] = "Error creating a new user... Please contact the APP developer."
+            await ack(response_action="errors", errors=errors)
+            return
+    if not await db_crud.add_project(db, user_id, project_title, project_description):
+        errors["input_description"] = "Error updating the project description... Please contact the APP developer."
+        await ack(response_action="errors", errors=errors)
+        return
+
+    # Everything is ok. Acknowledge the view_submission request and close the modal
+    await ack()
+    home_publisher.schedule(user_id)
+
+
+# This will match any message posted in the subscribed channels that contains a URL
+@app.message(
+    r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+",
+    matchers=[in_channel],
+)
+async def extract_urls(say, message, logger):
+    """Handles the message event whenver someone posts a message with a URL in the subscribed channel.
+
+    Behaves as app.extract_urls. The message is processed in a separate task, so that the event is acknowledged as
+    soon as the URLs are extracted, and other events are handled while the papers are extracted and scored.
+    """
+    urls = []
+    for block in [block for block in message["blocks"] if "elements" in block]:
+        for element in [element for element in block["elements"] if "elements" in element]:
+            for el in [el for el in element["elements"] if el["type"] == "link"]:
+                url = el["url"]
+                # known_domain does not block: the unknown domains are written to the file by a background timer
+                if known_domain(url, configs["App"]["unknown_domains"]):
+                    urls.append(url)
+    if not urls:
+        return
+
+    task = asyncio.create_task(process_message(message, urls, logger))
+    message_tasks.add(task)
+    task.add_done_callback(message_tasks.discard)
+
+
+async def process_message(message: dict, urls: List[str], logger: logging.Logger):
+    """Recommends the papers shared in a message to users based on their project descriptions.
+
+    Async version of app.process_message. The engine calls of all the messages are bounded together by the
+    `max_concurrency` setting, and the private messages are queued to the DM sender as soon as each result is
+    recorded.
+
+    Args:
+        message: The Slack message event.
+        urls: The URLs of known domains extracted from the message.
+        logger: The logger of the listener that received the message.
+    """
+    try:
+        # if the message starts with "#dev", only send the message to the message sender
+        if message["text"].startswith("#dev"):
+            targets = await async_get_project_targets(db, message["user"])
+        else:
+            targets = await async_get_project_targets(db)
+
+        resolved = await async_resolve_papers(db, urls)
+        log_fetches_saved(resolved, len(targets))
+        await recommend_resolved_papers(targets, resolved)
+    except Exception:
+        logger.exception("Failed to post the recommendation message.")
+
+
+async def recommend_resolved_papers(targets: List[ProjectTarget], resolved: MessagePapers):
+    """Recommends resolved papers to the (user, project) pairs, and queues the private messages to the DM sender.
+
+    Async version of recommender.recommend_resolved_papers.
+
+    Args:
+        targets: The (user, project) pairs.
+        resolved: The papers resolved from a message or a shared file.
+    """
+    # only send the pairs that are similar enough to the engine, if the pre-filter is enabled
+    if configs["Engine"].getboolean("prefilter", fallback=False):
+        pairs = await async_prefilter_pairs(db, targets, resolved.papers, configs)
+    else:
+        pairs = all_pairs(targets, resolved.papers)
+    # the records are inserted in bulk, and the messages are sent once their records are inserted
+    buffer = RecommendationBuffer(
+        batch_size=configs["App"].getint("recommendation_batch_size", fallback=50),
+        flush_interval=configs["App"].getfloat("recommendation_flush_seconds", fallback=2),
+    )
+    batch_mode = configs["Engine"].get("mode", "two_calls") == "batch"
+    results = async_fan_out_batch_recommendations(
+        engine_semaphore or asyncio.Semaphore(configs["Engine"].getint("max_concurrency", fallback=8)),
+        pairs,
+        score_papers_batch,
+        batch_size=configs["Engine"].getint("batch_size", fallback=10) if batch_mode else 1,
+        token_budget=configs["Engine"].getint("batch_token_budget", fallback=12000),
+        flush_timeout=buffer.time_left,
+    )
+    # None is yielded when the oldest buffered recommendation is due, even if no other result has arrived
+    async for result in results:
+        if result is not None:
+            buffer.add(*result)
+        if buffer.ready():
+            await deliver_recommendations(buffer.take())
+    await deliver_recommendations(buffer.take())
+
+
+async def score_papers_batch(
+    targets: List[ProjectTarget],
+    resolved_paper: ResolvedPaper,
+) -> List[Union[RecommendationOutput, None]]:
+    """Scores a resolved paper against the projects of several (user, project) pairs using the engine.
+
+    Async version of recommender.score_papers_batch, using the same recommendation cache.
+
+    Args:
+        targets: The (user, project) pairs.
+        resolved_paper: The paper resolved from the shared URL.
+
+    Returns:
+        A list with a RecommendationOutput for each target. An item is None if the engine failed.
+    """
+    use_cache = configs["Engine"].getboolean("cache_recommendations", fallback=True)
+    recommendations = [None] * len(targets)  # type: List[Union[RecommendationOutput, None]]
+    keys = []  # type: List[dict]
+    if use_cache:
+        keys = [
+            db_crud.recommendation_cache_key(
+                target.project_description, resolved_paper.paper_id, configs["Engine"]["model"]
+            )
+            for target in targets
+        ]
+        recommendations = list(await asyncio.gather(*(db_crud.get_cached_recommendation(db, key) for key in keys)))
+
+    missing = [index for index, recommendation in enumerate(recommendations) if recommendation is None]
+    if not missing:
+        return recommendations
+    if configs["Engine"].get("mode", "two_calls") == "batch":
+        scored = await async_paper_recommendation_batch(
+            [targets[index].project_description for index in missing], resolved_paper.paper.abstract, configs
+        )
+    else:
+        scored = [
+            await async_paper_recommendation(targets[index].project_description, resolved_paper.paper.abstract, configs)
+            for index in missing
+        ]
+
+    for index, recommendation in zip(missing, scored):
+        recommendations[index] = recommendation
+        if use_cache and recommendation is not None:
+            await db_crud.cache_recommendation(
+                db,
+                keys[index],
+                recommendation,
+                ttl=datetime.timedelta(days=configs["Engine"].getfloat("cache_ttl_days", fallback=30)),
+                max_entries=configs["Engine"].getint("cache_max_entries", fallback=10000),
+            )
+    return recommendations
+
+
+async def deliver_recommendations(deliveries: List[PendingDelivery]):
+    """Records recommendations in bulk, then sends them to the users of their (user, project) pairs.
+
+    Async version of recommender.deliver_recommendations.
+
+    Args:
+        deliveries: The recommendations to be recorded and sent.
+    """
+    if not deliveries:
+        return
+    recommendation_ids = await db_crud.insert_recommendations(db, [delivery.record for delivery in deliveries])
+    for delivery, recommendation_id in zip(deliveries, recommendation_ids):
+        if recommendation_id:
+            send_recommendation(delivery.target, delivery.resolved_paper, delivery.recommendation, recommendation_id)
+
+
+def send_recommendation(
+    target: ProjectTarget,
+    resolved_paper: ResolvedPaper,
+    recommendation: RecommendationOutput,
+    recommendation_id: ObjectId,
+):
+    """Queues a recorded recommendation to be sent to the user of a (user, project) pair.
+
+    Async version of recommender.send_recommendation. It does not wait for the message to be sent.
+
+    Args:
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+        recommendation: The output of the engine.
+        recommendation_id: The ID of the recommendation record, used to record the feedback on the message.
+    """
+    if recommendation.decision or target.vip:
+        dm_sender.submit(
+            target.user_id,
+            RecommendationItem(
+                recommendation.decision, resolved_paper.url, recommendation.explanation, str(recommendation_id)
+            ),
+        )
+
+
+# handle message events in direct messages
+@app.event(
+    "message",
+    matchers=[in_direct_message],
+)
+async def handle_message_im_events(say, event):
+    """Search for papers whose titles, autor lists or abstracts that contain the provided keywords."""
+    papers = await db_crud.keyword_search_papers(db, event["text"])
+    if papers is False:
+        await say(
+            text="Something went wrong while searching for papers. The error has been logged and will be investigated.",
+            channel=event["user"],
+        )
+    elif not papers:
+        await say(text="No papers found with the provided keywords.", channel=event["user"])
+    else:
+        for paper in papers:
+            await say(text=paper["url"], channel=event["user"])
+
+
+# Handles papers shared in PDF files
+@app.event("file_shared")
+async def extract_pdfs(event, logger):
+    """Handles the event whenever someone shares a pdf file in subscribed channels.
+
+    Behaves as app.extract_pdfs. The file is processed in a separate task, and it is downloaded and parsed in the
+    PDF executor, bounded by the `pdf_workers` setting, so that parsing large files does not block the event loop.
+    """
+    task = asyncio.create_task(process_pdf(event["file_id"], event.get("channel_id"), logger))
+    message_tasks.add(task)
+    task.add_done_callback(message_tasks.discard)
+
+
+async def process_pdf(file_id: str, channel_id: Union[str, None], logger: logging.Logger):
+    """Recommends the paper shared in a PDF file to users, logging any error instead of raising it.
+
+    Async version of app.process_pdf.
+
+    Args:
+        file_id: The ID of the shared file.
+        channel_id: The channel of the file_shared event.
+        logger: The logger of the listener that received the event.
+    """
+    try:
+        file = (await app.client.files_info(file=file_id))["file"]
+        if file.get("filetype") != "pdf" or not shared_in_channel(file, channel_id):
+            return
+        comment = file.get("initial_comment", {}).get("comment", "")
+        if comment.startswith("#dev"):
+            targets = await async_get_project_targets(db, file["user"])
+        else:
+            targets = await async_get_project_targets(db)
+
+        extract = functools.partial(
+            extract_from_slack_file,
+            file,
+            app.client.token,
+            max_bytes=int(configs["App"].getfloat("pdf_max_mb", fallback=20) * 1024 * 1024),
+            max_pages=configs["App"].getint("pdf_max_pages", fallback=2),
+        )
+        loop = asyncio.get_running_loop()
+        # the file is only downloaded if the paper is not already in the database
+        resolved = await async_resolve_extracted_paper(
+            db, file["permalink"], lambda: loop.run_in_executor(pdf_executor, extract)
+        )
+        log_fetches_saved(resolved, len(targets))
+        await recommend_resolved_papers(targets, resolved)
+    except Exception:
+        logger.exception("Failed to recommend the paper shared in the PDF file '%s'.", file_id)
+
+
+# respond to joining Lab-Rats VIP Club!
+@app.action("join_club")
+async def join_club(ack, body, say):
+    """Handles request to join the VIP club.
+
+    Updates the database with the user's VIP status and sends a message to the user to confirm their VIP status.
+    """
+    await ack()
+    if not await db_crud.update_user_vip_status(db, body["user"]["id"], True):
+        await say(channel=body["user"]["id"], text="Error updating the VIP status... Please contact the APP developer.")
+    else:
+        await say(
+            channel=body["user"]["id"],
+            text=(
+                "You have been registered as a Lab-Rats VIP member! :tada: You will now receive all papers shared "
+                "by lab members regardless of my recommendation decisions, along with explanations. Additionally, "
+                "you will gain early access to new and more advanced features as I am upgraded over time."
+            ),
+        )
+
+
+# respond to leaving Lab-Rats VIP Club!
+@app.action("leave_club")
+async def leave_club(ack, body, say):
+    """Handles request to leave the VIP club.
+
+    Updates the database with the user's VIP status and sends a message to the user to confirm their VIP status."""
+    await ack()
+    if not await db_crud.update_user_vip_status(db, body["user"]["id"], False):
+        await say(channel=body["user"]["id"], text="Error updating the VIP status... Please contact the APP developer.")
+    else:
+        await say(
+            channel=body["user"]["id"],
+            text="You have successfully left the Lab-Rats VIP Club. You are always welcome to join again.",
+        )
+
+
+# respond to positive feedback from user
+@app.action("feedback_positive")
+async def positive_feedback(ack, body):
+    """Handles the user's positive feedback on the recommendation."""
+    await ack()
+    recommendation_id = feedback_recommendation_id(body)
+    await db_crud.update_recommendation_feedback(db, recommendation_id, True)
+
+
+# respond to negative feedback from user
+@app.action("feedback_negative")
+async def negative_feedback(ack, body):
+    """Handles the user's negative feedback on the recommendation."""
+    await ack()
+    recommendation_id = feedback_recommendation_id(body)
+    await db_crud.update_recommendation_feedback(db, recommendation_id, False)
+
+
+# open a modal view for the user to enter feedback explanation
+@app.action("feedback_explanation")
+async def open_feedback_modal(ack, body, client):
+    """Creates a modal view for the user to enter their explanation for the negative feedback."""
+    await ack()
+    recommendation_id = feedback_recommendation_id(body)
+    await client.views_open(trigger_id=body["trigger_id"], view=modal.feedback_modal(recommendation_id))
+
+
+# Handle a modal view_submission request for user's explanation of their negative feedback
+@app.view("feedback_modal")
+async def handle_feedback_submission(ack, view):
+    """Handles the submission of user's explanation of their feedback on the recommendation."""
+    user_explanation = view["state"]["values"]["user_input_feedback"]["user_feedback_input"]["value"]
+    errors = {}
+    if user_explanation is None or len(user_explanation) < 5:
+        errors["user_input_feedback"] = "The explanation seems too short. Was there a mistake?"
+        await ack(response_action="errors", errors=errors)
+        return
+
+    recommendation_id = view["private_metadata"]
+    if not await db_crud.update_recommendation_feedback_reason(db, recommendation_id, user_explanation):
+        errors["user_input_feedback"] = "Error adding the feedback to the database... Please contact the APP developer."
+        await ack(response_action="errors", errors=errors)
+    else:
+        await ack()
+
+
+@app.event("message")
+async def handle_message_events(body, logger):
+    """Logs other message events from the subscribed channel."""
+    logger.info(body)
+
+
+async def main():
+    """Runs the app with the async Socket Mode adapter until it is stopped."""
+    global engine_semaphore
+    engine_semaphore = asyncio.Semaphore(configs["Engine"].getint("max_concurrency", fallback=8))
+    if configs["App"].getboolean("job_queue", fallback=False):
+        logger.warning("The job queue is not supported by the async app. Messages are processed in the app process.")
+    handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+    try:
+        await handler.start_async()
+    finally:
+        # send the recommendations still waiting for their coalescing window
+        await dm_sender.flush()
+        await close_async_client()
+
+
+def start_app():
+    """Entry point to start the asynchronous Slack app. Once the package has been installed using pip,
+    the app can be started by running `paper_recommender_async` in the terminal.
+
+    The app requires the same environment variables and configurations as app.start_app.
+    """
+    configure_logging()
+    # the indexes are created once with a synchronous client, before the event loop starts
+    with MongoClient(configs["App"]["mongodb_connect_str"], server_api=ServerApi("1")) as sync_client:
+        ensure_indexes(sync_client["paper_recommender"])
+        find_collection_scans(sync_client["paper_recommender"])
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    start_app()
@@ -0,0 +1,236 @@
+"""Async versions of the message-scoped pipeline stages, used by the asynchronous app.
+
+The stages are the same as in pipeline.py, but the database is accessed through Motor and the engine calls are
+awaited concurrently on the event loop, bounded by an asyncio.Semaphore instead of a thread pool.
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple, Union
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import numpy as np
+
+from .engine.base import RecommendationOutput
+from .engine.embedding import async_embed_texts
+from .engine.open_ai import batch_projects
+from .paper_extraction.base import Paper
+from .paper_extraction.from_url import async_extract_abstracts_from_urls, canonical_url
+from .mangodb import async_crud as db_crud
+from .pipeline import MessagePapers, ProjectTarget, ResolvedPaper, all_pairs, select_prefiltered_pairs, unique_pairs
+
+logger = logging.getLogger(__name__)
+
+
+async def async_resolve_papers(db: AsyncIOMotorDatabase, urls: List[str]) -> MessagePapers:
+    """Async version of pipeline.resolve_papers. The known papers are looked up concurrently.
+
+    Args:
+        db: The Motor database object.
+        urls: The URLs extracted from the message.
+
+    Returns:
+        A MessagePapers dataclass containing the resolved papers and the fetch statistics."""
+    resolved = MessagePapers(urls=len(urls))
+    canonicals = {url: canonical_url(url) for url in dict.fromkeys(urls)}
+    documents = await asyncio.gather(
+        *(db_crud.find_paper_by_canonical_url(db, canonical) for canonical in canonicals.values())
+    )
+    known = {url: document for url, document in zip(canonicals, documents) if document}
+
+    unknown_urls = [url for url in canonicals if url not in known]
+    resolved.fetches = len(unknown_urls)
+    resolved.known = len(known)
+    extracted = await async_extract_abstracts_from_urls(unknown_urls) if unknown_urls else {}
+
+    for url, canonical in canonicals.items():
+        if url in known:
+            document = known[url]
+            paper = Paper(
+                url=document["url"],
+                title=document["title"],
+                authors=document["authors"],
+                abstract=document["abstract"],
+            )
+            resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=document["_id"]))
+            continue
+
+        paper = extracted.get(url)
+        if not paper:
+            continue
+        paper_id = await db_crud.insert_paper(db, paper, [canonical, canonical_url(paper.url)])
+        if not paper_id:
+            resolved.db_errors += 1
+            continue
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=paper_id))
+    return resolved
+
+
+async def async_resolve_extracted_paper(
+    db: AsyncIOMotorDatabase, url: str, extract: Callable[[], Awaitable[Union[Paper, None]]]
+) -> MessagePapers:
+    """Async version of pipeline.resolve_extracted_paper.
+
+    Args:
+        db: The Motor database object.
+        url: The URL the paper is recorded with.
+        extract: A coroutine function that extracts the paper, returning None if the extraction failed.
+
+    Returns:
+        A MessagePapers dataclass containing the resolved paper, if any, and the fetch statistics."""
+    resolved = MessagePapers(urls=1)
+    canonical = canonical_url(url)
+    document = await db_crud.find_paper_by_canonical_url(db, canonical)
+    if document:
+        resolved.known = 1
+        paper = Paper(
+            url=document["url"],
+            title=document["title"],
+            authors=document["authors"],
+            abstract=document["abstract"],
+        )
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=document["_id"]))
+        return resolved
+
+    resolved.fetches = 1
+    paper = await extract()
+    if not paper:
+        return resolved
+    paper_id = await db_crud.insert_paper(db, paper, [canonical])
+    if paper_id:
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=paper_id))
+    else:
+        resolved.db_errors += 1
+    return resolved
+
+
+async def async_get_project_targets(db: AsyncIOMotorDatabase, user_id: Union[str, None] = None) -> List[ProjectTarget]:
+    """Async version of pipeline.get_project_targets.
+
+    Args:
+        db: The Motor database object.
+        user_id: If provided, only the projects of this user are returned. Used for "#dev" messages.
+
+    Returns:
+        A list of ProjectTarget dataclasses."""
+    query = {"_id": user_id} if user_id else {}
+    users_curser = db.users.find(
+        query,
+        projection={
+            "_id": 1,
+            "projects": 1,
+            "vip": 1,
+        },
+    )
+    return [
+        ProjectTarget(
+            user_id=user["_id"],
+            project_id=project["project_id"],
+            project_description=project["description"],
+            vip=user.get("vip", False),
+        )
+        async for user in users_curser
+        for project in user.get("projects", [])
+    ]
+
+
+async def _async_get_or_create_embeddings(
+    db: AsyncIOMotorDatabase, collection: str, documents: dict, model: str
+) -> np.ndarray:
+    """Async version of pipeline._get_or_create_embeddings."""
+    ids = list(documents)
+    embeddings = await db_crud.get_embeddings(db, collection, ids, model)
+    missing = [doc_id for doc_id in ids if doc_id not in embeddings]
+    if missing:
+        vectors = await async_embed_texts([documents[doc_id] for doc_id in missing], model)
+        new_embeddings = {doc_id: vector.tolist() for doc_id, vector in zip(missing, vectors)}
+        await db_crud.set_embeddings(db, collection, new_embeddings, model)
+        embeddings.update(new_embeddings)
+    return np.array([embeddings[doc_id] for doc_id in ids], dtype=np.float32)
+
+
+async def async_prefilter_pairs(
+    db: AsyncIOMotorDatabase,
+    targets: List[ProjectTarget],
+    papers: List[ResolvedPaper],
+    configs: dict,
+) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Async version of pipeline.prefilter_pairs. The embeddings are created with the async OpenAI client."""
+    if not targets or not papers:
+        return []
+    model = configs["Engine"].get("embedding_model", "text-embedding-3-small")
+    projects = {target.project_id: target.project_description for target in targets}
+    abstracts = {resolved_paper.paper_id: resolved_paper.paper.abstract for resolved_paper in papers}
+    try:
+        project_vectors = await _async_get_or_create_embeddings(db, "projects", projects, model)
+        paper_vectors = await _async_get_or_create_embeddings(db, "papers", abstracts, model)
+    except Exception:
+        logger.exception("Failed to embed the projects and papers. All pairs are sent to the engine.")
+        return all_pairs(targets, papers)
+    return select_prefiltered_pairs(targets, papers, project_vectors, paper_vectors, configs)
+
+
+async def async_fan_out_batch_recommendations(
+    semaphore: asyncio.Semaphore,
+    pairs: List[Tuple[ProjectTarget, ResolvedPaper]],
+    score_batch: Callable[[List[ProjectTarget], ResolvedPaper], Awaitable[List[Union[RecommendationOutput, None]]]],
+    batch_size: int,
+    token_budget: int,
+    flush_timeout: Union[Callable[[], Union[float, None]], None] = None,
+) -> AsyncIterator[Union[Tuple[ProjectTarget, ResolvedPaper, RecommendationOutput], None]]:
+    """Score the (project, paper) pairs concurrently, and yield the results as they arrive.
+
+    The repeated (project, paper) pairs are removed, as in pipeline.unique_pairs, then the pairs are grouped by paper,
+    and the projects of each paper are split into batches. With a batch size of 1, every pair is scored on its own,
+    as in pipeline.fan_out_recommendations.
+
+    Args:
+        semaphore: The semaphore bounding the number of concurrent engine calls, shared by all the messages.
+        pairs: The (target, paper) tuples to be scored.
+        score_batch: The coroutine function that scores a paper against a batch of projects.
+        batch_size: The maximum number of projects in a batch.
+        token_budget: The maximum estimated number of tokens of a batch request.
+        flush_timeout: As in pipeline.fan_out_recommendations.
+
+    Returns:
+        An async iterator of (target, paper, recommendation) tuples in the order they are completed, and None on
+        timeouts."""
+    pairs = unique_pairs(pairs)
+    groups = {}  # type: dict
+    for target, resolved_paper in pairs:
+        groups.setdefault(resolved_paper.paper_id, (resolved_paper, []))[1].append(target)
+
+    async def score(batch_targets: List[ProjectTarget], resolved_paper: ResolvedPaper):
+        async with semaphore:
+            try:
+                recommendations = await score_batch(batch_targets, resolved_paper)
+            except Exception:
+                logger.exception("Failed to score paper '%s' for a batch of projects.", resolved_paper.url)
+                recommendations = []
+        return batch_targets, resolved_paper, recommendations
+
+    tasks = []
+    for resolved_paper, targets in groups.values():
+        if batch_size > 1:
+            batches = batch_projects(
+                [target.project_description for target in targets],
+                resolved_paper.paper.abstract,
+                max_batch_size=batch_size,
+                token_budget=token_budget,
+            )
+        else:
+            batches = [[index] for index in range(len(targets))]
+        for batch in batches:
+            tasks.append(asyncio.ensure_future(score([targets[index] for index in batch], resolved_paper)))
+    logger.info("Scoring %d (project, paper) pairs in %d request(s).", len(pairs), len(tasks))
+
+    pending = set(tasks)
+    while pending:
+        timeout = flush_timeout() if flush_timeout else None
+        done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            yield None
+        for task in done:
+            batch_targets, resolved_paper, recommendations = task.result()
+            for target, recommendation in zip(batch_targets, recommendations):
+                if recommendation is not None:
+                    yield target, resolved_paper, recommendation
@@ -0,0 +1,374 @@
+"""Send the recommendation messages to users, within the rate limits of Slack.
+
+Recommendations are not posted as soon as they are made. The recommendations for the same user within a short window
+are coalesced into one message, and the messages are posted by a background sender through a token bucket, so that
+a burst of shared papers neither exceeds the rate limits of chat.postMessage nor blocks the threads producing the
+recommendations. If Slack still responds with 429, all the messages wait for the Retry-After delay before retrying.
+
+Since the messages to a user are at least one window apart, the limit of one message per second per channel is also
+respected as long as the window is at least one second.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Set, Tuple, Union
+from slack_sdk.errors import SlackApiError
+
+from .slack_templates import message as message_block
+
+logger = logging.getLogger(__name__)
+
+# each recommendation uses 3 of the 50 blocks allowed in a message, after the greeting block
+MAX_RECOMMENDATIONS_PER_MESSAGE = 16
+
+
+@dataclass
+class RecommendationItem:
+    """Data class for a recorded recommendation to be sent to a user.
+
+    Attributes:
+        decision: True if the paper is recommended.
+        url: The URL of the paper.
+        explanation: The explanation of the decision.
+        recommendation_id: The ID of the recommendation record, used to record the feedback."""
+
+    decision: bool
+    url: str
+    explanation: str
+    recommendation_id: str
+
+
+def build_message(user_id: str, items: List[RecommendationItem]) -> dict:
+    """Build the arguments of chat.postMessage for the recommendations of a user.
+
+    A single recommendation is sent with the usual template. Several recommendations are sent as a digest.
+
+    Args:
+        user_id: The user ID.
+        items: The recommendations, at most MAX_RECOMMENDATIONS_PER_MESSAGE.
+
+    Returns:
+        The keyword arguments of chat.postMessage."""
+    if len(items) == 1:
+        item = items[0]
+        if item.decision:
+            blocks = message_block.positive_recommendation_block(
+                user_id, item.url, item.explanation, item.recommendation_id
+            )
+            text = f"Hi there, <@{user_id}>! Here is a paper you might be interested in: {item.url}\n{item.explanation}"
+        else:
+            blocks = message_block.negative_recommendation_block(
+                user_id, item.url, item.explanation, item.recommendation_id
+            )
+            text = (
+                f"Hi there, <@{user_id}>! I don't think this paper is relevant to "
+                f"your project, but you might disagree: {item.url}\n{item.explanation}"
+            )
+        payload = {"recommendation_id": item.recommendation_id}  # type: Dict[str, Any]
+    else:
+        blocks = message_block.recommendation_digest_block(
+            user_id, [(item.decision, item.url, item.explanation, item.recommendation_id) for item in items]
+        )
+        text = f"Hi there, <@{user_id}>! Here are {len(items)} papers shared recently: " + ", ".join(
+            item.url for item in items
+        )
+        payload = {"recommendation_ids": [item.recommendation_id for item in items]}
+    return {
+        "channel": user_id,
+        "blocks": blocks,
+        "text": text,  # fallback text
+        "metadata": {"event_type": "recommendation_created", "event_payload": payload},
+    }
+
+
+def feedback_recommendation_id(body: dict) -> str:
+    """Get the ID of the recommendation whose feedback button was clicked.
+
+    The buttons of the messages with several recommendations store the ID of their recommendation. The messages sent
+    by earlier versions of the app only have the ID in their metadata.
+
+    Args:
+        body: The body of the button action request.
+
+    Returns:
+        The recommendation ID."""
+    return body["actions"][0].get("value") or body["message"]["metadata"]["event_payload"]["recommendation_id"]
+
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    Args:
+        rate: The number of tokens added per second.
+        burst: The maximum number of tokens in the bucket."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token from the bucket.
+
+        Returns:
+            The number of seconds to wait before using the token."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        """Stop handing out usable tokens for a number of seconds, e.g. after a 429 response with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class Outbox:
+    """The recommendations waiting to be sent, grouped by user.
+
+    Not thread-safe; the senders guard it with their own lock.
+
+    Args:
+        window: The number of seconds the recommendations for a user are collected before they are sent.
+        max_items: The maximum number of recommendations in a message."""
+
+    def __init__(self, window: float, max_items: int):
+        self.window = window
+        self.max_items = max_items
+        self._pending = {}  # type: Dict[str, Tuple[float, List[RecommendationItem]]]
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._pending
+
+    def add(self, user_id: str, item: RecommendationItem):
+        """Add a recommendation for a user. The window of the user starts with their first recommendation."""
+        self._pending.setdefault(user_id, (time.monotonic() + self.window, []))[1].append(item)
+
+    def next_due(self) -> Union[float, None]:
+        """The monotonic time at which the next message is due. None if there is nothing to send."""
+        return min((due for due, _ in self._pending.values()), default=None)
+
+    def pop_due(
+        self, everything: bool = False, user_ids: Collection[str] = ()
+    ) -> List[Tuple[str, List[RecommendationItem]]]:
+        """Remove the messages that are due, because their window has ended or they are full.
+
+        Args:
+            everything: Remove all the messages, regardless of their windows.
+            user_ids: Remove all the messages of these users, regardless of their windows.
+
+        Returns:
+            A list of (user ID, recommendations) tuples, one per message."""
+        now = time.monotonic()
+        due_users = [
+            user_id
+            for user_id, (due, items) in self._pending.items()
+            if everything or due <= now or len(items) >= self.max_items or user_id in user_ids
+        ]
+        messages = []
+        for user_id in due_users:
+            items = self._pending.pop(user_id)[1]
+            messages += [(user_id, items[i : i + self.max_items]) for i in range(0, len(items), self.max_items)]
+        return messages
+
+
+def _retry_after(error: SlackApiError) -> Union[float, None]:
+    """The Retry-After delay of a rate limited response. None if the error is not a rate limit."""
+    if error.response is None or error.response.status_code != 429:
+        return None
+    try:
+        return float(error.response.headers.get("Retry-After", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class DirectMessageSender:
+    """Sends the recommendation messages from a background thread.
+
+    Args:
+        post_message: The chat.postMessage method of a Slack WebClient.
+        rate: The maximum number of messages per second, on average.
+        burst: The maximum number of messages sent in a burst.
+        window: The number of seconds the recommendations for a user are collected before they are sent.
+        max_retries: The number of retries of a message that is rate limited."""
+
+    def __init__(
+        self,
+        post_message: Callable[..., Any],
+        rate: float,
+        burst: int,
+        window: float,
+        max_retries: int = 3,
+    ):
+        self.post_message = post_message
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._outbox = Outbox(window, MAX_RECOMMENDATIONS_PER_MESSAGE)
+        self._condition = threading.Condition()
+        self._sending = 0
+        self._flushing = False
+        self._flushing_users = set()  # type: Set[str]
+        self._thread = None  # type: Union[threading.Thread, None]
+
+    def submit(self, user_id: str, item: RecommendationItem):
+        """Queue a recommendation for a user. Returns immediately.
+
+        Args:
+            user_id: The user ID.
+            item: The recommendation."""
+        with self._condition:
+            self._outbox.add(user_id, item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dm-sender", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: Union[float, None] = None, user_ids: Union[Collection[str], None] = None) -> bool:
+        """Send all the queued recommendations without waiting for their windows, and wait until they are sent.
+
+        Args:
+            timeout: The maximum number of seconds to wait. None to wait until everything is sent.
+            user_ids: Only send the recommendations of these users, e.g. the users of a job. The recommendations of
+                the other users keep waiting for their windows.
+
+        Returns:
+            True if everything has been sent. False if the timeout expired."""
+        with self._condition:
+            if user_ids is None:
+                self._flushing = True
+            else:
+                self._flushing_users.update(user_ids)
+            self._condition.notify_all()
+            if user_ids is None:
+                return self._condition.wait_for(lambda: not self._outbox and not self._sending, timeout)
+            return self._condition.wait_for(
+                lambda: not self._sending and not any(user_id in self._outbox for user_id in user_ids), timeout
+            )
+
+    def _run(self):
+        """Send the messages that are due, until the process exits."""
+        while True:
+            with self._condition:
+                while True:
+                    messages = self._outbox.pop_due(everything=self._flushing, user_ids=self._flushing_users)
+                    if messages:
+                        self._sending += len(messages)
+                        break
+                    self._flushing = False
+                    self._flushing_users.clear()
+                    self._condition.notify_all()
+                    next_due = self._outbox.next_due()
+                    self._condition.wait(None if next_due is None else max(next_due - time.monotonic(), 0))
+            for user_id, items in messages:
+                self._send(user_id, items)
+                with self._condition:
+                    self._sending -= 1
+                    self._condition.notify_all()
+
+    def _send(self, user_id: str, items: List[RecommendationItem]):
+        """Post a message through the token bucket, retrying after the Retry-After delay if it is rate limited."""
+        kwargs = build_message(user_id, items)
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._bucket.reserve())
+            try:
+                self.post_message(**kwargs)
+                return
+            except SlackApiError as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    logger.exception("Failed to send %d recommendation(s) to user '%s'.", len(items), user_id)
+                    return
+                logger.warning("chat.postMessage is rate limited; retrying in %.1f seconds.", retry_after)
+                self._bucket.pause(retry_after)
+            except Exception:
+                logger.exception("Failed to send %d recommendation(s) to user '%s'.", len(items), user_id)
+                return
+
+
+class AsyncDirectMessageSender:
+    """Sends the recommendation messages from a background task of the running event loop.
+
+    Async version of DirectMessageSender, used by the asynchronous app.
+
+    Args:
+        post_message: The chat.postMessage method of a Slack AsyncWebClient.
+        rate: The maximum number of messages per second, on average.
+        burst: The maximum number of messages sent in a burst.
+        window: The number of seconds the recommendations for a user are collected before they are sent.
+        max_retries: The number of retries of a message that is rate limited."""
+
+    def __init__(
+        self,
+        post_message: Callable[..., Awaitable[Any]],
+        rate: float,
+        burst: int,
+        window: float,
+        max_retries: int = 3,
+    ):
+        self.post_message = post_message
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._outbox = Outbox(window, MAX_RECOMMENDATIONS_PER_MESSAGE)
+        self._wakeup = None  # type: Union[asyncio.Event, None]
+        self._task = None  # type: Union[asyncio.Task, None]
+
+    def submit(self, user_id: str, item: RecommendationItem):
+        """Queue a recommendation for a user. Must be called from the event loop.
+
+        Args:
+            user_id: The user ID.
+            item: The recommendation."""
+        self._outbox.add(user_id, item)
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()  # type: ignore
+
+    async def flush(self):
+        """Send all the queued recommendations without waiting for their windows."""
+        for user_id, items in self._outbox.pop_due(everything=True):
+            await self._send(user_id, items)
+
+    async def _run(self):
+        """Send the messages that are due, until the event loop stops."""
+        while True:
+            for user_id, items in self._outbox.pop_due():
+                await self._send(user_id, items)
+            self._wakeup.clear()  # type: ignore
+            next_due = self._outbox.next_due()
+            try:
+                timeout = None if next_due is None else max(next_due - time.monotonic(), 0)
+                await asyncio.wait_for(self._wakeup.wait(), timeout)  # type: ignore
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, user_id: str, items: List[RecommendationItem]):
+        """Post a message through the token bucket, retrying after the Retry-After delay if it is rate limited."""
+        kwargs = build_message(user_id, items)
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._bucket.reserve())
+            try:
+                await self.post_message(**kwargs)
+                return
+            except SlackApiError as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    logger.exception("Failed to send %d recommendation(s) to user '%s'.", len(items), user_id)
+                    return
+                logger.warning("chat.postMessage is rate limited; retrying in %.1f seconds.", retry_after)
+                self._bucket.pause(retry_after)
+            except Exception:
+                logger.exception("Failed to send %d recommendation(s) to user '%s'.", len(items), user_id)
+                return
@@ -0,0 +1,130 @@
+"""Embed project descriptions and paper abstracts, and compare them using cosine similarity.
+
+The embeddings are used as a cheap first stage before the chat model: only the (project, paper) pairs that are
+similar enough are sent to the engine for a recommendation.
+
+Two kinds of embedding models are supported:
+- Any OpenAI embedding model, such as "text-embedding-3-small".
+- "hashing", a deterministic bag-of-words embedding that does not require network access. It is useful for offline
+development and testing, but it only captures word overlap.
+"""
+
+import hashlib
+import logging
+import re
+from typing import List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# name of the deterministic offline embedding model
+HASHING_MODEL = "hashing"
+HASHING_DIMENSIONS = 1024
+
+
+def hashing_embedding(texts: List[str], dimensions: int = HASHING_DIMENSIONS) -> np.ndarray:
+    """Embed texts using the hashing trick on lowercase word tokens.
+
+    Each token is mapped to a dimension and a sign by a stable hash, so the same text always has the same
+    embedding across processes.
+
+    Args:
+        texts: The texts to be embedded.
+        dimensions: The number of dimensions of the embeddings.
+
+    Returns:
+        A 2D array with one row per text."""
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:8], "little")
+            vectors[row, digest % dimensions] += 1.0 if (digest >> 63) & 1 else -1.0
+    return vectors
+
+
+def openai_embedding(texts: List[str], model: str) -> np.ndarray:
+    """Embed texts using OpenAI Embeddings API.
+
+    Args:
+        texts: The texts to be embedded.
+        model: The OpenAI embedding model.
+
+    Returns:
+        A 2D array with one row per text."""
+    # imported here so that the offline model does not require an OpenAI client
+    from .open_ai import client
+
+    response = client.embeddings.create(model=model, input=texts)
+    return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+
+
+def embed_texts(texts: List[str], model: str) -> np.ndarray:
+    """Embed texts using the specified embedding model.
+
+    Args:
+        texts: The texts to be embedded.
+        model: "hashing" for the offline model, otherwise the name of an OpenAI embedding model.
+
+    Returns:
+        A 2D array with one row per text."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if model == HASHING_MODEL:
+        return hashing_embedding(texts)
+    return openai_embedding(texts, model)
+
+
+async def async_openai_embedding(texts: List[str], model: str) -> np.ndarray:
+    """Async version of openai_embedding."""
+    from .open_ai import async_client
+
+    response = await async_client.embeddings.create(model=model, input=texts)
+    return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype=np.float32)
+
+
+async def async_embed_texts(texts: List[str], model: str) -> np.ndarray:
+    """Async version of embed_texts. The hashing model runs in the event loop, since it does not wait on the network."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if model == HASHING_MODEL:
+        return hashing_embedding(texts)
+    return await async_openai_embedding(texts, model)
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Compute the cosine similarity between every row of a and every row of b.
+
+    Args:
+        a: A 2D array of shape (m, d).
+        b: A 2D array of shape (n, d).
+
+    Returns:
+        A 2D array of shape (m, n). Rows of zeros have a similarity of 0 with everything."""
+    a_norm = np.linalg.norm(a, axis=1, keepdims=True)
+    b_norm = np.linalg.norm(b, axis=1, keepdims=True)
+    a = np.divide(a, a_norm, out=np.zeros_like(a), where=a_norm > 0)
+    b = np.divide(b, b_norm, out=np.zeros_like(b), where=b_norm > 0)
+    return a @ b.T
+
+
+def select_pairs(similarities: np.ndarray, top_k: int, threshold: float) -> List[Tuple[int, int]]:
+    """Select the (project, paper) pairs worth sending to the engine.
+
+    For each paper, a project is selected if it is one of the top_k most similar projects,
+    or if its similarity is at least the threshold.
+
+    Args:
+        similarities: A 2D array of shape (projects, papers) of cosine similarities.
+        top_k: The number of most similar projects always selected for each paper. 0 to only use the threshold.
+        threshold: The similarity above which a project is always selected.
+
+    Returns:
+        A list of (project index, paper index) tuples."""
+    selected = similarities >= threshold
+    num_projects = similarities.shape[0]
+    if top_k > 0 and num_projects > 0:
+        k = min(top_k, num_projects)
+        # indices of the k most similar projects for each paper, in no particular order
+        top = np.argpartition(-similarities, k - 1, axis=0)[:k]
+        selected[top, np.arange(similarities.shape[1])] = True
+    return [(int(project), int(paper)) for project, paper in zip(*np.nonzero(selected))]
@@ -1,14 +1,22 @@
 """Implement paper recommendation and explanation using OpenAI Chat Completions API."""
 
+import json
 import logging
 import string
 from typing import List, Union
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from .base import RecommendationOutput
 
 logger = logging.getLogger(__name__)
 
 client = OpenAI()
+# used by the asynchronous app
+async_client = AsyncOpenAI()
+
+# rough number of tokens used by the instructions of the batch prompt, excluding the abstract and the projects
+BATCH_PROMPT_OVERHEAD_TOKENS = 200
+# rough number of tokens the model needs to answer for each project in the batch prompt
+BATCH_ANSWER_TOKENS_PER_PROJECT = 150
 
 
 def prompt_if_worth_reading(project_description: str, paper_abstract: str) -> List:
@@ -61,6 +69,138 @@ def prompt_explain_decision(project_description: str, paper_abstract: str, decis
     return prompt + follow_up
 
 
+def prompt_decision_and_explanation(project_description: str, paper_abstract: str) -> List:
+    """Create a prompt to ask the model for the decision and its explanation in a single JSON response.
+
+    Args:
+        project_description: Project description.
+        paper_abstract: Paper abstract.
+
+    Returns:
+        A list of dictionaries, each containing the role and the content of the message."""
+    prompt = prompt_if_worth_reading(project_description, paper_abstract)[:-1]
+    prompt.append(
+        {
+            "role": "user",
+            "content": (
+                "Do you think the research paper is relevant and useful for my project and therefore is worth reading? "
+                "Please answer in JSON with two keys: 'decision', which is either 'Yes' or 'No', "
+                "and 'explanation', which explains your decision."
+            ),
+        }
+    )
+    return prompt
+
+
+def prompt_batch_recommendation(project_descriptions: List[str], paper_abstract: str) -> List:
+    """Create a prompt to ask the model whether a research paper is worth reading for each of several projects.
+
+    Args:
+        project_descriptions: Descriptions of the projects, numbered from 1 in the prompt.
+        paper_abstract: Paper abstract.
+
+    Returns:
+        A list of dictionaries, each containing the role and the content of the message."""
+    projects = "\n\n".join(
+        f"Project {number}: {description}" for number, description in enumerate(project_descriptions, start=1)
+    )
+    prompt = [
+        {
+            "role": "system",
+            "content": (
+                "You help descide whether a research paper is worth reading for each of several projects, based on "
+                "the project descriptions and the paper's abstract. You only recommand a paper for a project if "
+                "you think it is closely relevant to that project. Each project is judged independently."
+            ),
+        },
+        {"role": "user", "content": f"Here is an abstract of a research paper: {paper_abstract}"},
+        {"role": "user", "content": f"And here are the descriptions of the projects:\n\n{projects}"},
+        {
+            "role": "user",
+            "content": (
+                "For each project, do you think the research paper is relevant and useful for the project and "
+                "therefore is worth reading? Please answer in JSON with a single key 'recommendations', a list "
+                "with one object per project. Each object has three keys: 'project', the project number; "
+                "'decision', which is either 'Yes' or 'No'; and 'explanation', which explains your decision."
+            ),
+        },
+    ]
+    return prompt
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in a text, assuming about 4 characters per token in English."""
+    return len(text) // 4 + 1
+
+
+def batch_projects(
+    project_descriptions: List[str],
+    paper_abstract: str,
+    max_batch_size: int,
+    token_budget: int,
+) -> List[List[int]]:
+    """Split the projects into batches for the batch prompt, so that each request stays within a token budget.
+
+    The budget covers the prompt and the expected answer. A project that exceeds the budget on its own is still
+    sent, in a batch of its own.
+
+    Args:
+        project_descriptions: Descriptions of the projects.
+        paper_abstract: Paper abstract, which is repeated in every batch.
+        max_batch_size: The maximum number of projects in a batch.
+        token_budget: The maximum number of estimated tokens for each request.
+
+    Returns:
+        A list of batches, each containing the indices of the projects in the batch."""
+    base_tokens = BATCH_PROMPT_OVERHEAD_TOKENS + estimate_tokens(paper_abstract)
+    batches, batch, batch_tokens = [], [], base_tokens  # type: List[List[int]], List[int], int
+    for index, description in enumerate(project_descriptions):
+        tokens = estimate_tokens(description) + BATCH_ANSWER_TOKENS_PER_PROJECT
+        if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > token_budget):
+            batches.append(batch)
+            batch, batch_tokens = [], base_tokens
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _parse_decision(decision: str) -> bool:
+    """Convert the 'Yes' or 'No' answer of the model to a boolean, ignoring case and punctuation."""
+    return decision.lower().translate(str.maketrans("", "", string.punctuation)).strip() == "yes"
+
+
+def _parse_single_call_output(content: Union[str, None]) -> RecommendationOutput:
+    """Parse the JSON response of the single call mode. Raises an exception if the response is malformed."""
+    assert isinstance(content, str)
+    output = json.loads(content)
+    decision, explanation = output["decision"], output["explanation"]
+    assert isinstance(decision, str) and isinstance(explanation, str)
+    return RecommendationOutput(decision=_parse_decision(decision), explanation=explanation)
+
+
+def _parse_batch_output(content: Union[str, None], num_projects: int) -> List[Union[RecommendationOutput, None]]:
+    """Parse the JSON response of the batch mode. Malformed or missing recommendations are None."""
+    assert isinstance(content, str)
+    recommendations = [None] * num_projects  # type: List[Union[RecommendationOutput, None]]
+    for output in json.loads(content)["recommendations"]:
+        try:
+            index = int(output["project"]) - 1
+            decision, explanation = output["decision"], output["explanation"]
+            assert 0 <= index < num_projects
+            assert isinstance(decision, str) and isinstance(explanation, str)
+        except Exception:
+            logger.warning("Ignoring a malformed recommendation in the batch response: %s", output)
+            continue
+        recommendations[index] = RecommendationOutput(decision=_parse_decision(decision), explanation=explanation)
+    if None in recommendations:
+        logger.warning(
+            "The model did not answer for %d of %d projects in the batch.", recommendations.count(None), num_projects
+        )
+    return recommendations
+
+
 def paper_recommendation(
     project_description: str,
     paper_abstract: str,
@@ -68,11 +208,41 @@ def paper_recommendation(
 ) -> Union[RecommendationOutput, None]:
     """Use OpenAI Chat Completions API to recommend a paper based on the project description and the paper abstract.
 
+    The engine mode is selected by `mode` in the Engine section of the configs:
+    - "two_calls" (default) asks for the decision first, then asks the model to explain it in a second request.
+    - "single_call" asks for the decision and the explanation in one request, which halves the latency and
+    the input tokens.
+    - "batch" is meant to score many projects against a paper at once with paper_recommendation_batch.
+    A single project is scored as a batch of one.
+
     Args:
         project_description (str): Project description.
         paper_abstract (str): Paper abstract.
+        configs: The app configurations.
     Return:
-        A tuple containing the decision and the explanation. If fails to extract arxiv id, return None.
+        A RecommendationOutput containing the decision and the explanation. None if any error occurred.
+    """
+    mode = configs["Engine"].get("mode", "two_calls")
+    if mode == "single_call":
+        return paper_recommendation_single_call(project_description, paper_abstract, configs)
+    if mode == "batch":
+        return paper_recommendation_batch([project_description], paper_abstract, configs)[0]
+    return paper_recommendation_two_calls(project_description, paper_abstract, configs)
+
+
+def paper_recommendation_two_calls(
+    project_description: str,
+    paper_abstract: str,
+    configs: dict,
+) -> Union[RecommendationOutput, None]:
+    """Recommend a paper using two sequential requests: one for the decision and one for the explanation.
+
+    Args:
+        project_description (str): Project description.
+        paper_abstract (str): Paper abstract.
+        configs: The app configurations.
+    Return:
+        A RecommendationOutput containing the decision and the explanation. None if any error occurred.
     """
     try:
         response = client.chat.completions.create(
@@ -88,8 +258,132 @@ def paper_recommendation(
         explanation = response.choices[0].message.content
         assert isinstance(explanation, str)
 
-        decision = True if decision.lower().translate(str.maketrans("", "", string.punctuation)) == "yes" else False
-        return RecommendationOutput(decision=decision, explanation=explanation)
+        return RecommendationOutput(decision=_parse_decision(decision), explanation=explanation)
     except Exception:
         logger.exception("Something went wrong while using OpenAI Chat Completions API.")
         return None
+
+
+def paper_recommendation_single_call(
+    project_description: str,
+    paper_abstract: str,
+    configs: dict,
+) -> Union[RecommendationOutput, None]:
+    """Recommend a paper using a single request that returns both the decision and the explanation in JSON.
+
+    Args:
+        project_description (str): Project description.
+        paper_abstract (str): Paper abstract.
+        configs: The app configurations.
+    Return:
+        A RecommendationOutput containing the decision and the explanation. None if any error occurred.
+    """
+    try:
+        response = client.chat.completions.create(
+            model=configs["Engine"]["model"],
+            messages=prompt_decision_and_explanation(project_description, paper_abstract),
+            response_format={"type": "json_object"},
+        )
+        return _parse_single_call_output(response.choices[0].message.content)
+    except Exception:
+        logger.exception("Something went wrong while using OpenAI Chat Completions API in single call mode.")
+        return None
+
+
+def paper_recommendation_batch(
+    project_descriptions: List[str],
+    paper_abstract: str,
+    configs: dict,
+) -> List[Union[RecommendationOutput, None]]:
+    """Recommend a paper for several projects using a single request.
+
+    The caller is responsible for keeping the batch within the token budget, see batch_projects.
+
+    Args:
+        project_descriptions: Descriptions of the projects.
+        paper_abstract (str): Paper abstract.
+        configs: The app configurations.
+    Return:
+        A list with a RecommendationOutput for each project, in the same order as the project descriptions.
+        An item is None if the model did not answer for the project or any error occurred.
+    """
+    try:
+        response = client.chat.completions.create(
+            model=configs["Engine"]["model"],
+            messages=prompt_batch_recommendation(project_descriptions, paper_abstract),
+            response_format={"type": "json_object"},
+        )
+        return _parse_batch_output(response.choices[0].message.content, len(project_descriptions))
+    except Exception:
+        logger.exception("Something went wrong while using OpenAI Chat Completions API in batch mode.")
+        return [None] * len(project_descriptions)
+
+
+async def async_paper_recommendation(
+    project_description: str,
+    paper_abstract: str,
+    configs: dict,
+) -> Union[RecommendationOutput, None]:
+    """Async version of paper_recommendation, using the async OpenAI client. Supports the same engine modes.
+
+    Args:
+        project_description (str): Project description.
+        paper_abstract (str): Paper abstract.
+        configs: The app configurations.
+    Return:
+        A RecommendationOutput containing the decision and the explanation. None if any error occurred.
+    """
+    mode = configs["Engine"].get("mode", "two_calls")
+    if mode == "batch":
+        return (await async_paper_recommendation_batch([project_description], paper_abstract, configs))[0]
+    try:
+        if mode == "single_call":
+            response = await async_client.chat.completions.create(
+                model=configs["Engine"]["model"],
+                messages=prompt_decision_and_explanation(project_description, paper_abstract),
+                response_format={"type": "json_object"},
+            )
+            return _parse_single_call_output(response.choices[0].message.content)
+
+        response = await async_client.chat.completions.create(
+            model=configs["Engine"]["model"], messages=prompt_if_worth_reading(project_description, paper_abstract)
+        )
+        decision = response.choices[0].message.content
+        assert isinstance(decision, str)
+        response = await async_client.chat.completions.create(
+            model=configs["Engine"]["model"],
+            messages=prompt_explain_decision(project_description, paper_abstract, decision),
+        )
+        explanation = response.choices[0].message.content
+        assert isinstance(explanation, str)
+        return RecommendationOutput(decision=_parse_decision(decision), explanation=explanation)
+    except Exception:
+        logger.exception("Something went wrong while using OpenAI Chat Completions API in %s mode.", mode)
+        return None
+
+
+async def async_paper_recommendation_batch(
+    project_descriptions: List[str],
+    paper_abstract: str,
+    configs: dict,
+) -> List[Union[RecommendationOutput, None]]:
+    """Async version of paper_recommendation_batch, using the async OpenAI client.
+
+    Args:
+        project_descriptions: Descriptions of the projects.
+        paper_abstract (str): Paper abstract.
+        configs: The app configurations.
+    Return:
+        A list with a RecommendationOutput for each project, in the same order as the project descriptions.
+        An item is None if the model did not answer for the project or any error occurred.
+    """
+    try:
+        response = await async_client.chat.completions.create(
+            model=configs["Engine"]["model"],
+            messages=prompt_batch_recommendation(project_descriptions, paper_abstract),
+            response_format={"type": "json_object"},
+        )
+        return _parse_batch_output(response.choices[0].message.content, len(project_descriptions))
+    except Exception:
+        logger.exception("Something went wrong while using OpenAI Chat Completions API in batch mode.")
+        return [None] * len(project_descriptions)
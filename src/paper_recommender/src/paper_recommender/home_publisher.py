@@ -0,0 +1,166 @@
+"""Publish the App Home views of users, debounced per user.
+
+Opening the App Home, adding a project and deleting a project each need the home view of the user to be published
+again. Instead of publishing right away, the publishers wait for a short window, so that a burst of changes by the
+same user is collapsed into a single views.publish of the latest state, which is read once at the end of the window.
+A view is not published again if it is identical to the last view published for the user by this process.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+def view_hash(view: dict) -> str:
+    """Hash a rendered view, so that an unchanged view is not published again.
+
+    Args:
+        view: The view payload.
+
+    Returns:
+        The SHA-256 hex digest of the view."""
+    return hashlib.sha256(json.dumps(view, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class PublishedViews:
+    """The hashes of the last views published for the most recent users. Not thread-safe.
+
+    Args:
+        max_users: The maximum number of users whose last view is remembered."""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._hashes = OrderedDict()  # type: OrderedDict[str, str]
+
+    def changed(self, user_id: str, view: dict) -> Union[str, None]:
+        """Check whether a view differs from the last view published for a user.
+
+        Args:
+            user_id: The user ID.
+            view: The rendered view.
+
+        Returns:
+            The hash of the view if it should be published. None if it is unchanged."""
+        digest = view_hash(view)
+        if self._hashes.get(user_id) == digest:
+            self._hashes.move_to_end(user_id)
+            return None
+        return digest
+
+    def record(self, user_id: str, digest: str):
+        """Record the hash of a view published for a user."""
+        self._hashes[user_id] = digest
+        self._hashes.move_to_end(user_id)
+        while len(self._hashes) > self.max_users:
+            self._hashes.popitem(last=False)
+
+    def forget(self, user_id: str):
+        """Forget the last view of a user, e.g. because publishing it failed."""
+        self._hashes.pop(user_id, None)
+
+
+class HomePublisher:
+    """Publishes the home views of users with a timer per user.
+
+    Args:
+        publish: The views_publish method of a Slack WebClient.
+        render: A function that reads the latest state of a user and renders their home view.
+        window: The number of seconds the publishes for a user are collapsed into one.
+        max_users: The maximum number of users whose last view is remembered."""
+
+    def __init__(
+        self,
+        publish: Callable[..., Any],
+        render: Callable[[str], dict],
+        window: float,
+        max_users: int = 10000,
+    ):
+        self.publish = publish
+        self.render = render
+        self.window = window
+        self._published = PublishedViews(max_users)
+        self._timers = {}  # type: Dict[str, threading.Timer]
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id: str):
+        """Publish the home view of a user at the end of their window. Returns immediately.
+
+        Args:
+            user_id: The user ID."""
+        with self._lock:
+            if user_id in self._timers:
+                # the pending publish will render the latest state
+                return
+            timer = threading.Timer(self.window, self._publish, args=(user_id,))
+            timer.daemon = True
+            self._timers[user_id] = timer
+        timer.start()
+
+    def _publish(self, user_id: str):
+        """Render the latest home view of a user, and publish it unless it is unchanged."""
+        with self._lock:
+            del self._timers[user_id]
+        try:
+            view = self.render(user_id)
+            with self._lock:
+                digest = self._published.changed(user_id, view)
+            if digest is None:
+                return
+            self.publish(user_id=user_id, view=view)
+            with self._lock:
+                self._published.record(user_id, digest)
+        except Exception:
+            logger.exception("Error publishing the home tab of user '%s'.", user_id)
+
+
+class AsyncHomePublisher:
+    """Publishes the home views of users with a task per user.
+
+    Async version of HomePublisher, used by the asynchronous app.
+
+    Args:
+        publish: The views_publish method of a Slack AsyncWebClient.
+        render: A coroutine function that reads the latest state of a user and renders their home view.
+        window: The number of seconds the publishes for a user are collapsed into one.
+        max_users: The maximum number of users whose last view is remembered."""
+
+    def __init__(
+        self,
+        publish: Callable[..., Awaitable[Any]],
+        render: Callable[[str], Awaitable[dict]],
+        window: float,
+        max_users: int = 10000,
+    ):
+        self.publish = publish
+        self.render = render
+        self.window = window
+        self._published = PublishedViews(max_users)
+        self._tasks = {}  # type: Dict[str, asyncio.Task]
+
+    def schedule(self, user_id: str):
+        """Publish the home view of a user at the end of their window. Must be called from the event loop.
+
+        Args:
+            user_id: The user ID."""
+        if user_id not in self._tasks:
+            self._tasks[user_id] = asyncio.create_task(self._publish(user_id))
+
+    async def _publish(self, user_id: str):
+        """Render the latest home view of a user after the window, and publish it unless it is unchanged."""
+        await asyncio.sleep(self.window)
+        del self._tasks[user_id]
+        try:
+            view = await self.render(user_id)
+            digest = self._published.changed(user_id, view)
+            if digest is None:
+                return
+            await self.publish(user_id=user_id, view=view)
+            self._published.record(user_id, digest)
+        except Exception:
+            logger.exception("Error publishing the home tab of user '%s'.", user_id)
@@ -0,0 +1,351 @@
+"""Implement the CRUD operations used by the asynchronous app, using the Motor async driver for MongoDB.
+
+Each function is the async version of the function with the same name in crud.py, with the same arguments and
+return values, except that db is an AsyncIOMotorDatabase. Refer to crud.py for the full documentation.
+"""
+
+import datetime
+import logging
+from typing import List, Tuple, Union
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.engine.base import RecommendationOutput
+from .crud import hash_text, recommendation_cache_key  # noqa: F401 pylint: disable=unused-import
+from .crud import get_cached_user, cache_user, invalidate_user_cache, user_cache_generation
+from .crud import CACHE_EVICTION_INTERVAL, cache_eviction_due, mark_recommendation_write_errors
+
+logger = logging.getLogger(__name__)
+
+
+async def get_user_projects(db: AsyncIOMotorDatabase, user_id: str) -> Tuple[List, bool]:
+    """Async version of crud.get_user_projects, sharing its in-process cache."""
+    cached = get_cached_user(user_id)
+    if cached is not None:
+        return cached
+    generation = user_cache_generation()
+    user = await db.users.find_one({"_id": user_id}, projection={"projects": 1})
+    projects, exists = (user.get("projects", []), True) if user else ([], False)
+    cache_user(user_id, projects, exists, generation)
+    return projects, exists
+
+
+async def get_projects_for_user(db: AsyncIOMotorDatabase, user_id: str) -> Union[List, bool]:
+    """Async version of crud.get_projects_for_user."""
+    projects, exists = await get_user_projects(db, user_id)
+    return projects if exists else False
+
+
+async def keyword_search_papers(db: AsyncIOMotorDatabase, keywords: str) -> Union[List, bool]:
+    """Async version of crud.keyword_search_papers. Returns a list of papers instead of a cursor."""
+    try:
+        cursor = db.papers.find(
+            {"$text": {"$search": keywords}},
+            projection={
+                "title": 1,
+                "authors": 1,
+                "url": 1,
+            },
+            limit=5,
+        )
+        return await cursor.to_list(length=5)
+    except Exception:
+        logger.exception("Failed to search papers by keywords.")
+        return False
+
+
+async def user_exists(db: AsyncIOMotorDatabase, user_id: str) -> bool:
+    """Async version of crud.user_exists."""
+    return (await get_user_projects(db, user_id))[1]
+
+
+async def create_user(db: AsyncIOMotorDatabase, user_id: str) -> bool:
+    """Async version of crud.create_user."""
+    try:
+        await db.users.insert_one(
+            {
+                "_id": user_id,
+                "vip": False,
+                "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
+            }
+        )
+        return True
+    except DuplicateKeyError:
+        logger.error("User '%s' already exists.", user_id)
+        return False
+    except Exception:
+        logger.exception("Failed to create user '%s'.", user_id)
+        return False
+    finally:
+        invalidate_user_cache(user_id)
+
+
+async def update_user_vip_status(db: AsyncIOMotorDatabase, user_id: str, vip_status: bool) -> bool:
+    """Async version of crud.update_user_vip_status."""
+    try:
+        response = await db.users.update_one({"_id": user_id}, {"$set": {"vip": vip_status}}, upsert=False)
+        return response.raw_result["updatedExisting"]  # type: ignore
+    except Exception:
+        logger.exception("Failed to update the VIP status of user '%s'.", user_id)
+        return False
+    finally:
+        invalidate_user_cache(user_id)
+
+
+async def add_project(db: AsyncIOMotorDatabase, user_id: str, project_title: str, project_description: str) -> bool:
+    """Async version of crud.add_project."""
+    try:
+        project_id = (
+            await db.projects.insert_one(
+                {
+                    "user_id": user_id,
+                    "title": project_title,
+                    "description": project_description,
+                    "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
+                }
+            )
+        ).inserted_id
+
+        response = await db.users.update_one(
+            {"_id": user_id},
+            {
+                "$push": {
+                    "projects": {
+                        "title": project_title,
+                        "description": project_description,
+                        "project_id": project_id,
+                    }
+                }
+            },
+            upsert=False,
+        )
+        return response.raw_result["updatedExisting"]  # type: ignore
+    except Exception:
+        logger.exception("Failed to add a project for user '%s'.", user_id)
+        return False
+    finally:
+        invalidate_user_cache(user_id)
+
+
+async def delete_project(db: AsyncIOMotorDatabase, user_id: str, project_id: Union[ObjectId, str]) -> bool:
+    """Async version of crud.delete_project."""
+    if isinstance(project_id, str):
+        project_id = ObjectId(project_id)
+    try:
+        response = await db.users.update_one(
+            {"_id": user_id},
+            {"$pull": {"projects": {"project_id": project_id}}},
+            upsert=False,
+        )
+        return response.raw_result["updatedExisting"]  # type: ignore
+    except Exception:
+        logger.exception("Failed to delete a project for user '%s'.", user_id)
+        return False
+    finally:
+        invalidate_user_cache(user_id)
+
+
+async def insert_paper(
+    db: AsyncIOMotorDatabase, paper: Paper, canonical_urls: Union[List[str], None] = None
+) -> Union[ObjectId, bool]:
+    """Async version of crud.insert_paper."""
+    document = {
+        "url": paper.url,
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
+    }
+    if canonical_urls:
+        document["canonical_urls"] = list(dict.fromkeys(canonical_urls))
+    try:
+        return (await db.papers.insert_one(document)).inserted_id
+    except DuplicateKeyError:
+        response = None
+        if canonical_urls:
+            response = await db.papers.find_one({"canonical_urls": {"$in": canonical_urls}}, projection={"_id": 1})
+        if not response:
+            response = await db.papers.find_one({"url": paper.url, "title": paper.title, "authors": paper.authors})
+            if response and canonical_urls:
+                try:
+                    await db.papers.update_one(
+                        {"_id": response["_id"]}, {"$addToSet": {"canonical_urls": {"$each": canonical_urls}}}
+                    )
+                except Exception:
+                    logger.exception("Failed to add canonical URLs to the existing paper: %s.", paper.url)
+        if response:
+            return response["_id"]
+        logger.error(
+            "The paper exists in database when trying to insert, but failed to retrieve it from the database. URL: '%s'.",
+            paper.url,
+        )
+        return False
+    except Exception:
+        logger.exception("Failed to insert a new paper extracted from: %s.", paper.url)
+        return False
+
+
+async def find_paper_by_canonical_url(db: AsyncIOMotorDatabase, canonical_url: str) -> Union[dict, None]:
+    """Async version of crud.find_paper_by_canonical_url."""
+    try:
+        return await db.papers.find_one(
+            {"canonical_urls": canonical_url},
+            projection={"url": 1, "title": 1, "authors": 1, "abstract": 1},
+        )
+    except Exception:
+        logger.exception("Failed to find the paper with canonical URL '%s'.", canonical_url)
+        return None
+
+
+async def insert_recommendation(db: AsyncIOMotorDatabase, record: dict) -> Union[ObjectId, bool]:
+    """Async version of crud.insert_recommendation."""
+    try:
+        return (await db.recommendations.insert_one(record)).inserted_id
+    except Exception:
+        logger.exception("Failed to insert a new recommendation for user '%s'.", record["user_id"])
+        return False
+
+
+async def insert_recommendations(db: AsyncIOMotorDatabase, records: List[dict]) -> List[Union[ObjectId, bool, None]]:
+    """Async version of crud.insert_recommendations."""
+    if not records:
+        return []
+    for record in records:
+        record.setdefault("_id", ObjectId())
+    ids = [record["_id"] for record in records]  # type: List[Union[ObjectId, bool, None]]
+    try:
+        await db.recommendations.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        mark_recommendation_write_errors(ids, e)
+    except Exception:
+        logger.exception("Failed to insert %d recommendations.", len(records))
+        return [False] * len(records)
+    return ids
+
+
+async def update_recommendation_feedback(
+    db: AsyncIOMotorDatabase,
+    recommendation_id: Union[ObjectId, str],
+    agreement: bool,
+) -> bool:
+    """Async version of crud.update_recommendation_feedback."""
+    if isinstance(recommendation_id, str):
+        recommendation_id = ObjectId(recommendation_id)
+    try:
+        response = await db.recommendations.update_one(
+            {"_id": recommendation_id},
+            {"$set": {"feedback.agreement": agreement}},
+            upsert=False,
+        )
+        return response.raw_result["updatedExisting"]  # type: ignore
+    except Exception:
+        logger.exception("Failed to update the recommendation '%s' with user agreement feedback.", recommendation_id)
+        return False
+
+
+async def update_recommendation_feedback_reason(
+    db: AsyncIOMotorDatabase,
+    recommendation_id: Union[ObjectId, str],
+    reason: str,
+) -> bool:
+    """Async version of crud.update_recommendation_feedback_reason."""
+    if isinstance(recommendation_id, str):
+        recommendation_id = ObjectId(recommendation_id)
+    try:
+        response = await db.recommendations.update_one(
+            {"_id": recommendation_id},
+            {"$set": {"feedback.reason": reason}},
+            upsert=False,
+        )
+        return response.raw_result["updatedExisting"]  # type: ignore
+    except Exception:
+        logger.exception(
+            "Failed to update the recommendation '%s' with user's explanation of the feeback.", recommendation_id
+        )
+        return False
+
+
+async def get_cached_recommendation(db: AsyncIOMotorDatabase, key: dict) -> Union[RecommendationOutput, None]:
+    """Async version of crud.get_cached_recommendation."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        cached = await db.recommendation_cache.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}},
+            projection={"decision": 1, "explanation": 1},
+        )
+    except Exception:
+        logger.exception("Failed to retrieve the cached recommendation for paper '%s'.", key["paper_id"])
+        return None
+    if cached:
+        return RecommendationOutput(decision=cached["decision"], explanation=cached["explanation"])
+    return None
+
+
+async def cache_recommendation(
+    db: AsyncIOMotorDatabase,
+    key: dict,
+    recommendation: RecommendationOutput,
+    ttl: datetime.timedelta,
+    max_entries: int,
+    eviction_interval: int = CACHE_EVICTION_INTERVAL,
+) -> bool:
+    """Async version of crud.cache_recommendation."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        await db.recommendation_cache.replace_one(
+            {"_id": key},
+            {
+                "decision": recommendation.decision,
+                "explanation": recommendation.explanation,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + ttl,
+            },
+            upsert=True,
+        )
+        if not cache_eviction_due(eviction_interval):
+            return True
+        excess = await db.recommendation_cache.estimated_document_count() - max_entries
+        if excess > 0:
+            cursor = db.recommendation_cache.find(projection={"_id": 1}, sort=[("last_used_at", 1)], limit=excess)
+            lru_ids = [doc["_id"] async for doc in cursor]
+            await db.recommendation_cache.delete_many({"_id": {"$in": lru_ids}})
+        return True
+    except Exception:
+        logger.exception("Failed to cache the recommendation for paper '%s'.", key["paper_id"])
+        return False
+
+
+async def get_embeddings(db: AsyncIOMotorDatabase, collection: str, ids: List[ObjectId], model: str) -> dict:
+    """Async version of crud.get_embeddings."""
+    try:
+        cursor = db[collection].find(
+            {"_id": {"$in": ids}, "embedding.model": model},
+            projection={"embedding.vector": 1},
+        )
+        return {document["_id"]: document["embedding"]["vector"] async for document in cursor}
+    except Exception:
+        logger.exception("Failed to retrieve embeddings from the %s collection.", collection)
+        return {}
+
+
+async def set_embeddings(db: AsyncIOMotorDatabase, collection: str, embeddings: dict, model: str) -> bool:
+    """Async version of crud.set_embeddings."""
+    if not embeddings:
+        return True
+    try:
+        await db[collection].bulk_write(
+            [
+                UpdateOne({"_id": doc_id}, {"$set": {"embedding": {"model": model, "vector": vector}}})
+                for doc_id, vector in embeddings.items()
+            ],
+            ordered=False,
+        )
+        return True
+    except Exception:
+        logger.exception("Failed to store embeddings in the %s collection.", collection)
+        return False
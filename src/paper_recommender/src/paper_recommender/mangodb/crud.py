@@ -1,11 +1,16 @@
 """Implement all the CRUD operations for the MongoDB database."""
 
 import datetime
+import hashlib
+import itertools
 import logging
-from typing import Union, List
+import threading
+import time
+from typing import Dict, List, Set, Tuple, Union
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.database import Database
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from pymongo.cursor import Cursor
 
 # from pymongo.mongo_client import MongoClient
@@ -13,9 +18,104 @@ from pymongo.cursor import Cursor
 # from pymongo.read_concern import ReadConcern
 
 from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.engine.base import RecommendationOutput
 
 logger = logging.getLogger(__name__)
 
+# the code of the write errors caused by a unique index
+DUPLICATE_KEY_ERROR = 11000
+
+# In-process cache of the projects of users, so that opening the App Home doesn't always need a database round trip.
+# The entries are invalidated by the functions below that modify a user in this process. Changes made by other
+# processes are seen once the entries expire.
+USER_CACHE_TTL = 60.0
+USER_CACHE_MAX_ENTRIES = 1000
+_user_cache = {}  # type: Dict[str, Tuple[float, List, bool]]
+_user_cache_lock = threading.Lock()
+# incremented by every invalidation, so that a read that started before a modification is not cached after it
+_user_cache_generation = 0
+
+
+def _copy_projects(projects: List) -> List:
+    """Copy a list of projects, so that the callers and the in-process cache never share the same project dicts."""
+    return [dict(project) for project in projects]
+
+
+def get_cached_user(user_id: str) -> Union[Tuple[List, bool], None]:
+    """Get the projects and the existence of a user from the in-process cache.
+
+    Args:
+        user_id: The user ID in string.
+
+    Returns:
+        A tuple of a copy of the projects and the existence of the user, which the caller can modify without
+        changing the cache. None if the user is not cached or the entry expired."""
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > USER_CACHE_TTL:
+            del _user_cache[user_id]
+            return None
+        return _copy_projects(entry[1]), entry[2]
+
+
+def user_cache_generation() -> int:
+    """Get the current generation of the in-process cache, to be passed to cache_user after reading a user."""
+    return _user_cache_generation
+
+
+def cache_user(user_id: str, projects: List, exists: bool, generation: int):
+    """Cache the projects and the existence of a user in the in-process cache, evicting the oldest entries if full.
+
+    Args:
+        user_id: The user ID in string.
+        projects: The list of projects of the user. A copy is cached, so the caller can keep modifying it.
+        exists: Whether the user exists in the database.
+        generation: The generation of the cache before the user was read. The user is not cached if any user was
+            modified since then, as the read may be outdated."""
+    with _user_cache_lock:
+        if generation != _user_cache_generation:
+            return
+        _user_cache.pop(user_id, None)
+        while len(_user_cache) >= USER_CACHE_MAX_ENTRIES:
+            # dictionaries keep the insertion order, so the first entry is the oldest
+            del _user_cache[next(iter(_user_cache))]
+        _user_cache[user_id] = (time.monotonic(), _copy_projects(projects), exists)
+
+
+def invalidate_user_cache(user_id: str):
+    """Remove a user from the in-process cache. Called whenever the user is modified.
+
+    Args:
+        user_id: The user ID in string."""
+    global _user_cache_generation
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+        _user_cache_generation += 1
+
+
+def get_user_projects(db: Database, user_id: str) -> Tuple[List, bool]:
+    """Get the projects of a user and whether the user exists, with a single projected query.
+
+    The result is served from the in-process cache while it is fresh.
+
+    Args:
+        db: The MongoDB database object.
+        user_id: The user ID in string.
+
+    Returns:
+        A tuple of the current list of projects of the user, empty if the user has no project or does not exist,
+        and True if the user exists in the database."""
+    cached = get_cached_user(user_id)
+    if cached is not None:
+        return cached
+    generation = user_cache_generation()
+    user = db.users.find_one({"_id": user_id}, projection={"projects": 1})
+    projects, exists = (user.get("projects", []), True) if user else ([], False)
+    cache_user(user_id, projects, exists, generation)
+    return projects, exists
+
 
 def get_projects_for_user(db: Database, user_id: str) -> Union[List, bool]:
     """Get all the projects of a user.
@@ -26,20 +126,10 @@ def get_projects_for_user(db: Database, user_id: str) -> Union[List, bool]:
 
     Returns:
         The current list of projects of the user.
-        False if the user does not exist or an error occurred.
+        False if the user does not exist.
     """
-    user = db.users.find_one({"_id": user_id})
-    if user:
-        try:
-            return user["projects"]
-        except Exception:
-            logger.error(
-                "The user '%s' exists, but failed to retrieve projects for the user.",
-                user_id,
-            )
-            return False
-    else:
-        return False
+    projects, exists = get_user_projects(db, user_id)
+    return projects if exists else False
 
 
 def keyword_search_papers(db: Database, keywords: str) -> Union[Cursor, bool]:
@@ -80,8 +170,7 @@ def user_exists(db: Database, user_id: str) -> bool:
 
     Returns:
         True if the user exists in the database. False otherwise."""
-    user = db.users.find_one({"_id": user_id})
-    return True if user else False
+    return get_user_projects(db, user_id)[1]
 
 
 def create_user(db: Database, user_id: str) -> bool:
@@ -108,6 +197,9 @@ def create_user(db: Database, user_id: str) -> bool:
     except Exception:
         logger.exception("Failed to create user '%s'.", user_id)
         return False
+    finally:
+        # the user is modified, or may have been modified if an error occurred
+        invalidate_user_cache(user_id)
 
 
 def update_user_vip_status(db: Database, user_id: str, vip_status: bool) -> bool:
@@ -126,6 +218,9 @@ def update_user_vip_status(db: Database, user_id: str, vip_status: bool) -> bool
     except Exception:
         logger.exception("Failed to update the VIP status of user '%s'.", user_id)
         return False
+    finally:
+        # the user is modified, or may have been modified if an error occurred
+        invalidate_user_cache(user_id)
 
 
 def add_project(db: Database, user_id: str, project_title: str, project_description: str) -> bool:
@@ -171,6 +266,9 @@ def add_project(db: Database, user_id: str, project_title: str, project_descript
     except Exception:
         logger.exception("Failed to add a project for user '%s'.", user_id)
         return False
+    finally:
+        # the user is modified, or may have been modified if an error occurred
+        invalidate_user_cache(user_id)
 
 
 def delete_project(db: Database, user_id: str, project_id: Union[ObjectId, str]) -> bool:
@@ -205,6 +303,9 @@ def delete_project(db: Database, user_id: str, project_id: Union[ObjectId, str])
     except Exception:
         logger.exception("Failed to delete a project for user '%s'.", user_id)
         return False
+    finally:
+        # the user is modified, or may have been modified if an error occurred
+        invalidate_user_cache(user_id)
 
 
 # def insert_update_project_transaction(
@@ -272,31 +373,46 @@ def delete_project(db: Database, user_id: str, project_id: Union[ObjectId, str])
 #         return False
 
 
-def insert_paper(db: Database, paper: Paper) -> Union[ObjectId, bool]:
+def insert_paper(db: Database, paper: Paper, canonical_urls: Union[List[str], None] = None) -> Union[ObjectId, bool]:
     """Insert a new document to the papers collection.
 
     args:
         db: The MongoDB database object.
         paper: The Paper object.
+        canonical_urls: The canonical forms of the URLs the paper is known by, used to find the paper
+            without extracting it again. See paper_extraction.from_url.canonical_url.
 
     Returns:
         The paper ID (ObjectId) if the operation is successful. False otherwise."""
+    document = {
+        "url": paper.url,
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
+    }
+    if canonical_urls:
+        document["canonical_urls"] = list(dict.fromkeys(canonical_urls))
     try:
-        paper_id = db.papers.insert_one(
-            {
-                "url": paper.url,
-                "title": paper.title,
-                "authors": paper.authors,
-                "abstract": paper.abstract,
-                "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
-            }
-        ).inserted_id
+        paper_id = db.papers.insert_one(document).inserted_id
         return paper_id
     except DuplicateKeyError:
         # if the paper already exists, return the existing paper id
         # we still want to return the paper id,
         # because a recommendation may still be created since project might be different
-        response = db.papers.find_one({"url": paper.url, "title": paper.title, "authors": paper.authors})
+        response = None
+        if canonical_urls:
+            response = db.papers.find_one({"canonical_urls": {"$in": canonical_urls}}, projection={"_id": 1})
+        if not response:
+            response = db.papers.find_one({"url": paper.url, "title": paper.title, "authors": paper.authors})
+            # papers inserted before canonical URLs existed, or known by another URL, learn the new canonical URLs
+            if response and canonical_urls:
+                try:
+                    db.papers.update_one(
+                        {"_id": response["_id"]}, {"$addToSet": {"canonical_urls": {"$each": canonical_urls}}}
+                    )
+                except Exception:
+                    logger.exception("Failed to add canonical URLs to the existing paper: %s.", paper.url)
         if response:
             return response["_id"]
         else:
@@ -313,6 +429,25 @@ def insert_paper(db: Database, paper: Paper) -> Union[ObjectId, bool]:
         return False
 
 
+def find_paper_by_canonical_url(db: Database, canonical_url: str) -> Union[dict, None]:
+    """Find a paper by the canonical form of a URL it is known by, using the unique index on canonical_urls.
+
+    Args:
+        db: The MongoDB database object.
+        canonical_url: The canonical form of the URL. See paper_extraction.from_url.canonical_url.
+
+    Returns:
+        The paper document with the url, title, authors and abstract. None if not found or an error occurred."""
+    try:
+        return db.papers.find_one(
+            {"canonical_urls": canonical_url},
+            projection={"url": 1, "title": 1, "authors": 1, "abstract": 1},
+        )
+    except Exception:
+        logger.exception("Failed to find the paper with canonical URL '%s'.", canonical_url)
+        return None
+
+
 def insert_recommendation(db: Database, record: dict) -> Union[ObjectId, bool]:
     """Insert a new document to the recommendations collection.
 
@@ -333,6 +468,128 @@ def insert_recommendation(db: Database, record: dict) -> Union[ObjectId, bool]:
         return False
 
 
+def insert_recommendations(db: Database, records: List[dict]) -> List[Union[ObjectId, bool, None]]:
+    """Insert several documents to the recommendations collection with a single unordered bulk insert.
+
+    The IDs are assigned before the insert, so that the ID of each record is known even if other records fail.
+    A record whose delivery_key is already recorded, e.g. by an earlier attempt of the same job, is not inserted.
+
+    Args:
+        db: The MongoDB database object.
+        records: The recommendation records in dictionaries.
+
+    Returns:
+        A list with the recommendation ID (ObjectId) of each record, in the same order as the records.
+        An item is None if the record was already recorded, and False if it failed to be inserted."""
+    if not records:
+        return []
+    for record in records:
+        record.setdefault("_id", ObjectId())
+    ids = [record["_id"] for record in records]  # type: List[Union[ObjectId, bool, None]]
+    try:
+        # unordered, so that a failed record doesn't prevent the following records from being inserted
+        db.recommendations.insert_many(records, ordered=False)
+    except BulkWriteError as e:
+        mark_recommendation_write_errors(ids, e)
+    except Exception:
+        logger.exception("Failed to insert %d recommendations.", len(records))
+        return [False] * len(records)
+    return ids
+
+
+def mark_recommendation_write_errors(ids: List[Union[ObjectId, bool, None]], error: BulkWriteError):
+    """Mark the records of a failed bulk insert of recommendations: None if already recorded, False otherwise."""
+    for write_error in error.details.get("writeErrors", []):
+        ids[write_error["index"]] = None if write_error.get("code") == DUPLICATE_KEY_ERROR else False
+    if ids.count(None):
+        logger.info("Skipped %d recommendation(s) that were already recorded.", ids.count(None))
+    if ids.count(False):
+        logger.error("Failed to insert %d of %d recommendations.", ids.count(False), len(ids))
+
+
+def find_recorded_delivery_keys(db: Database, delivery_keys: List[str]) -> Union[Set[str], bool]:
+    """Find which recommendations are already recorded, by their delivery keys.
+
+    Args:
+        db: The MongoDB database object.
+        delivery_keys: The delivery keys of the recommendations, see pipeline.delivery_key.
+
+    Returns:
+        The delivery keys that are already recorded. False if the operation failed."""
+    if not delivery_keys:
+        return set()
+    try:
+        cursor = db.recommendations.find({"delivery_key": {"$in": delivery_keys}}, projection={"delivery_key": 1})
+        return {record["delivery_key"] for record in cursor}
+    except Exception:
+        logger.exception("Failed to find the recorded recommendations of %d delivery keys.", len(delivery_keys))
+        return False
+
+
+def recommendation_content_hash(project_description: str, paper_abstract: str) -> str:
+    """Hash the texts a recommendation was made from, so that they don't need to be copied into the record.
+
+    Args:
+        project_description: The description of the project in string.
+        paper_abstract: The abstract of the paper in string.
+
+    Returns:
+        The SHA-256 hex digest of the texts."""
+    # the separator keeps ("ab", "c") and ("a", "bc") apart
+    return hash_text(f"{project_description}\x00{paper_abstract}")
+
+
+def get_recommendations_with_text(db: Database, query: dict, limit: int = 0) -> Union[List[dict], bool]:
+    """Get recommendations along with the project description and the paper abstract they were made from.
+
+    The texts are joined in from the projects and papers collections with $lookup. Records created before the
+    compact schema, which still contain the texts, are returned as they are.
+
+    Args:
+        db: The MongoDB database object.
+        query: The filter on the recommendations collection, e.g. {"user_id": user_id}.
+        limit: The maximum number of recommendations to return. 0 for no limit.
+
+    Returns:
+        A list of recommendation documents with "project_description" and "paper_abstract" fields.
+        False if an error occurred."""
+    pipeline = [{"$match": query}]  # type: List[dict]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {
+            "$lookup": {
+                "from": "projects",
+                "localField": "project_id",
+                "foreignField": "_id",
+                "as": "project",
+            }
+        },
+        {
+            "$lookup": {
+                "from": "papers",
+                "localField": "paper_id",
+                "foreignField": "_id",
+                "as": "paper",
+            }
+        },
+        {
+            "$addFields": {
+                "project_description": {
+                    "$ifNull": ["$project_description", {"$arrayElemAt": ["$project.description", 0]}]
+                },
+                "paper_abstract": {"$ifNull": ["$paper_abstract", {"$arrayElemAt": ["$paper.abstract", 0]}]},
+            }
+        },
+        {"$project": {"project": 0, "paper": 0}},
+    ]
+    try:
+        return list(db.recommendations.aggregate(pipeline))
+    except Exception:
+        logger.exception("Failed to retrieve recommendations with their texts.")
+        return False
+
+
 def update_recommendation_feedback(
     db: Database,
     recommendation_id: Union[ObjectId, str],
@@ -389,3 +646,327 @@ def update_recommendation_feedback_reason(
             "Failed to update the recommendation '%s' with user's explanation of the feeback.", recommendation_id
         )
         return False
+
+
+def hash_text(text: str) -> str:
+    """Hash a piece of text, such as a project description, so that it can be used as part of a key.
+
+    Args:
+        text: The text in string.
+
+    Returns:
+        The SHA-256 hex digest of the text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def recommendation_cache_key(project_description: str, paper_id: Union[ObjectId, str], model: str) -> dict:
+    """Create the key of a cached recommendation.
+
+    The project description is hashed, so that editing a project (which creates a new description) never
+    reuses the recommendations of the old description.
+
+    Args:
+        project_description: The description of the project in string.
+        paper_id: The paper ID in ObjectId or string.
+        model: The model used by the engine.
+
+    Returns:
+        The key in dictionary, used as the _id of the document in the recommendation_cache collection."""
+    if isinstance(paper_id, str):
+        paper_id = ObjectId(paper_id)
+    return {
+        "description_hash": hash_text(project_description),
+        "paper_id": paper_id,
+        "model": model,
+    }
+
+
+def get_cached_recommendation(db: Database, key: dict) -> Union[RecommendationOutput, None]:
+    """Get a cached recommendation and mark it as recently used.
+
+    Args:
+        db: The MongoDB database object.
+        key: The key created by recommendation_cache_key.
+
+    Returns:
+        The cached RecommendationOutput. None if there is no valid cached recommendation or an error occurred."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        # expired documents are removed by the TTL monitor periodically, so they are also filtered out here
+        cached = db.recommendation_cache.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}},
+            projection={"decision": 1, "explanation": 1},
+        )
+    except Exception:
+        logger.exception("Failed to retrieve the cached recommendation for paper '%s'.", key["paper_id"])
+        return None
+    if cached:
+        return RecommendationOutput(decision=cached["decision"], explanation=cached["explanation"])
+    return None
+
+
+# The size of the recommendation cache is only checked every CACHE_EVICTION_INTERVAL writes of the process, rather
+# than for every (project, paper) pair of a fan-out. The TTL index expires the entries in between.
+CACHE_EVICTION_INTERVAL = 100
+_cache_writes = itertools.count()
+
+
+def cache_eviction_due(interval: int = CACHE_EVICTION_INTERVAL) -> bool:
+    """Count a write to the recommendation cache, and check if the size of the cache should be checked with it.
+
+    Args:
+        interval: The number of writes between two checks. The first write of the process is checked.
+
+    Returns:
+        True if the least recently used recommendations should be evicted with this write. False otherwise."""
+    # next() on itertools.count is atomic, so the writes of concurrent threads are counted once each
+    return next(_cache_writes) % interval == 0
+
+
+def cache_recommendation(
+    db: Database,
+    key: dict,
+    recommendation: RecommendationOutput,
+    ttl: datetime.timedelta,
+    max_entries: int,
+    eviction_interval: int = CACHE_EVICTION_INTERVAL,
+) -> bool:
+    """Cache a recommendation, and periodically evict the least recently used recommendations if the cache is too
+    large. The cache can exceed max_entries by up to eviction_interval entries between two evictions.
+
+    Args:
+        db: The MongoDB database object.
+        key: The key created by recommendation_cache_key.
+        recommendation: The RecommendationOutput to be cached.
+        ttl: How long the recommendation stays valid.
+        max_entries: The maximum number of cached recommendations.
+        eviction_interval: The number of writes of the process between two checks of the size of the cache.
+
+    Returns:
+        True if the operation is successful. False otherwise."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        db.recommendation_cache.replace_one(
+            {"_id": key},
+            {
+                "decision": recommendation.decision,
+                "explanation": recommendation.explanation,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + ttl,
+            },
+            upsert=True,
+        )
+        if not cache_eviction_due(eviction_interval):
+            return True
+        excess = db.recommendation_cache.estimated_document_count() - max_entries
+        if excess > 0:
+            lru_ids = [
+                doc["_id"]
+                for doc in db.recommendation_cache.find(projection={"_id": 1}, sort=[("last_used_at", 1)], limit=excess)
+            ]
+            db.recommendation_cache.delete_many({"_id": {"$in": lru_ids}})
+        return True
+    except Exception:
+        logger.exception("Failed to cache the recommendation for paper '%s'.", key["paper_id"])
+        return False
+
+
+def get_embeddings(db: Database, collection: str, ids: List[ObjectId], model: str) -> dict:
+    """Get the stored embeddings of documents in the projects or papers collection.
+
+    Args:
+        db: The MongoDB database object.
+        collection: The name of the collection, either "projects" or "papers".
+        ids: The IDs of the documents.
+        model: The embedding model. Embeddings created by other models are ignored.
+
+    Returns:
+        A dictionary mapping document IDs to embeddings in lists. Empty if an error occurred."""
+    try:
+        documents = db[collection].find(
+            {"_id": {"$in": ids}, "embedding.model": model},
+            projection={"embedding.vector": 1},
+        )
+        return {document["_id"]: document["embedding"]["vector"] for document in documents}
+    except Exception:
+        logger.exception("Failed to retrieve embeddings from the %s collection.", collection)
+        return {}
+
+
+def set_embeddings(db: Database, collection: str, embeddings: dict, model: str) -> bool:
+    """Store embeddings alongside the documents in the projects or papers collection.
+
+    Args:
+        db: The MongoDB database object.
+        collection: The name of the collection, either "projects" or "papers".
+        embeddings: A dictionary mapping document IDs to embeddings in lists.
+        model: The embedding model used to create the embeddings.
+
+    Returns:
+        True if the operation is successful. False otherwise."""
+    if not embeddings:
+        return True
+    try:
+        db[collection].bulk_write(
+            [
+                UpdateOne({"_id": doc_id}, {"$set": {"embedding": {"model": model, "vector": vector}}})
+                for doc_id, vector in embeddings.items()
+            ],
+            ordered=False,
+        )
+        return True
+    except Exception:
+        logger.exception("Failed to store embeddings in the %s collection.", collection)
+        return False
+
+
+def enqueue_job(db: Database, message: dict, urls: List[str]) -> Union[ObjectId, bool]:
+    """Insert a job to process the URLs shared in a Slack message.
+
+    Only the fields of the message used for processing are kept.
+
+    Args:
+        db: The MongoDB database object.
+        message: The Slack message event.
+        urls: The URLs of known domains extracted from the message.
+
+    Returns:
+        The job ID (ObjectId) if the operation is successful. False otherwise."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        return db.jobs.insert_one(
+            {
+                "message": {key: message.get(key) for key in ("text", "user", "channel", "ts")},
+                "urls": urls,
+                "status": "pending",
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now,
+                "updated_at": now,
+            }
+        ).inserted_id
+    except Exception:
+        logger.exception("Failed to enqueue the job of message '%s'.", message.get("ts"))
+        return False
+
+
+def claim_job(db: Database, worker_id: str, lease: datetime.timedelta) -> Union[dict, None]:
+    """Claim the oldest available job for a worker, with a lease.
+
+    A job is available if it is pending and its retry time has passed, or if it is running but the lease of its
+    worker has expired, which means the worker crashed or was stopped. Claiming a job increments its attempts.
+
+    Args:
+        db: The MongoDB database object.
+        worker_id: The ID of the worker claiming the job.
+        lease: How long the job is reserved for the worker, unless the lease is renewed.
+
+    Returns:
+        The claimed job document. None if no job is available or an error occurred."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        # find_one_and_update is atomic, so a job is never claimed by two workers at the same time
+        return db.jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "available_at": {"$lte": now}},
+                    {"status": "running", "lease_expires_at": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "lease_expires_at": now + lease,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        logger.exception("Worker '%s' failed to claim a job.", worker_id)
+        return None
+
+
+def renew_job_lease(db: Database, job_id: ObjectId, worker_id: str, lease: datetime.timedelta) -> bool:
+    """Extend the lease of a running job, so that it is not claimed by another worker.
+
+    Args:
+        db: The MongoDB database object.
+        job_id: The job ID.
+        worker_id: The ID of the worker holding the lease.
+        lease: The new duration of the lease from now.
+
+    Returns:
+        True if the lease is still held by the worker and has been extended. False otherwise."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        response = db.jobs.update_one(
+            {"_id": job_id, "status": "running", "worker_id": worker_id},
+            {"$set": {"lease_expires_at": now + lease, "updated_at": now}},
+        )
+        return response.matched_count == 1
+    except Exception:
+        logger.exception("Failed to renew the lease of job '%s'.", job_id)
+        return False
+
+
+def complete_job(db: Database, job_id: ObjectId, worker_id: str) -> bool:
+    """Mark a running job as done.
+
+    Args:
+        db: The MongoDB database object.
+        job_id: The job ID.
+        worker_id: The ID of the worker holding the lease.
+
+    Returns:
+        True if the operation is successful. False otherwise."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    try:
+        response = db.jobs.update_one(
+            {"_id": job_id, "status": "running", "worker_id": worker_id},
+            {"$set": {"status": "done", "finished_at": now, "updated_at": now}, "$unset": {"lease_expires_at": ""}},
+        )
+        return response.matched_count == 1
+    except Exception:
+        logger.exception("Failed to mark job '%s' as done.", job_id)
+        return False
+
+
+def fail_job(
+    db: Database,
+    job_id: ObjectId,
+    worker_id: str,
+    error: str,
+    retry_delay: Union[datetime.timedelta, None],
+) -> bool:
+    """Record the failure of a running job, and schedule a retry if a delay is provided.
+
+    Args:
+        db: The MongoDB database object.
+        job_id: The job ID.
+        worker_id: The ID of the worker holding the lease.
+        error: The description of the error.
+        retry_delay: How long to wait before the job can be claimed again. None to mark the job as failed for good.
+
+    Returns:
+        True if the operation is successful. False otherwise."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    if retry_delay is None:
+        update = {"status": "failed", "finished_at": now}
+    else:
+        update = {"status": "pending", "available_at": now + retry_delay}
+    update.update(last_error=error, updated_at=now)
+    try:
+        response = db.jobs.update_one(
+            {"_id": job_id, "status": "running", "worker_id": worker_id},
+            {"$set": update, "$unset": {"lease_expires_at": ""}},
+        )
+        return response.matched_count == 1
+    except Exception:
+        logger.exception("Failed to record the failure of job '%s'.", job_id)
+        return False
@@ -0,0 +1,247 @@
+"""Declare, create and verify the indexes needed by the queries of the CRUD layer.
+
+ensure_indexes is called at start up by the app and the workers. It can also be run on its own as a migration,
+with `paper_recommender_indexes`, which prints the indexes and the collection scans found by find_collection_scans.
+"""
+
+import datetime
+import json
+import logging
+from typing import Dict, List, Set, Tuple, Union
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.database import Database
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+from paper_recommender.settings import configs
+
+logger = logging.getLogger(__name__)
+
+
+# the indexes of each collection. An existing index with the same keys and options satisfies a declared index,
+# whatever its name, so that indexes created by hand or by earlier versions are not created twice.
+INDEXES = {
+    "papers": [
+        # keyword_search_papers
+        IndexModel([("title", TEXT), ("authors", TEXT), ("abstract", TEXT)], name="papers_text"),
+        # duplicate detection in insert_paper. authors is an array, so the index is multikey and its uniqueness is
+        # checked per author: two papers with the same url and title conflict if they share any author, not only if
+        # their whole author lists are equal. This is intended, since such papers are the same paper.
+        IndexModel(
+            [("url", ASCENDING), ("title", ASCENDING), ("authors", ASCENDING)], name="paper_unique", unique=True
+        ),
+        # find_paper_by_canonical_url. Papers inserted before the field existed don't conflict with each other.
+        IndexModel(
+            "canonical_urls",
+            name="canonical_urls_unique",
+            unique=True,
+            partialFilterExpression={"canonical_urls": {"$exists": True}},
+        ),
+    ],
+    "projects": [IndexModel("user_id", name="user_id")],
+    "recommendations": [
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)], name="user_id_created_at"),
+        IndexModel("paper_id", name="paper_id"),
+        # the retries of a job skip its recorded recommendations. Records of the app and older records have no key.
+        IndexModel(
+            "delivery_key",
+            name="delivery_key_unique",
+            unique=True,
+            partialFilterExpression={"delivery_key": {"$exists": True}},
+        ),
+    ],
+    "recommendation_cache": [
+        # expired recommendations are removed by the TTL monitor
+        IndexModel("expires_at", name="expires_at_ttl", expireAfterSeconds=0),
+        # least recently used eviction in cache_recommendation
+        IndexModel("last_used_at", name="last_used_at"),
+    ],
+    "jobs": [
+        # claim_job
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+    ],
+}  # type: Dict[str, List[IndexModel]]
+
+
+def _representative_queries() -> List[Tuple[str, dict, list]]:
+    """The (collection, filter, sort) of the queries of the CRUD layer that should use an index.
+
+    Queries by _id are left out, since the _id index always exists."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    some_id = ObjectId()
+    return [
+        ("papers", {"$text": {"$search": "transformer"}}, []),
+        ("papers", {"url": "https://example.com", "title": "Title", "authors": ["Author"]}, []),
+        ("papers", {"canonical_urls": "example.com/paper"}, []),
+        ("projects", {"user_id": "U0000000000"}, []),
+        ("recommendations", {"user_id": "U0000000000"}, [("created_at", ASCENDING)]),
+        ("recommendations", {"paper_id": some_id}, []),
+        ("recommendations", {"delivery_key": {"$in": ["C0000000000:0.0:project:paper"]}}, []),
+        ("recommendation_cache", {}, [("last_used_at", ASCENDING)]),
+        (
+            "jobs",
+            {
+                "$or": [
+                    {"status": "pending", "available_at": {"$lte": now}},
+                    {"status": "running", "lease_expires_at": {"$lte": now}},
+                ]
+            },
+            [("available_at", ASCENDING)],
+        ),
+    ]
+
+
+def _index_signature(key: list, options: dict) -> Tuple:
+    """Describe an index by its keys and options, regardless of its name.
+
+    Args:
+        key: The (field, direction) pairs of the index.
+        options: The options of the index, such as the document of an IndexModel or an entry of index_information().
+
+    Returns:
+        A hashable signature, equal for equivalent indexes. Only the options that change the behaviour of an index
+        are compared."""
+    if "weights" in options or any(direction == TEXT for _, direction in key):
+        # text indexes are listed by index_information() as _fts and _ftsx keys, with their fields in "weights"
+        fields = options.get("weights") or {field: 1 for field, direction in key if direction == TEXT}
+        key = [("$text", tuple(sorted(fields)))]
+    else:
+        key = [
+            (field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in key
+        ]
+    return (
+        tuple(key),
+        bool(options.get("unique", False)),
+        options.get("expireAfterSeconds"),
+        # index_information() returns the filter as a SON, which is compared by content
+        json.dumps(options.get("partialFilterExpression"), sort_keys=True, default=str),
+    )
+
+
+def _declared_signature(index: IndexModel) -> Tuple:
+    """The signature of a declared index."""
+    return _index_signature(list(index.document["key"].items()), index.document)
+
+
+def _existing_signatures(info: dict) -> Set[Tuple]:
+    """The signatures of the existing indexes, from the output of index_information()."""
+    return {_index_signature(options["key"], options) for options in info.values()}
+
+
+def _find_conflict(index: IndexModel, info: dict) -> Union[str, None]:
+    """Find an existing index with the same keys as a declared index but different options, which prevents its
+    creation. Returns the name of the conflicting index, or None."""
+    key = _declared_signature(index)[0]
+    for name, options in info.items():
+        if _index_signature(options["key"], options)[0] == key:
+            return name
+    return None
+
+
+def ensure_indexes(db: Database) -> bool:
+    """Create the declared indexes that don't exist, then verify that all of them exist.
+
+    An index is matched by its keys and options, not by its name, so an equivalent index that already exists under
+    another name is used as is. Each missing index is created on its own, so that one failure doesn't prevent the
+    others from being created. This is safe to call at every start up.
+
+    Args:
+        db: The MongoDB database object.
+
+    Returns:
+        True if all the declared indexes exist. False otherwise."""
+    ok = True
+    for collection, indexes in INDEXES.items():
+        try:
+            info = db[collection].index_information()
+        except Exception:
+            logger.exception("Failed to list the indexes of the %s collection.", collection)
+            ok = False
+            continue
+        existing = _existing_signatures(info)
+        for index in indexes:
+            name = index.document["name"]
+            if _declared_signature(index) in existing:
+                continue
+            conflict = _find_conflict(index, info)
+            if conflict:
+                logger.error(
+                    "Index '%s' of the %s collection has the keys of '%s' with other options, so it cannot be created.",
+                    conflict,
+                    collection,
+                    name,
+                )
+                ok = False
+                continue
+            try:
+                db[collection].create_indexes([index])
+            except Exception:
+                logger.exception("Failed to create index '%s' of the %s collection.", name, collection)
+                ok = False
+
+        try:
+            existing = _existing_signatures(db[collection].index_information())
+        except Exception:
+            logger.exception("Failed to list the indexes of the %s collection.", collection)
+            ok = False
+            continue
+        for index in indexes:
+            if _declared_signature(index) not in existing:
+                logger.error("Index '%s' is missing from the %s collection.", index.document["name"], collection)
+                ok = False
+    return ok
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    """List the stages of a query plan from explain(), including the stages of its input plans."""
+    stages = [plan.get("stage", "")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def find_collection_scans(db: Database) -> List[str]:
+    """Explain the representative queries of the CRUD layer, and report those that scan a whole collection.
+
+    Args:
+        db: The MongoDB database object.
+
+    Returns:
+        A description of each query whose winning plan contains a collection scan."""
+    scans = []
+    for collection, query, sort in _representative_queries():
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        except Exception:
+            logger.exception("Failed to explain a query on the %s collection.", collection)
+            continue
+        # on sharded clusters the plan of each shard is nested under "shards"
+        plans = [shard["winningPlan"] for shard in plan.get("shards", [])] or [plan]
+        if any("COLLSCAN" in _plan_stages(shard_plan) for shard_plan in plans):
+            description = f"{collection}: find({query}) sort({sort})"
+            logger.warning("Collection scan found: %s", description)
+            scans.append(description)
+    return scans
+
+
+def main():
+    """Entry point of `paper_recommender_indexes`. Creates and verifies the indexes, and prints a report."""
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    with MongoClient(configs["App"]["mongodb_connect_str"], server_api=ServerApi("1")) as client:
+        db = client["paper_recommender"]
+        ok = ensure_indexes(db)
+        for collection in INDEXES:
+            print(f"{collection}: {', '.join(sorted(db[collection].index_information()))}")
+        scans = find_collection_scans(db)
+    print("All indexes exist." if ok else "Some indexes are missing; see the errors above.")
+    print(f"{len(scans)} collection scan(s) found." + "".join(f"\n  {scan}" for scan in scans))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Migrations of the documents stored by earlier versions of the app.
+
+Run them with `paper_recommender_migrate`. Every migration can be run again safely; documents that have already
+been migrated are skipped.
+"""
+
+import logging
+from typing import List
+from pymongo import UpdateOne
+from pymongo.database import Database
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+from paper_recommender.settings import configs
+from .crud import recommendation_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def compact_recommendations(db: Database, batch_size: int = 1000) -> dict:
+    """Remove the project description and the paper abstract copied into recommendation records.
+
+    The content hash of the copied texts is stored instead. The texts are only removed if the referenced project
+    and paper still have the same texts, so that they can be joined back in with crud.get_recommendations_with_text.
+    Records whose references are missing or differ keep their texts.
+
+    Args:
+        db: The MongoDB database object.
+        batch_size: The number of records updated with each bulk write.
+
+    Returns:
+        A dictionary with the number of "compacted" and "kept" records."""
+    counts = {"compacted": 0, "kept": 0}
+    cursor = db.recommendations.find(
+        {"$or": [{"project_description": {"$exists": True}}, {"paper_abstract": {"$exists": True}}]},
+        projection={"project_id": 1, "paper_id": 1, "project_description": 1, "paper_abstract": 1},
+        batch_size=batch_size,
+    )
+    batch = []  # type: List[dict]
+    for record in cursor:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _compact_batch(db, batch, counts)
+            batch = []
+    if batch:
+        _compact_batch(db, batch, counts)
+    logger.info("Compacted %d recommendation(s); kept the texts of %d.", counts["compacted"], counts["kept"])
+    return counts
+
+
+def _compact_batch(db: Database, records: List[dict], counts: dict):
+    """Compact a batch of recommendation records, looking up their projects and papers with one query each."""
+    projects = {
+        project["_id"]: project.get("description")
+        for project in db.projects.find(
+            {"_id": {"$in": list({record.get("project_id") for record in records})}}, projection={"description": 1}
+        )
+    }
+    papers = {
+        paper["_id"]: paper.get("abstract")
+        for paper in db.papers.find(
+            {"_id": {"$in": list({record.get("paper_id") for record in records})}}, projection={"abstract": 1}
+        )
+    }
+    updates = []
+    for record in records:
+        description, abstract = record.get("project_description"), record.get("paper_abstract")
+        if projects.get(record.get("project_id")) != description or papers.get(record.get("paper_id")) != abstract:
+            counts["kept"] += 1
+            continue
+        updates.append(
+            UpdateOne(
+                {"_id": record["_id"]},
+                {
+                    "$set": {"content_hash": recommendation_content_hash(description, abstract)},
+                    "$unset": {"project_description": "", "paper_abstract": ""},
+                },
+            )
+        )
+    if updates:
+        counts["compacted"] += db.recommendations.bulk_write(updates, ordered=False).modified_count
+
+
+def main():
+    """Entry point of `paper_recommender_migrate`. Runs all the migrations and prints a report."""
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    with MongoClient(configs["App"]["mongodb_connect_str"], server_api=ServerApi("1")) as client:
+        counts = compact_recommendations(client["paper_recommender"])
+    print(f"Recommendations: {counts['compacted']} compacted, {counts['kept']} kept with their texts.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,11 @@ For example: https://ojs.aaai.org/index.php/AAAI/article/view/25087
 
 import logging
 from typing import Union, List
-import requests
+from requests import Response
 from bs4 import BeautifulSoup
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,7 @@ class AAAI(PaperExtractionBase):
     """Extract paper information from AAAI proceedings."""
 
     DOMAIN = "ojs.aaai.org"
+    PARSES_PAGE = True
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -30,13 +33,23 @@ class AAAI(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an AAAI proceeding. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return AAAI.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched AAAI page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content)
         abstract = AAAI._extract_abstract(soup)
         title = AAAI._extract_title(soup)
         authors = AAAI._extract_authors(soup)
@@ -1,4 +1,4 @@
-"""Implementation of the ACLAnthology class to extract paper information from ACL Anthology 
+"""Implementation of the ACLAnthology class to extract paper information from ACL Anthology
 proceedings using webscraping.
 
 For example:
@@ -7,9 +7,11 @@ https://aclanthology.org/2023.acl-long.18/
 
 import logging
 from typing import Union, List
-import requests
+from requests import Response
 from bs4 import BeautifulSoup
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,7 @@ class ACLAnthology(PaperExtractionBase):
     """Extract paper information from ACL Anthology proceedings."""
 
     DOMAIN = "aclanthology.org"
+    PARSES_PAGE = True
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -32,13 +35,23 @@ class ACLAnthology(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an ACL Anthology proceeding. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return ACLAnthology.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched ACL Anthology page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content)
         abstract = ACLAnthology._extract_abstract(soup)
         title = ACLAnthology._extract_title(soup)
         authors = ACLAnthology._extract_authors(soup)
@@ -4,13 +4,20 @@ Implementation of the Arxiv class to extract paper information from arxiv.
 Thank you to arXiv for use of its open access interoperability.
 """
 
+import asyncio
 import logging
 import re
+import threading
+import time
 from urllib.parse import urlparse
-from typing import Union
+from typing import Dict, List, Union
 import feedparser
+import httpx
 from feedparser import FeedParserDict
+from requests import Response
 from .base import PaperExtractionBase, Paper
+from .http_session import http_get, cached_http_get, async_http_get, async_cached_http_get
+from .domains import matches_domain
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,19 @@ class Arxiv(PaperExtractionBase):
     """Extract paper information from arxiv."""
 
     DOMAIN = "arxiv.org"
+    # the host of the API, whose pages are sometimes shared, and the historical host of arxiv, which still redirects
+    # to arxiv.org
+    MIRRORS = ("export.arxiv.org", "xxx.lanl.gov")
+
+    API_URL = "http://export.arxiv.org/api/query"
+    # maximum number of ids in a single API request
+    API_BATCH_SIZE = 100
+    # arxiv asks API users to wait 3 seconds between requests
+    API_DELAY = 3.0
+    _api_lock = threading.Lock()
+    _api_last_request = 0.0
+    # created on first use, since it must belong to the running event loop
+    _async_api_lock = None  # type: Union[asyncio.Lock, None]
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -43,27 +63,167 @@ class Arxiv(PaperExtractionBase):
             response = response.entries[0]
         else:
             return None
-        paper = Paper(
-            url=response.link,
-            title=response.title,
-            authors=[author.name for author in response.authors],
-            abstract=response.summary,
+        return Arxiv._paper_from_entry(response)
+
+    @staticmethod
+    def extract_from_ids(paper_ids: List[str]) -> Dict[str, Paper]:
+        """Extract paper information for many arxiv ids at once, using as few API requests as possible.
+
+        The ids are sent in pages of API_BATCH_SIZE using the id_list parameter of the arxiv API, waiting API_DELAY
+        seconds between requests. This can be used for the ids shared in a message, or for backfilling papers.
+
+        Args:
+            paper_ids: arxiv ids of the papers to be retrieved, without versions.
+
+        Returns:
+            A dictionary mapping the arxiv ids to Paper dataclasses. Ids that could not be retrieved are missing.
+        """
+        papers = {}  # type: Dict[str, Paper]
+        paper_ids = list(dict.fromkeys(paper_ids))
+        for start in range(0, len(paper_ids), Arxiv.API_BATCH_SIZE):
+            batch = paper_ids[start : start + Arxiv.API_BATCH_SIZE]
+            response = Arxiv.arxiv_api_id(",".join(batch), max_results=len(batch))
+            if response:
+                papers.update(Arxiv._papers_from_response(response, batch))
+        Arxiv._log_missing(paper_ids, papers)
+        return papers
+
+    @staticmethod
+    async def async_extract_from_ids(paper_ids: List[str]) -> Dict[str, Paper]:
+        """Async version of extract_from_ids, using the shared async HTTP client and the response cache.
+
+        Args:
+            paper_ids: arxiv ids of the papers to be retrieved, without versions.
+
+        Returns:
+            A dictionary mapping the arxiv ids to Paper dataclasses. Ids that could not be retrieved are missing.
+        """
+        papers = {}  # type: Dict[str, Paper]
+        paper_ids = list(dict.fromkeys(paper_ids))
+        for start in range(0, len(paper_ids), Arxiv.API_BATCH_SIZE):
+            batch = paper_ids[start : start + Arxiv.API_BATCH_SIZE]
+            try:
+                # the same URL as arxiv_api_id, so that both apps share the cached responses
+                response = await async_cached_http_get(
+                    f"{Arxiv.API_URL}?id_list={','.join(batch)}&max_results={len(batch)}", send=Arxiv._async_api_get
+                )
+                response.raise_for_status()
+            except Exception:
+                logger.exception("Something went wrong while retrieving papers with the arxiv API.")
+                continue
+            papers.update(Arxiv._papers_from_response(feedparser.parse(response.content), batch))
+        Arxiv._log_missing(paper_ids, papers)
+        return papers
+
+    @staticmethod
+    def _papers_from_response(response: FeedParserDict, paper_ids: List[str]) -> Dict[str, Paper]:
+        """Create Paper dataclasses from the entries of an arxiv API response.
+
+        Args:
+            response: A feedparser.util.FeedParserDict containing the API response.
+            paper_ids: The arxiv ids that were requested. Entries for other ids are ignored.
+
+        Returns:
+            A dictionary mapping the arxiv ids to Paper dataclasses.
+        """
+        papers = {}
+        for entry in response.entries:
+            # invalid ids are returned as an entry titled "Error" without an id
+            paper_id = Arxiv._extract_paper_id_from_url(entry.get("id", ""))
+            if paper_id not in paper_ids or not entry.get("summary"):
+                continue
+            try:
+                papers[paper_id] = Arxiv._paper_from_entry(entry)
+            except Exception:
+                logger.exception("Failed to read the arxiv API entry of paper id: %s", paper_id)
+        return papers
+
+    @staticmethod
+    def _log_missing(paper_ids: List[str], papers: Dict[str, Paper]):
+        """Log the number of requested arxiv ids that could not be retrieved."""
+        missing = len(paper_ids) - len(papers)
+        if missing:
+            logger.error("Failed to retrieve %d of %d papers using the arxiv API.", missing, len(paper_ids))
+
+    @staticmethod
+    def extract_paper_ids(urls: List[str]) -> List[str]:
+        """Extract the arxiv ids of all the arxiv URLs in a list, such as the URLs shared in a message.
+
+        Args:
+            urls: A list of URLs. URLs that are not from arxiv are ignored.
+
+        Returns:
+            A list of unique arxiv ids, in the order they first appear.
+        """
+        paper_ids = []
+        for url in urls:
+            if Arxiv._arxiv_domain_check(url):
+                paper_ids += re.findall(r"\d+\.\d+", urlparse(url).path)
+        return list(dict.fromkeys(paper_ids))
+
+    @staticmethod
+    def _paper_from_entry(entry: FeedParserDict) -> Paper:
+        """Create a Paper dataclass from an entry of the arxiv API response.
+
+        Args:
+            entry: An entry of the feedparser.util.FeedParserDict containing the API response.
+
+        Returns:
+            Paper dataclass from base.py.
+        """
+        return Paper(
+            url=entry.link,
+            title=entry.title,
+            authors=[author.name for author in entry.authors],
+            abstract=entry.summary,
         )
-        return paper
 
     @staticmethod
-    def arxiv_api_id(paper_id: str) -> Union[FeedParserDict, None]:
+    def _wait_for_api():
+        """Wait until API_DELAY seconds have passed since the last request to the arxiv API, across threads."""
+        with Arxiv._api_lock:
+            wait = Arxiv._api_last_request + Arxiv.API_DELAY - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            Arxiv._api_last_request = time.monotonic()
+
+    @staticmethod
+    def _api_get(url: str, **kwargs) -> Response:
+        """Send a request to the arxiv API with http_get, after waiting for the API delay."""
+        Arxiv._wait_for_api()
+        return http_get(url, **kwargs)
+
+    @staticmethod
+    async def _async_api_get(url: str, **kwargs) -> httpx.Response:
+        """Async version of _api_get, using async_http_get."""
+        if Arxiv._async_api_lock is None:
+            Arxiv._async_api_lock = asyncio.Lock()
+        async with Arxiv._async_api_lock:
+            wait = Arxiv._api_last_request + Arxiv.API_DELAY - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            Arxiv._api_last_request = time.monotonic()
+        return await async_http_get(url, **kwargs)
+
+    @staticmethod
+    def arxiv_api_id(paper_id: str, max_results: int = 10) -> Union[FeedParserDict, None]:
         """Retriving paper information using arxiv API with the provided paper id.
 
         Args:
-            paper_id: arxiv id of the paper to be retrieved.
+            paper_id: arxiv id of the paper to be retrieved, or several ids separated by commas.
+            max_results: The maximum number of entries in the response. The API returns 10 by default.
 
         Returns:
             A feedparser.util.FeedParserDict containing the API response.
             If the paper id is invalid or other exception occured, return None.
         """
         try:
-            return feedparser.parse(f"http://export.arxiv.org/api/query?id_list={paper_id}")
+            # only the requests sent to the API wait for the API delay, fresh cached responses are returned at once
+            response = cached_http_get(
+                f"{Arxiv.API_URL}?id_list={paper_id}&max_results={max_results}", send=Arxiv._api_get
+            )
+            response.raise_for_status()
+            return feedparser.parse(response.content)
         except Exception:
             logger.exception(
                 "Something went wrong while retrieving paper with the provided URL. Likely that the "
@@ -101,5 +261,4 @@ class Arxiv(PaperExtractionBase):
         Returns:
             True if the provided url is from arxiv. False otherwise.
         """
-        parsed_url = urlparse(url)
-        return parsed_url.netloc == Arxiv.DOMAIN
+        return matches_domain(url, Arxiv.DOMAIN, Arxiv.MIRRORS)
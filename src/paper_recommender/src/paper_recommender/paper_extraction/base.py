@@ -2,7 +2,8 @@
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Union
+from typing import List, Tuple, Union
+from requests import Response
 
 
 @dataclass
@@ -26,6 +27,14 @@ class PaperExtractionBase(ABC):
     # There is no standard way to define constant class attribute for abstract class in Python.
     DOMAIN: str
 
+    # Other hosts of the source, such as mirrors, matched exactly. Only DOMAIN and its "www." variant are matched
+    # otherwise, not its other subdomains.
+    MIRRORS = ()  # type: Tuple[str, ...]
+
+    # True if the class extracts the paper from the page at the URL, which can be fetched by the caller and passed
+    # to extract_from_response. False if the class uses other means, such as an API, and only uses extract_from_url.
+    PARSES_PAGE = False
+
     @staticmethod
     @abstractmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -40,3 +49,18 @@ class PaperExtractionBase(ABC):
         Returns:
             Paper dataclass. Or None if any error or exception occured."""
         raise NotImplementedError
+
+    @classmethod
+    def extract_from_response(cls, url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched response of the provided URL.
+
+        Classes that parse the page must override this method, so that the page is only downloaded once.
+        By default the response is ignored and extract_from_url is used instead.
+
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass. Or None if any error or exception occured."""
+        return cls.extract_from_url(url)
@@ -0,0 +1,177 @@
+"""Implementation of the CitationMeta class to extract paper information from the metadata of any page, used for
+the domains without a dedicated extractor.
+
+Most publishers describe their articles with meta tags in the head of the page, for indexing by search engines:
+Highwire Press tags (citation_title, citation_author, citation_abstract), which are read by Google Scholar, Dublin
+Core tags (DC.title, DC.creator, DC.description) and OpenGraph tags (og:title, og:description). Only the pages with a
+citation_title tag are extracted, since most pages have Dublin Core or OpenGraph tags, including the pages that are not
+papers, such as blog posts and repositories; the other tags are only used for the fields that the Highwire Press tags
+lack. Only the head of the page is downloaded: the response is streamed and parsed as it arrives, and the download
+stops at the end of the head, or after a maximum number of bytes.
+
+The extractor is only used if the `generic_extraction` setting is enabled, which is off by default.
+"""
+
+import codecs
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Union
+from requests import Response
+from .base import PaperExtractionBase, Paper
+from .http_session import http_get
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_HEAD_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024
+
+# the names of the meta tags of each field, by order of preference
+TITLE_TAGS = ("citation_title", "dc.title", "og:title")
+AUTHOR_TAGS = ("citation_author", "dc.creator", "citation_authors")
+ABSTRACT_TAGS = ("citation_abstract", "dc.description", "og:description", "description")
+META_TAGS = frozenset(TITLE_TAGS + AUTHOR_TAGS + ABSTRACT_TAGS)
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+# maximum number of bytes read from each page, which can be overridden by configure_citation_meta
+_max_head_bytes = DEFAULT_MAX_HEAD_BYTES
+
+
+def configure_citation_meta(max_head_bytes: int = DEFAULT_MAX_HEAD_BYTES):
+    """Configure the generic extractor.
+
+    Args:
+        max_head_bytes: The maximum number of bytes read from each page. Pages whose head is longer are parsed up to
+            this number of bytes."""
+    global _max_head_bytes
+    _max_head_bytes = max_head_bytes
+
+
+class _MetaTagParser(HTMLParser):
+    """Collects the content of the known meta tags, until the end of the head of the page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tags = {}  # type: Dict[str, List[str]]
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.done = True
+        elif tag == "meta":
+            attributes = dict(attrs)
+            name = (attributes.get("name") or attributes.get("property") or "").lower()
+            content = attributes.get("content")
+            if name in META_TAGS and content:
+                self.tags.setdefault(name, []).append(content)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.done = True
+
+
+def _clean(text: str) -> str:
+    """Remove the markup and the extra whitespace of a meta tag, e.g. the <p> tags of some abstracts."""
+    return _SPACE_PATTERN.sub(" ", _TAG_PATTERN.sub(" ", text)).strip()
+
+
+class CitationMeta(PaperExtractionBase):
+    """Extract paper information from the citation meta tags of the head of any page."""
+
+    # matches the URLs of every domain without an extractor, see registry.ExtractorRegistry.set_fallback
+    DOMAIN = "*"
+    # the page is streamed by extract_from_url, so that only its head is downloaded
+    PARSES_PAGE = False
+
+    @staticmethod
+    def extract_from_url(url: str) -> Union[Paper, None]:
+        """Extract paper information from the meta tags of a page. Must return base.Paper dataclass.
+
+        Args:
+            url (str): URL of the paper to be extracted.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured, or if the page does not
+            describe a paper.
+        """
+        try:
+            with http_get(url, stream=True) as response:
+                if response.status_code != 200:
+                    logger.error("Failed to retrieve paper using the provided URL: %s", url)
+                    return None
+                content_type = response.headers.get("Content-Type", "")
+                if "html" not in content_type:
+                    logger.info("The provided URL is not a HTML page (%s): %s.", content_type, url)
+                    return None
+                # requests defaults to ISO-8859-1 for text pages without a charset, most pages are UTF-8
+                encoding = response.encoding if "charset" in content_type.lower() else "utf-8"
+                tags = CitationMeta._read_meta_tags(response.iter_content(CHUNK_SIZE), encoding or "utf-8")
+        except Exception:
+            logger.exception("Failed to access the provided URL: %s.", url)
+            return None
+        return CitationMeta._paper_from_tags(url, tags)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from the meta tags of an already fetched page. Must return base.Paper dataclass.
+
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured, or if the page does not
+            describe a paper.
+        """
+        tags = CitationMeta._read_meta_tags([response.content], response.encoding or "utf-8")
+        return CitationMeta._paper_from_tags(url, tags)
+
+    @staticmethod
+    def _read_meta_tags(chunks: Iterable[bytes], encoding: str) -> Dict[str, List[str]]:
+        """Parse the meta tags of a page as it is read, until the end of its head or the maximum number of bytes.
+
+        Args:
+            chunks: The content of the page, in chunks of bytes.
+            encoding: The encoding of the page.
+
+        Returns:
+            A dictionary mapping the lowercase names of the known meta tags to their contents."""
+        parser = _MetaTagParser()
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        read = 0
+        for chunk in chunks:
+            chunk = chunk[: _max_head_bytes - read]
+            read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or read >= _max_head_bytes:
+                break
+        return parser.tags
+
+    @staticmethod
+    def _paper_from_tags(url: str, tags: Dict[str, List[str]]) -> Union[Paper, None]:
+        """Build the paper from the meta tags of its page.
+
+        Args:
+            url (str): URL of the paper.
+            tags: A dictionary mapping the lowercase names of the meta tags to their contents.
+
+        Returns:
+            Paper dataclass from base.py. Or None if the citation_title tag, the authors or the abstract are missing."""
+        if "citation_title" not in tags:
+            logger.info("The provided URL does not have a citation_title meta tag: %s.", url)
+            return None
+        title = next((_clean(tags[name][0]) for name in TITLE_TAGS if name in tags), "")
+        authors = []  # type: List[str]
+        for name in AUTHOR_TAGS:
+            if name in tags:
+                # citation_authors lists all the authors in one tag, separated by semicolons
+                authors = [_clean(author) for content in tags[name] for author in content.split(";")]
+                authors = [author for author in authors if author]
+                break
+        abstract = next((_clean(tags[name][0]) for name in ABSTRACT_TAGS if name in tags), "")
+        if not title or not authors or not abstract:
+            logger.info("The provided URL does not have the citation meta tags of a paper: %s.", url)
+            return None
+        return Paper(url=url, title=title, authors=authors, abstract=abstract)
@@ -0,0 +1,164 @@
+"""Match the URLs shared in messages to the sources of papers, and log the domains that are not supported.
+
+Every link of every message is matched, so the matching avoids a full urlparse: the host is read with a precompiled
+pattern and looked up in a dictionary. A source is matched by its exact host and the "www." variant of the host, e.g.
+"www.arxiv.org" to "arxiv.org" and "nature.com" to "www.nature.com", and by the mirror hosts added explicitly, e.g.
+"export.arxiv.org". Other subdomains are not matched, since they often host other content, such as
+"blogs.nature.com".
+
+Unknown domains are logged once per process, through a buffered writer that appends to the file periodically instead
+of opening it for every URL.
+"""
+
+import atexit
+import logging
+import re
+import threading
+from typing import Dict, Generic, Iterable, List, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# the host of an absolute URL, after the scheme and the optional user information
+_HOST_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]*)")
+
+
+def url_host(url: str) -> str:
+    """Get the normalized host of a URL.
+
+    Args:
+        url: URL in string.
+
+    Returns:
+        The lowercase host without the port and the trailing dot. An empty string if the URL is not absolute."""
+    match = _HOST_PATTERN.match(url.strip())
+    return match.group(1).lower().rstrip(".") if match else ""
+
+
+def host_variants(host: str) -> Tuple[str, str]:
+    """Get a host and its "www." variant, e.g. ("arxiv.org", "www.arxiv.org") or ("www.nature.com", "nature.com")."""
+    return (host, host[4:]) if host.startswith("www.") else (host, f"www.{host}")
+
+
+def matches_domain(url: str, domain: str, mirrors: Iterable[str] = ()) -> bool:
+    """Check if a URL belongs to a domain, its "www." variant or one of its mirror hosts.
+
+    Args:
+        url: URL in string.
+        domain: The domain of the source.
+        mirrors: Other hosts of the source.
+
+    Returns:
+        True if the URL belongs to the source. False otherwise."""
+    host = url_host(url)
+    return host in host_variants(domain) or host in mirrors
+
+
+class DomainResolver(Generic[T]):
+    """Resolves the hosts of URLs to the sources they belong to. Thread-safe.
+
+    Args:
+        domains: A dictionary mapping the domain of each source to the source. More sources can be added later.
+        mirrors: A dictionary mapping other hosts of a source, such as mirrors, to the domain of the source."""
+
+    def __init__(
+        self,
+        domains: Union[Dict[str, T], None] = None,
+        mirrors: Union[Dict[str, str], None] = None,
+    ):
+        self._sources = {}  # type: Dict[str, T]
+        for domain, source in (domains or {}).items():
+            self.add(domain, source)
+        for host, domain in (mirrors or {}).items():
+            self.add_mirror(host, domain)
+
+    def add(self, domain: str, source: T):
+        """Add a source, matched by its domain and the "www." variant of its domain.
+
+        Args:
+            domain: The domain of the source.
+            source: The source."""
+        self._sources[domain] = source
+        # a source registered with the variant as its own domain takes precedence
+        self._sources.setdefault(host_variants(domain)[1], source)
+
+    def add_mirror(self, host: str, domain: str):
+        """Match another host, such as a mirror, to the source of a domain that was added. Only the exact host is
+        matched.
+
+        Args:
+            host: The other host of the source.
+            domain: The domain of the source."""
+        self._sources[host] = self._sources[domain]
+
+    def resolve_host(self, host: str) -> Union[T, None]:
+        """Get the source of a normalized host.
+
+        Args:
+            host: The host, as returned by url_host.
+
+        Returns:
+            The source of the host. None if the host is unknown."""
+        return self._sources.get(host)
+
+    def resolve(self, url: str) -> Union[T, None]:
+        """Get the source of a URL.
+
+        Args:
+            url: URL in string.
+
+        Returns:
+            The source of the URL. None if its domain is unknown."""
+        return self.resolve_host(url_host(url))
+
+
+class UnknownDomainLog:
+    """Appends the unknown domains to a file, once per domain, from a buffer flushed periodically.
+
+    Args:
+        file_path: The file path to log the unknown domains.
+        flush_interval: The number of seconds the domains are buffered before they are written.
+        max_seen: The maximum number of domains remembered as already logged."""
+
+    def __init__(self, file_path: str, flush_interval: float = 5.0, max_seen: int = 10000):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.max_seen = max_seen
+        self._seen = set()  # type: set
+        self._buffer = []  # type: List[Tuple[str, str]]
+        self._timer = None  # type: Union[threading.Timer, None]
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, domain: str, url: str):
+        """Log an unknown domain, with the URL it was first seen in. Returns without writing to the file.
+
+        Args:
+            domain: The unknown domain.
+            url: The URL containing the domain."""
+        with self._lock:
+            if domain in self._seen:
+                return
+            if len(self._seen) >= self.max_seen:
+                self._seen.clear()
+            self._seen.add(domain)
+            self._buffer.append((domain, url))
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        logger.warning("No extractor is registered for the domain contained in the provided URL: %s.", url)
+
+    def flush(self):
+        """Append the buffered domains to the file."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            self._timer = None
+        if not buffer:
+            return
+        try:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{domain},{url}\n" for domain, url in buffer)
+        except OSError:
+            logger.exception("Failed to log %d unknown domain(s) to %s.", len(buffer), self.file_path)
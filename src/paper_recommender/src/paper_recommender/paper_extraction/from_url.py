@@ -1,89 +1,266 @@
 """This module provides functions to extract paper abstract from a given URL."""
 
+import asyncio
 import logging
-from urllib.parse import urlparse
-from typing import Union
-import requests
-from .base import Paper
-
-# Added paper sources should be imported below
-from .arxiv import Arxiv
-from .nature import Nature
-from .aaai import AAAI
-from .ijcai import IJCAI
-from .neurips import NeurIPS
-from .acl_anthology import ACLAnthology
-from .pmlr import PMLR
-from .jmlr import JMLR
+from urllib.parse import urlparse, parse_qsl, urlencode
+from typing import TYPE_CHECKING, Dict, List, Type, Union
+from .base import Paper, PaperExtractionBase
+from .domains import UnknownDomainLog, url_host
+from .http_session import http_get, http_head, fetch_page, async_fetch_page
+from .registry import registry
+from . import response_cache
+
+if TYPE_CHECKING:
+    from .arxiv import Arxiv
 
 logger = logging.getLogger(__name__)
 
-# A dictionary mapping domain names to their corresponding class that implements base.PaperExtractionBase
-# This is used to dynamically call the correct class based on the domain name of the URL
-# This needs to be updated as new sources are added
-DOMAINS = {
-    Arxiv.DOMAIN: Arxiv,
-    Nature.DOMAIN: Nature,
-    AAAI.DOMAIN: AAAI,
-    IJCAI.DOMAIN: IJCAI,
-    NeurIPS.DOMAIN: NeurIPS,
-    ACLAnthology.DOMAIN: ACLAnthology,
-    PMLR.DOMAIN: PMLR,
-    JMLR.DOMAIN: JMLR,
-}
+# The extractors are imported on first use from the registry, which maps the domains of the sources to their
+# extractors. New sources should be added to registry.BUILTIN_EXTRACTORS, or registered by their own package.
+# arxiv papers are retrieved in batches, so arxiv URLs are handled separately.
+ARXIV_DOMAIN = "arxiv.org"
+# the unknown domain logs of each file path
+_unknown_domain_logs = {}  # type: Dict[str, UnknownDomainLog]
+
+
+def get_extractor(url: str) -> Union[Type[PaperExtractionBase], None]:
+    """Get the class that extracts papers from the domain of a URL, importing it if it is the first use.
+
+    Args:
+        url: URL in string.
+
+    Returns:
+        The class implementing base.PaperExtractionBase for the domain. The fallback extractor of the registry, if
+        any, if the domain is unknown. None otherwise.
+    """
+    return registry.get(url)
+
+
+def _arxiv() -> "Type[Arxiv]":
+    """Get the arxiv extractor, importing it if it is the first use."""
+    return registry.load(ARXIV_DOMAIN)  # type: ignore
+
+
+def _arxiv_paper_ids(url: str) -> List[str]:
+    """Get the arxiv id of a URL, without importing the arxiv extractor for URLs of other domains."""
+    return _arxiv().extract_paper_ids([url]) if registry.resolve(url) == ARXIV_DOMAIN else []
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL, so that different links to the same paper can be matched in the database.
+
+    arxiv links are reduced to the arxiv id without the version, e.g. "arxiv:2301.01234", so that the abstract page,
+    the PDF and any version of a paper all match. Other links are reduced to the lowercase host and the path without
+    the scheme, the trailing slash, the fragment and tracking query parameters.
+
+    Args:
+        url: URL in string.
+
+    Returns:
+        The canonical form of the URL in string.
+    """
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if registry.resolve(url) == ARXIV_DOMAIN:
+        paper_id = _arxiv()._extract_paper_id_from_url(parsed.path)
+        if paper_id:
+            return f"arxiv:{paper_id}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parsed.query) if not k.lower().startswith("utm_")))
+    return f"{netloc}{parsed.path.rstrip('/')}" + (f"?{query}" if query else "")
 
 
 def known_domain(url: str, file_path: str) -> bool:
     """Check if the domain of the provided URL is known.
 
+    The "www." variants and the mirrors of the known domains are known, but not their other subdomains. Each unknown
+    domain is logged once per process; the log is buffered and appended to the file periodically, so that this
+    function does not block on the file.
+    If the registry has a fallback extractor, such as the citation meta tags extractor, the URLs of unknown domains
+    are still logged, but they are extracted too.
+
     Args:
         url: URL of the paper.
         file_path: The file path to log the unknown domains.
     Returns:
-        True if the domain is known. False otherwise.
+        True if the domain is known, or if there is a fallback extractor. False otherwise.
     """
-    try:
-        domain = urlparse(url).netloc
-    except Exception:
-        logger.exception("An error occurred while parsing the provided URL: %s.", url)
-        return False
-    if domain not in DOMAINS:
-        logger.warning("The domain contained in the provided URL is not currently supported: %s.", url)
-        # log the unknown domain
-        with open(file_path, "a", encoding="utf-8") as f:
-            f.write(f"{domain},{url}\n")
-        return False
-    else:
+    host = url_host(url)
+    if registry.resolve_host(host) is not None:
         return True
+    unknown_domain_log = _unknown_domain_logs.get(file_path)
+    if unknown_domain_log is None:
+        unknown_domain_log = _unknown_domain_logs.setdefault(file_path, UnknownDomainLog(file_path))
+    unknown_domain_log.record(host, url)
+    return registry.has_fallback
 
 
 def extract_abstract_from_url(url: str) -> Union[Paper, None]:
     """Extract paper abstract from the provided URL.
 
+    The page is fetched once and passed to the extractor of the domain, which doubles as the check that the URL
+    is accessible. Extractors that do not parse the page, such as the arxiv API, are called without fetching it.
+    If the response cache is enabled, a paper recently extracted from the same URL is returned from the cache.
+
     Args:
         url: URL of the paper to be extracted.
 
     Returns:
         Paper dataclass. Or None if any error or exception occured.
     """
+    extractor = get_extractor(url)
+    if extractor is None:
+        logger.error("The domain contained in the provided URL is not currently supported: %s.", url)
+        return None
+    # a paper extracted from the same URL recently is returned without any network request
+    paper = response_cache.get_paper(url)
+    if paper:
+        return paper
     try:
-        domain = urlparse(url).netloc
+        if not extractor.PARSES_PAGE:
+            paper = extractor.extract_from_url(url)
+        else:
+            response = fetch_page(url)
+            if response is None:
+                return None
+            paper = extractor.extract_from_response(url, response)
+        if paper:
+            response_cache.set_paper(url, paper)
+        return paper
     except Exception:
-        logger.exception("An error occurred while parsing the provided URL: %s.", url)
+        logger.exception("Failed to extract paper information from the provided URL: %s.", url)
         return None
-    if not url_live(url):
+
+
+def extract_abstracts_from_urls(urls: List[str]) -> Dict[str, Union[Paper, None]]:
+    """Extract paper abstracts from several URLs, such as all the URLs shared in a message.
+
+    All the arxiv URLs are retrieved together with as few arxiv API requests as possible. Other URLs are extracted
+    one by one with extract_abstract_from_url.
+
+    Args:
+        urls: URLs of the papers to be extracted.
+
+    Returns:
+        A dictionary mapping each URL to its Paper dataclass. Or None if any error or exception occured for the URL.
+    """
+    papers = {}  # type: Dict[str, Union[Paper, None]]
+    arxiv_urls = {}  # type: Dict[str, str]
+    for url in dict.fromkeys(urls):
+        paper = response_cache.get_paper(url)
+        paper_ids = _arxiv_paper_ids(url)
+        if paper:
+            papers[url] = paper
+        elif paper_ids:
+            arxiv_urls[url] = paper_ids[0]
+        else:
+            papers[url] = extract_abstract_from_url(url)
+
+    if arxiv_urls:
+        try:
+            arxiv_papers = _arxiv().extract_from_ids(list(arxiv_urls.values()))
+        except Exception:
+            logger.exception("Failed to extract paper information from arxiv URLs: %s.", list(arxiv_urls))
+            arxiv_papers = {}
+        for url, paper_id in arxiv_urls.items():
+            papers[url] = arxiv_papers.get(paper_id)
+            if papers[url]:
+                response_cache.set_paper(url, papers[url])  # type: ignore
+    # keep the order of the provided URLs
+    return {url: papers[url] for url in dict.fromkeys(urls)}
+
+
+async def async_extract_abstract_from_url(url: str) -> Union[Paper, None]:
+    """Async version of extract_abstract_from_url, using the shared async HTTP client.
+
+    The page is parsed, and the response cache is read and written, in worker threads, so that they do not block the
+    event loop.
+
+    Args:
+        url: URL of the paper to be extracted.
+
+    Returns:
+        Paper dataclass. Or None if any error or exception occured.
+    """
+    loop = asyncio.get_running_loop()
+    paper = await loop.run_in_executor(None, response_cache.get_paper, url)
+    if paper:
+        return paper
+    extractor = get_extractor(url)
+    if extractor is None:
+        logger.error("The domain contained in the provided URL is not currently supported: %s.", url)
+        return None
+    try:
+        paper_ids = _arxiv_paper_ids(url)
+        if paper_ids:
+            paper = (await _arxiv().async_extract_from_ids(paper_ids)).get(paper_ids[0])
+        elif not extractor.PARSES_PAGE:
+            paper = await loop.run_in_executor(None, extractor.extract_from_url, url)
+        else:
+            response = await async_fetch_page(url)
+            if response is None:
+                return None
+            paper = await loop.run_in_executor(None, extractor.extract_from_response, url, response)
+        if paper:
+            await loop.run_in_executor(None, response_cache.set_paper, url, paper)
+        return paper
+    except Exception:
+        logger.exception("Failed to extract paper information from the provided URL: %s.", url)
         return None
-    else:
+
+
+async def async_extract_abstracts_from_urls(urls: List[str]) -> Dict[str, Union[Paper, None]]:
+    """Async version of extract_abstracts_from_urls. All the URLs are extracted concurrently.
+
+    Args:
+        urls: URLs of the papers to be extracted.
+
+    Returns:
+        A dictionary mapping each URL to its Paper dataclass. Or None if any error or exception occured for the URL.
+    """
+    papers = {}  # type: Dict[str, Union[Paper, None]]
+    arxiv_urls = {}  # type: Dict[str, str]
+    other_urls = []
+    loop = asyncio.get_running_loop()
+    unique_urls = list(dict.fromkeys(urls))
+    cached_papers = await asyncio.gather(
+        *[loop.run_in_executor(None, response_cache.get_paper, url) for url in unique_urls]
+    )
+    for url, paper in zip(unique_urls, cached_papers):
+        paper_ids = _arxiv_paper_ids(url)
+        if paper:
+            papers[url] = paper
+        elif paper_ids:
+            arxiv_urls[url] = paper_ids[0]
+        else:
+            other_urls.append(url)
+
+    async def extract_arxiv() -> Dict[str, Paper]:
+        if not arxiv_urls:
+            return {}
         try:
-            return DOMAINS[domain].extract_from_url(url)
+            return await _arxiv().async_extract_from_ids(list(arxiv_urls.values()))
         except Exception:
-            logger.exception("Failed to extract paper information from the provided URL: %s.", url)
-            return None
+            logger.exception("Failed to extract paper information from arxiv URLs: %s.", list(arxiv_urls))
+            return {}
+
+    arxiv_papers, *other_papers = await asyncio.gather(
+        extract_arxiv(), *[async_extract_abstract_from_url(url) for url in other_urls]
+    )
+    papers.update(zip(other_urls, other_papers))
+    for url, paper_id in arxiv_urls.items():
+        papers[url] = arxiv_papers.get(paper_id)
+        if papers[url]:
+            await loop.run_in_executor(None, response_cache.set_paper, url, papers[url])
+    # keep the order of the provided URLs
+    return {url: papers[url] for url in dict.fromkeys(urls)}
 
 
 def url_live(url: str) -> bool:
     """Tests if the url is accessible.
 
+    A HEAD request is used so that the page is not downloaded. Some servers do not support HEAD requests,
+    in which case only the headers of a GET request are read.
+
     Args:
         url: URL in string.
 
@@ -91,7 +268,11 @@ def url_live(url: str) -> bool:
         True if the URL is accessible. False otherwise.
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = http_head(url)
+        if response.status_code in (405, 501):
+            # the body is not downloaded when streaming, unless it is read
+            with http_get(url, stream=True) as response:
+                pass
         if response.status_code == 200:
             return True
         else:
@@ -0,0 +1,261 @@
+"""A pooled HTTP session shared by all the paper extractors.
+
+Reusing a single requests.Session keeps the TCP/TLS connections to each host alive between extractions, instead of
+opening a new connection for every fetch. The session also retries failed requests with exponential backoff when
+the server responds with 429 or 5xx, honouring the Retry-After header.
+
+The asynchronous app uses a shared httpx.AsyncClient instead, with the same settings, through async_http_get. Its
+requests go through the same response cache, whose files are read and written in the default executor.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Union
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import response_cache
+
+logger = logging.getLogger(__name__)
+
+# default settings, which can be overridden by configure_session
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_timeout = DEFAULT_TIMEOUT
+_async_settings = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE,
+    "retries": DEFAULT_RETRIES,
+    "backoff_factor": DEFAULT_BACKOFF_FACTOR,
+}
+_async_client = None  # type: Union[httpx.AsyncClient, None]
+
+
+def create_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    retries: int = DEFAULT_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+) -> requests.Session:
+    """Create a requests.Session with connection pooling and retries.
+
+    Args:
+        pool_connections: The number of hosts to keep connection pools for.
+        pool_maxsize: The maximum number of connections kept alive for each host. It should be at least the number
+            of threads that fetch pages, so that the connections opened under load are reused.
+        retries: The maximum number of retries on connection errors and on 429 or 5xx responses.
+        backoff_factor: The backoff factor between retries, in seconds.
+
+    Returns:
+        The configured session."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        # return the last response instead of raising, so that the callers can check the status code
+        raise_on_status=False,
+    )
+    # the pool does not block: requests has no timeout for waiting on a free connection, so a slow host would hold
+    # every thread of the app. Extra connections are opened under load instead, and closed after use.
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    new_session = requests.Session()
+    new_session.mount("http://", adapter)
+    new_session.mount("https://", adapter)
+    return new_session
+
+
+session = create_session()
+
+
+def configure_session(
+    timeout: float = DEFAULT_TIMEOUT,
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    retries: int = DEFAULT_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+):
+    """Replace the shared session with one using the provided settings. Should be called once at start up.
+
+    Args:
+        timeout: The default timeout of each request, in seconds.
+        pool_connections: The number of hosts to keep connection pools for.
+        pool_maxsize: The maximum number of connections kept alive for each host. It should be at least the number
+            of threads that fetch pages, so that the connections opened under load are reused.
+        retries: The maximum number of retries on connection errors and on 429 or 5xx responses.
+        backoff_factor: The backoff factor between retries, in seconds.
+    """
+    global session, _timeout
+    old_session = session
+    session = create_session(pool_connections, pool_maxsize, retries, backoff_factor)
+    _timeout = timeout
+    old_session.close()
+    # the async client is created on first use with the same settings
+    _async_settings.update(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, retries=retries, backoff_factor=backoff_factor
+    )
+
+
+def http_get(url: str, timeout: Union[float, None] = None, **kwargs) -> requests.Response:
+    """Send a GET request using the shared session.
+
+    Args:
+        url: The URL in string.
+        timeout: The timeout in seconds. The configured default is used if not provided.
+        **kwargs: Other arguments passed to requests.Session.get.
+
+    Returns:
+        The requests.Response object."""
+    return session.get(url, timeout=timeout if timeout is not None else _timeout, **kwargs)
+
+
+def http_head(url: str, timeout: Union[float, None] = None, **kwargs) -> requests.Response:
+    """Send a HEAD request using the shared session, following redirects.
+
+    Args:
+        url: The URL in string.
+        timeout: The timeout in seconds. The configured default is used if not provided.
+        **kwargs: Other arguments passed to requests.Session.head.
+
+    Returns:
+        The requests.Response object."""
+    kwargs.setdefault("allow_redirects", True)
+    return session.head(url, timeout=timeout if timeout is not None else _timeout, **kwargs)
+
+
+def cached_http_get(url: str, send: Callable[..., requests.Response] = http_get) -> requests.Response:
+    """Send a GET request using the shared session, through the response cache if it is enabled.
+
+    Args:
+        url: The URL in string.
+        send: The function used to send the request, only called if the cached response is missing or stale.
+            http_get by default.
+
+    Returns:
+        The requests.Response object."""
+    return response_cache.cached_get(url, send)
+
+
+def fetch_page(url: str) -> Union[requests.Response, None]:
+    """Fetch a page using the shared session, through the response cache if it is enabled.
+
+    Args:
+        url: The URL in string.
+
+    Returns:
+        The requests.Response object if the status code is 200. None otherwise."""
+    try:
+        response = cached_http_get(url)
+    except Exception:
+        logger.exception("Failed to access the provided URL: %s.", url)
+        return None
+    if response.status_code != 200:
+        logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        return None
+    return response
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the shared httpx.AsyncClient, creating it on first use.
+
+    httpx limits connections across all hosts rather than per host, so the limit is the number of hosts
+    multiplied by the connections for each host.
+
+    Returns:
+        The shared httpx.AsyncClient."""
+    global _async_client
+    if _async_client is None:
+        max_connections = _async_settings["pool_connections"] * _async_settings["pool_maxsize"]
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=_timeout,
+            follow_redirects=True,
+        )
+    return _async_client
+
+
+async def close_async_client():
+    """Close the shared httpx.AsyncClient, if it was created. Should be called when the async app stops."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def async_http_get(url: str, **kwargs) -> httpx.Response:
+    """Send a GET request using the shared async client, with the same retries as the synchronous session.
+
+    Args:
+        url: The URL in string.
+        **kwargs: Other arguments passed to httpx.AsyncClient.get.
+
+    Returns:
+        The httpx.Response object."""
+    client = get_async_client()
+    retries, backoff_factor = int(_async_settings["retries"]), float(_async_settings["backoff_factor"])
+    for attempt in range(retries + 1):
+        delay = backoff_factor * (2**attempt)
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = float(retry_after)
+        await asyncio.sleep(delay)
+    raise RuntimeError("Unreachable")  # the loop always returns or raises on the last attempt
+
+
+async def async_cached_http_get(
+    url: str, send: Callable[..., Awaitable[httpx.Response]] = async_http_get
+) -> Union[httpx.Response, requests.Response]:
+    """Send a GET request using the shared async client, through the response cache if it is enabled.
+
+    The cache files are read and written in the default executor, so that they don't block the event loop.
+
+    Args:
+        url: The URL in string.
+        send: The coroutine function used to send the request, only called if the cached response is missing or
+            stale. async_http_get by default.
+
+    Returns:
+        The httpx.Response object, or the requests.Response object of the cached response."""
+    if not response_cache.is_enabled():
+        return await send(url)
+    loop = asyncio.get_running_loop()
+    cached, headers = await loop.run_in_executor(None, response_cache.lookup, url)
+    if cached is not None:
+        return cached
+    response = await send(url, headers=headers)
+    return await loop.run_in_executor(None, response_cache.store, url, response)
+
+
+async def async_fetch_page(url: str) -> Union[httpx.Response, requests.Response, None]:
+    """Fetch a page using the shared async client, through the response cache if it is enabled.
+
+    Args:
+        url: The URL in string.
+
+    Returns:
+        The httpx.Response object, or the cached requests.Response object, if the status code is 200. None
+        otherwise."""
+    try:
+        response = await async_cached_http_get(url)
+    except Exception:
+        logger.exception("Failed to access the provided URL: %s.", url)
+        return None
+    if response.status_code != 200:
+        logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        return None
+    return response
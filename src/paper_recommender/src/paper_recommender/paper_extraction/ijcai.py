@@ -5,9 +5,11 @@ For example: https://www.ijcai.org/proceedings/2023/3
 
 import logging
 from typing import Union, List
-import requests
-from bs4 import BeautifulSoup
+from requests import Response
+from bs4 import BeautifulSoup, SoupStrainer
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,9 @@ class IJCAI(PaperExtractionBase):
     """Extract paper information from IJCAI proceedings."""
 
     DOMAIN = "www.ijcai.org"
+    PARSES_PAGE = True
+    # all the fields are inside the row elements
+    PARSE_ONLY = SoupStrainer(attrs={"class": "row"})
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -30,13 +35,23 @@ class IJCAI(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an IJCAI proceeding. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return IJCAI.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched IJCAI page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content, IJCAI.PARSE_ONLY)
         abstract = IJCAI._extract_abstract(soup)
         title = IJCAI._extract_title(soup)
         authors = IJCAI._extract_authors(soup)
@@ -6,9 +6,11 @@ For example: https://www.jmlr.org/papers/v25/23-1042.html
 
 import logging
 from typing import Union, List
-import requests
-from bs4 import BeautifulSoup
+from requests import Response
+from bs4 import BeautifulSoup, SoupStrainer
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ class JMLR(PaperExtractionBase):
     """Extract paper information from JMLR articles."""
 
     DOMAIN = "www.jmlr.org"
+    PARSES_PAGE = True
+    # all the fields are inside the content element
+    PARSE_ONLY = SoupStrainer(id="content")
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -31,13 +36,23 @@ class JMLR(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an JMLR article. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return JMLR.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched JMLR page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content, JMLR.PARSE_ONLY)
         abstract = JMLR._extract_abstract(soup)
         title = JMLR._extract_title(soup)
         authors = JMLR._extract_authors(soup)
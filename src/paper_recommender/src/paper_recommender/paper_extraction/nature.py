@@ -8,9 +8,11 @@ Other journals from nature.com might have different html structure or paper form
 import logging
 from typing import Union, List
 from urllib.parse import urlparse
-import requests
+from requests import Response
 from bs4 import BeautifulSoup
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ class Nature(PaperExtractionBase):
     """Extract paper information from Nature."""
 
     DOMAIN = "www.nature.com"
+    PARSES_PAGE = True
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -33,13 +36,23 @@ class Nature(PaperExtractionBase):
         NOTE: We assume that the provided URL is an Nature URL. It is the responsibility of the caller to
         make sure this is the case. However this class does provide a method to check this assumption.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return Nature.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched Nature page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content)
         abstract = Nature._extract_abstract(soup)
         title = Nature._extract_title(soup)
         authors = Nature._extract_authors(soup)
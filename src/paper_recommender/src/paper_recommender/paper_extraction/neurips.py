@@ -6,9 +6,11 @@ https://proceedings.neurips.cc/paper_files/paper/2023/hash/0001ca33ba34ce0351e46
 
 import logging
 from typing import Union, List
-import requests
-from bs4 import BeautifulSoup
+from requests import Response
+from bs4 import BeautifulSoup, SoupStrainer
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,10 @@ class NeurIPS(PaperExtractionBase):
     """Extract paper information from NeurIPS proceedings."""
 
     DOMAIN = "proceedings.neurips.cc"
+    PARSES_PAGE = True
+    # all the fields are inside the container-fluid element. The abstract is a paragraph nested in another
+    # paragraph, which lxml splits into several paragraphs, so the page is parsed by html.parser
+    PARSE_ONLY = SoupStrainer(attrs={"class": "container-fluid"})
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -31,13 +37,23 @@ class NeurIPS(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an NeurIPS proceeding. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return NeurIPS.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched NeurIPS page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content, NeurIPS.PARSE_ONLY, parser="html.parser")
         abstract = NeurIPS._extract_abstract(soup)
         title = NeurIPS._extract_title(soup)
         authors = NeurIPS._extract_authors(soup)
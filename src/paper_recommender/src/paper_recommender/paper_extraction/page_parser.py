@@ -0,0 +1,31 @@
+"""Parse the pages fetched by the scraping extractors.
+
+The extractors only read a title, an author list and an abstract from each page, so building the tree of the whole
+page with the html.parser of the standard library is most of their cost. Pages are parsed with lxml instead when it
+is installed, which is several times faster, and the extractors whose fields are all inside one kind of element pass
+a SoupStrainer, so that only the matching elements are built into the tree.
+"""
+
+from typing import Union
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401 # pylint: disable=unused-import
+
+    FAST_PARSER = "lxml"
+except ImportError:
+    FAST_PARSER = "html.parser"
+
+
+def make_soup(content: bytes, parse_only: Union[SoupStrainer, None] = None, parser: str = FAST_PARSER) -> BeautifulSoup:
+    """Parse the content of a page.
+
+    Args:
+        content: The content of the page in bytes.
+        parse_only: Only build the elements matching the strainer, and their descendants, into the tree.
+        parser: The parser used by BeautifulSoup. lxml by default if it is installed. Extractors whose selectors
+            rely on how html.parser repairs invalid markup should use "html.parser".
+
+    Returns:
+        The BeautifulSoup object of the page."""
+    return BeautifulSoup(content, parser, parse_only=parse_only)
@@ -0,0 +1,213 @@
+"""Extract paper information from the PDF files shared in Slack.
+
+The file is streamed from Slack to a temporary file, so that it is never held in memory, and the download is aborted
+once it exceeds a maximum size. pypdf reads the temporary file through the open file object, which only loads the
+objects it needs, and only the text of the first pages is extracted: the title, the authors and the abstract of a
+paper are on its first page, and the rest of the document is neither parsed nor rendered.
+
+The title and the authors are read from the document information of the PDF when it is set, and from the first lines
+of the first page otherwise. The abstract is the text between the "Abstract" heading and the next heading, such as
+"Introduction" or "Keywords".
+"""
+
+import logging
+import os
+import re
+import tempfile
+from typing import BinaryIO, List, Union
+from pypdf import PdfReader
+from requests import Response
+from .base import Paper
+from .http_session import http_get
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_PAGES = 2
+# the abstract is cut at this number of characters when its end is not found
+MAX_ABSTRACT_CHARS = 3000
+
+# the heading of the abstract, at the start of a line, e.g. "Abstract", "ABSTRACT." or "Abstract—We propose"
+_ABSTRACT_START = re.compile(r"(?:^|\n)[ \t]*abstract\b[\s.:—–-]*", re.IGNORECASE)
+_ABSTRACT_END = re.compile(
+    r"\n\s*(?:(?:1|I)\.?\s*)?(?:introduction|keywords|key words|index terms|ccs concepts|categories and subject)\b",
+    re.IGNORECASE,
+)
+# lines that are not the title, e.g. the arxiv identifier stamped on the margin
+_NOT_TITLE = re.compile(r"^(?:arxiv:|preprint|proceedings|published|journal|vol\.|doi|https?://|\d+$)", re.IGNORECASE)
+# metadata titles set by the tools rather than the authors
+_PLACEHOLDER_TITLE = re.compile(r"(?:^untitled|^microsoft word|\.(?:pdf|docx?|tex|dvi)$)", re.IGNORECASE)
+_AUTHOR_SEPARATOR = re.compile(r"\s*(?:;|,|\band\b|&)\s*")
+# affiliation and footnote markers attached to the author names
+_AUTHOR_MARKERS = re.compile(r"[\d*†‡§¶∗]+")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def download_pdf(url: str, token: str, max_bytes: int = DEFAULT_MAX_BYTES) -> Union[str, None]:
+    """Stream a PDF file from Slack to a temporary file.
+
+    Args:
+        url: The url_private_download of the file.
+        token: The bot token, which authorizes the download of the files shared in the channels of the app.
+        max_bytes: The maximum size of the file. The download is aborted once it exceeds this size.
+
+    Returns:
+        The path of the temporary file, which must be removed by the caller. None if the download failed, if the
+        file is too large, or if it is not a PDF file."""
+    try:
+        with http_get(url, stream=True, headers={"Authorization": f"Bearer {token}"}) as response:
+            if response.status_code != 200:
+                logger.error("Failed to download the shared PDF file (%s): %s.", response.status_code, url)
+                return None
+            if int(response.headers.get("Content-Length") or 0) > max_bytes:
+                logger.warning("The shared PDF file is larger than %d bytes: %s.", max_bytes, url)
+                return None
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+            complete = False
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    complete = _write_pdf(response, f, max_bytes, url)
+            finally:
+                if not complete:
+                    os.remove(path)
+            return path if complete else None
+    except Exception:
+        logger.exception("Failed to download the shared PDF file: %s.", url)
+        return None
+
+
+def _write_pdf(response: Response, f: BinaryIO, max_bytes: int, url: str) -> bool:
+    """Write the streamed body of a response to a file, unless it is not a PDF file or it exceeds max_bytes.
+
+    Returns:
+        True if the whole file was written. False otherwise."""
+    size = 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        # Slack answers with a login page instead of the file if the token is not authorized
+        if size == 0 and not chunk.startswith(b"%PDF"):
+            logger.error("The downloaded file is not a PDF file: %s.", url)
+            return False
+        size += len(chunk)
+        if size > max_bytes:
+            logger.warning("The shared PDF file is larger than %d bytes: %s.", max_bytes, url)
+            return False
+        f.write(chunk)
+    return size > 0
+
+
+def extract_from_pdf(path: str, url: str, max_pages: int = DEFAULT_MAX_PAGES) -> Union[Paper, None]:
+    """Extract paper information from the first pages of a PDF file.
+
+    Args:
+        path: The path of the PDF file.
+        url: The URL the paper is recorded with, e.g. the permalink of the file in Slack.
+        max_pages: The number of pages whose text is extracted.
+
+    Returns:
+        Paper dataclass from base.py. Or None if any error or exception occured, or if the title, the authors or the
+        abstract were not found."""
+    try:
+        with open(path, "rb") as f:
+            # the reader parses the objects of the file object as they are accessed
+            reader = PdfReader(f)
+            metadata = reader.metadata
+            text = "\n".join(page.extract_text() or "" for page in reader.pages[:max_pages])
+    except Exception:
+        logger.exception("Failed to read the shared PDF file: %s.", url)
+        return None
+
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    abstract = _extract_abstract(text)
+    title = _clean(metadata.title) if metadata and metadata.title else ""
+    if _PLACEHOLDER_TITLE.search(title) or len(title) < 10:
+        title = ""
+    authors = _split_authors(metadata.author) if metadata and metadata.author else []
+    if not title or not authors:
+        first_lines = _first_lines(lines)
+        title = title or (first_lines[0] if first_lines else "")
+        if not authors and len(first_lines) > 1:
+            authors = _split_authors(first_lines[1])
+    if not title or not authors or not abstract:
+        logger.warning("Failed to find the title, the authors or the abstract in the shared PDF file: %s.", url)
+        return None
+    return Paper(url=url, title=title, authors=authors, abstract=abstract)
+
+
+def shared_in_channel(file: dict, channel_id: Union[str, None] = None) -> bool:
+    """Check if a file shared in Slack was shared in a public channel, as the links handled by the app.
+
+    Args:
+        file: The file object returned by files.info, which lists the public channels of the file in `channels`,
+            and its private channels and direct messages in `groups` and `ims`.
+        channel_id: The channel of the file_shared event. If set, the file must have been shared in this channel.
+
+    Returns:
+        True if the file was shared in a public channel, or in the given channel if it is public. False otherwise."""
+    channels = file.get("channels") or []
+    if channel_id:
+        return channel_id in channels
+    return bool(channels)
+
+
+def extract_from_slack_file(
+    file: dict,
+    token: str,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_pages: int = DEFAULT_MAX_PAGES,
+) -> Union[Paper, None]:
+    """Extract paper information from a PDF file shared in Slack.
+
+    Args:
+        file: The file object returned by files.info.
+        token: The bot token, which authorizes the download of the files shared in the channels of the app.
+        max_bytes: The maximum size of the file. Larger files are not downloaded.
+        max_pages: The number of pages whose text is extracted.
+
+    Returns:
+        Paper dataclass from base.py, recorded with the permalink of the file. Or None if the file is not a PDF
+        file, is too large, or if any error or exception occured."""
+    if file.get("filetype") != "pdf":
+        return None
+    if file.get("size", 0) > max_bytes:
+        logger.warning("The shared PDF file is larger than %d bytes: %s.", max_bytes, file.get("permalink"))
+        return None
+    path = download_pdf(file["url_private_download"], token, max_bytes)
+    if path is None:
+        return None
+    try:
+        return extract_from_pdf(path, file["permalink"], max_pages)
+    finally:
+        os.remove(path)
+
+
+def _extract_abstract(text: str) -> str:
+    """Get the text between the "Abstract" heading and the next heading."""
+    start = _ABSTRACT_START.search(text)
+    if not start:
+        return ""
+    abstract = text[start.end() :]
+    end = _ABSTRACT_END.search(abstract)
+    return _clean(abstract[: end.start()] if end else abstract[:MAX_ABSTRACT_CHARS])
+
+
+def _first_lines(lines: List[str]) -> List[str]:
+    """Get the lines of the first page before the abstract, without the lines that cannot be the title."""
+    first_lines = []
+    for line in lines:
+        if _ABSTRACT_START.match(line):
+            break
+        if not _NOT_TITLE.match(line):
+            first_lines.append(line)
+    return first_lines
+
+
+def _split_authors(authors: str) -> List[str]:
+    """Split a list of authors, removing the affiliation markers."""
+    names = (_clean(_AUTHOR_MARKERS.sub(" ", name)) for name in _AUTHOR_SEPARATOR.split(authors))
+    return [name for name in names if name]
+
+
+def _clean(text: str) -> str:
+    """Remove the extra whitespace of a text, such as the line breaks of the PDF."""
+    return _SPACE_PATTERN.sub(" ", text).strip()
@@ -1,4 +1,4 @@
-"""Implementation of the PMLR class to extract paper information from PMLR 
+"""Implementation of the PMLR class to extract paper information from PMLR
 (Proceedings of Machine Learning Research) proceedings using webscraping.
 
 For example: https://proceedings.mlr.press/v202/von-oswald23a.html
@@ -6,9 +6,11 @@ For example: https://proceedings.mlr.press/v202/von-oswald23a.html
 
 import logging
 from typing import Union, List
-import requests
+from requests import Response
 from bs4 import BeautifulSoup
 from .base import PaperExtractionBase, Paper
+from .http_session import fetch_page
+from .page_parser import make_soup
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,7 @@ class PMLR(PaperExtractionBase):
     """Extract paper information from PMLR proceedings."""
 
     DOMAIN = "proceedings.mlr.press"
+    PARSES_PAGE = True
 
     @staticmethod
     def extract_from_url(url: str) -> Union[Paper, None]:
@@ -31,13 +34,23 @@ class PMLR(PaperExtractionBase):
         NOTE: We assume that the provided URL is for an PMLR proceeding. It is the responsibility of the caller to
         make sure this is the case.
         """
-        response = requests.get(url, timeout=10)
-
-        if response.status_code != 200:
-            logger.error("Failed to retrieve paper using the provided URL: %s", url)
+        response = fetch_page(url)
+        if response is None:
             return None
+        return PMLR.extract_from_response(url, response)
+
+    @staticmethod
+    def extract_from_response(url: str, response: Response) -> Union[Paper, None]:
+        """Extract paper information from an already fetched PMLR page. Must return base.Paper dataclass.
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        Args:
+            url (str): URL of the paper to be extracted.
+            response: The response of the successful request to the URL.
+
+        Returns:
+            Paper dataclass from base.py. Or None if any error or exception occured.
+        """
+        soup = make_soup(response.content)
         abstract = PMLR._extract_abstract(soup)
         title = PMLR._extract_title(soup)
         authors = PMLR._extract_authors(soup)
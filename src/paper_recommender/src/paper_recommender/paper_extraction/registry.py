@@ -0,0 +1,190 @@
+"""Registry of the paper extractors, which maps the domains of the paper sources to their extractors.
+
+The extractors are registered by entry point, e.g. "paper_recommender.paper_extraction.arxiv:Arxiv", and their
+modules are only imported when a URL of their domain is first extracted. Importing the package therefore does not
+import the extractors and their dependencies, such as BeautifulSoup and feedparser.
+
+Extractors of other packages can be registered without modifying this package, either by calling
+`registry.register`, or by declaring an entry point in the "paper_recommender.extractors" group of the package
+metadata, named after the domain, e.g. in pyproject.toml:
+
+    [project.entry-points."paper_recommender.extractors"]
+    "www.example.org" = "example_package.example:ExampleExtractor"
+
+A fallback extractor can be set for the URLs of the domains without an extractor, such as citation_meta.CitationMeta,
+which reads the citation meta tags that most publishers add to their pages.
+"""
+
+import importlib
+import logging
+import threading
+from importlib.metadata import EntryPoint, entry_points
+from typing import Dict, Iterable, Type, Union
+from .base import PaperExtractionBase
+from .domains import DomainResolver, url_host
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "paper_recommender.extractors"
+
+# The extractors of this package. The domains must match the DOMAIN attributes of the classes.
+# New sources of this package should be added below
+BUILTIN_EXTRACTORS = {
+    "arxiv.org": f"{__package__}.arxiv:Arxiv",
+    "www.nature.com": f"{__package__}.nature:Nature",
+    "ojs.aaai.org": f"{__package__}.aaai:AAAI",
+    "www.ijcai.org": f"{__package__}.ijcai:IJCAI",
+    "proceedings.neurips.cc": f"{__package__}.neurips:NeurIPS",
+    "aclanthology.org": f"{__package__}.acl_anthology:ACLAnthology",
+    "proceedings.mlr.press": f"{__package__}.pmlr:PMLR",
+    "www.jmlr.org": f"{__package__}.jmlr:JMLR",
+}
+# Other hosts of the sources above, matching the MIRRORS attributes of the classes
+BUILTIN_MIRRORS = {"export.arxiv.org": "arxiv.org", "xxx.lanl.gov": "arxiv.org"}
+
+ExtractorEntry = Union[str, EntryPoint, Type[PaperExtractionBase]]
+
+
+class ExtractorRegistry:
+    """Maps domains to extractors, which are imported on first use. Thread-safe.
+
+    Args:
+        extractors: A dictionary mapping domains to their extractors.
+        mirrors: A dictionary mapping other hosts of a source, such as mirrors, to the domain of the source.
+        discover: Register the extractors declared by installed packages in the ENTRY_POINT_GROUP group, the first
+            time a URL is resolved. The extractors passed to the constructor take precedence."""
+
+    def __init__(
+        self,
+        extractors: Union[Dict[str, ExtractorEntry], None] = None,
+        mirrors: Union[Dict[str, str], None] = None,
+        discover: bool = True,
+    ):
+        self._entries = {}  # type: Dict[str, ExtractorEntry]
+        self._loaded = {}  # type: Dict[str, Type[PaperExtractionBase]]
+        self._resolver = DomainResolver()  # type: DomainResolver[str]
+        self._lock = threading.RLock()
+        self._discovered = not discover
+        self._fallback = None  # type: Union[ExtractorEntry, None]
+        for domain, extractor in (extractors or {}).items():
+            self.register(domain, extractor)
+        for host, domain in (mirrors or {}).items():
+            self._resolver.add_mirror(host, domain)
+
+    def register(self, domain: str, extractor: ExtractorEntry, mirrors: Iterable[str] = ()):
+        """Register the extractor of a domain, replacing any extractor already registered for the domain.
+
+        Args:
+            domain: The domain of the source, e.g. "www.nature.com". Its "www." variant is matched too, but not its
+                other subdomains.
+            extractor: The class implementing base.PaperExtractionBase, or its entry point, either as a
+                "module:Class" string or an importlib.metadata.EntryPoint, to import it on first use.
+            mirrors: Other hosts of the source, matched exactly, such as mirrors or the subdomains that host papers."""
+        with self._lock:
+            self._entries[domain] = extractor
+            self._loaded.pop(domain, None)
+            self._resolver.add(domain, domain)
+            for host in mirrors:
+                self._resolver.add_mirror(host, domain)
+
+    def set_fallback(self, extractor: Union[ExtractorEntry, None]):
+        """Set the extractor of the URLs whose domain is not registered.
+
+        Args:
+            extractor: The class implementing base.PaperExtractionBase, or its entry point, as in register. None to
+                disable the fallback, which is the default."""
+        with self._lock:
+            self._fallback = extractor
+            self._loaded.pop("*", None)
+
+    @property
+    def has_fallback(self) -> bool:
+        """Whether the URLs whose domain is not registered are extracted by the fallback extractor."""
+        return self._fallback is not None
+
+    def domains(self) -> Iterable[str]:
+        """The registered domains."""
+        self._discover()
+        return list(self._entries)
+
+    def resolve_host(self, host: str) -> Union[str, None]:
+        """Get the registered domain of a host, as returned by domains.url_host. None if the host is unknown."""
+        self._discover()
+        return self._resolver.resolve_host(host)
+
+    def resolve(self, url: str) -> Union[str, None]:
+        """Get the registered domain of a URL. None if its domain is unknown."""
+        return self.resolve_host(url_host(url))
+
+    def load(self, domain: str) -> Type[PaperExtractionBase]:
+        """Get the extractor of a registered domain, importing it if it is the first use.
+
+        Args:
+            domain: The registered domain, or "*" for the fallback extractor.
+
+        Returns:
+            The class implementing base.PaperExtractionBase.
+
+        Raises:
+            KeyError: If the domain is not registered.
+            ImportError or AttributeError: If the extractor cannot be imported."""
+        try:
+            return self._loaded[domain]
+        except KeyError:
+            pass
+        with self._lock:
+            if domain not in self._loaded:
+                entry = self._entries[domain] if domain != "*" else self._fallback
+                if entry is None:
+                    raise KeyError(domain)
+                if isinstance(entry, str):
+                    module_name, _, class_name = entry.partition(":")
+                    entry = getattr(importlib.import_module(module_name), class_name)
+                elif isinstance(entry, EntryPoint):
+                    entry = entry.load()
+                self._loaded[domain] = entry  # type: ignore
+            return self._loaded[domain]
+
+    def get(self, url: str) -> Union[Type[PaperExtractionBase], None]:
+        """Get the extractor of the domain of a URL, importing it if it is the first use.
+
+        Args:
+            url: URL in string.
+
+        Returns:
+            The class implementing base.PaperExtractionBase. The fallback extractor if the domain is unknown, or None
+            if there is no fallback extractor. None if the extractor could not be imported."""
+        domain = self.resolve(url)
+        if domain is None:
+            if self._fallback is None:
+                return None
+            domain = "*"
+        try:
+            return self.load(domain)
+        except Exception:
+            logger.exception("Failed to import the extractor of the domain %s.", domain)
+            return None
+
+    def _discover(self):
+        """Register the extractors declared by the installed packages, once."""
+        if self._discovered:
+            return
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            try:
+                declared = entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError:
+                # Python < 3.10
+                declared = entry_points().get(ENTRY_POINT_GROUP, [])  # type: ignore
+            except Exception:
+                logger.exception("Failed to read the extractors declared by the installed packages.")
+                return
+            for entry_point in declared:
+                if entry_point.name not in self._entries:
+                    self.register(entry_point.name, entry_point)
+
+
+# The registry used by from_url
+registry = ExtractorRegistry(BUILTIN_EXTRACTORS, BUILTIN_MIRRORS)
@@ -0,0 +1,301 @@
+"""An on-disk cache of HTTP responses and extracted papers, shared by the paper extractors.
+
+Popular papers are often shared more than once. The cache keeps the responses of paper pages and of the arxiv API,
+along with the papers extracted from the shared URLs, so that a reposted paper is returned without any network
+request while the entry is fresh. Stale entries are revalidated with conditional requests using the ETag and
+Last-Modified headers of the cached response.
+
+Entries are addressed by the SHA-256 of the URL. Each entry consists of a JSON metadata file and, if a response was
+cached, a body file. The total size of the cache is capped; the least recently used entries are evicted first. The
+directory can be shared by several processes, such as the app and the workers: the size is recomputed from the disk
+before evicting, and the files removed by another process are skipped.
+
+The cache is disabled until configure_response_cache is called. The asynchronous app uses the same cache through
+lookup and store, which it calls in an executor around its own requests.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from .base import Paper
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """On-disk cache of HTTP responses and extracted papers, keyed by URL.
+
+    Args:
+        directory: The directory where the cache is stored. It is created if it doesn't exist.
+        max_bytes: The maximum total size of the cache in bytes.
+        ttl: How long an entry is used without revalidation."""
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int, ttl: datetime.timedelta):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl.total_seconds()
+        self._lock = threading.Lock()
+        _, self._size = self._scan()
+
+    def _scan(self) -> Tuple[List[Tuple[float, Path]], int]:
+        """List the metadata files by last access time, and compute the total size of the cache from the disk.
+
+        Returns:
+            The (last access time, path) of each metadata file, oldest first, and the total size in bytes."""
+        entries = []
+        size = 0
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            size += stat.st_size
+            if path.suffix == ".json":
+                entries.append((stat.st_mtime, path))
+        entries.sort()
+        return entries, size
+
+    def _paths(self, url: str):
+        """Return the paths of the metadata file and the body file of the entry for a URL."""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        entry_dir = self.directory / key[:2]
+        return entry_dir / f"{key}.json", entry_dir / f"{key}.body"
+
+    def _read(self, url: str) -> Union[dict, None]:
+        """Read the metadata of the entry for a URL and mark it as recently used. None if there is no entry."""
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # the modification time of the metadata file is used as the last access time for LRU eviction
+            os.utime(meta_path)
+            return meta
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception("Failed to read the cache entry of URL: %s.", url)
+            return None
+
+    def _write_file(self, path: Path, content: bytes):
+        """Atomically write a file of an entry and update the total size of the cache."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        # write to a temporary file first, so that readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(content) - old_size
+
+    def _write(self, url: str, meta: dict, body: Union[bytes, None] = None):
+        """Write the entry for a URL, then evict old entries if the cache is too large."""
+        meta_path, body_path = self._paths(url)
+        try:
+            if body is not None:
+                self._write_file(body_path, body)
+            self._write_file(meta_path, json.dumps(meta).encode("utf-8"))
+            if self._size > self.max_bytes:
+                self.evict()
+        except Exception:
+            logger.exception("Failed to write the cache entry of URL: %s.", url)
+
+    def _fresh(self, meta: dict, field: str = "fetched_at") -> bool:
+        """Check if an entry can be used without revalidation.
+
+        Args:
+            meta: The metadata of the entry.
+            field: The timestamp to check, "fetched_at" for the response and "paper_fetched_at" for the paper."""
+        return time.time() - (meta.get(field) or 0) < self.ttl
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is below 90% of its maximum size.
+
+        The size of the cache is recomputed from the disk first, since the other processes sharing the directory
+        write and evict entries too."""
+        with self._lock:
+            entries, self._size = self._scan()
+            for _, meta_path in entries:
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                for path in (meta_path, meta_path.with_suffix(".body")):
+                    try:
+                        size = path.stat().st_size
+                        path.unlink()
+                        self._size -= size
+                    except FileNotFoundError:
+                        pass
+
+    def get_paper(self, url: str) -> Union[Paper, None]:
+        """Get the paper extracted from a URL, if it is cached and fresh.
+
+        Args:
+            url: The URL of the paper.
+
+        Returns:
+            The cached Paper dataclass. None if there is no fresh cached paper."""
+        meta = self._read(url)
+        if meta and meta.get("paper") and self._fresh(meta, "paper_fetched_at"):
+            return Paper(**meta["paper"])
+        return None
+
+    def set_paper(self, url: str, paper: Paper):
+        """Cache the paper extracted from a URL.
+
+        Args:
+            url: The URL of the paper.
+            paper: The extracted Paper dataclass."""
+        meta = self._read(url) or {"url": url}
+        # the paper has its own timestamp, so that caching it doesn't renew the cached response of the page
+        meta.update({"paper": asdict(paper), "paper_fetched_at": time.time()})
+        self._write(url, meta)
+
+    def get(self, url: str, http_get: Callable[..., Response]) -> Response:
+        """Get a URL through the cache.
+
+        A fresh cached response is returned without any request. A stale one is revalidated with a conditional
+        request, and reused if the server responds with 304 Not Modified.
+
+        Args:
+            url: The URL in string.
+            http_get: The function used to send the GET request.
+
+        Returns:
+            The requests.Response object."""
+        cached, headers = self.lookup(url)
+        if cached is not None:
+            return cached
+        return self.store(url, http_get(url, headers=headers))
+
+    def _read_entry(self, url: str) -> Tuple[Union[dict, None], Union[bytes, None]]:
+        """Read the metadata and the body of the cached response of a URL. None if there is no cached response."""
+        meta = self._read(url)
+        if not meta or meta.get("status_code") != 200:
+            return meta, None
+        try:
+            return meta, self._paths(url)[1].read_bytes()
+        except FileNotFoundError:
+            # evicted, possibly by another process
+            return meta, None
+
+    def lookup(self, url: str) -> Tuple[Union[Response, None], Dict[str, str]]:
+        """Look up the cached response of a URL, before sending a request.
+
+        Args:
+            url: The URL in string.
+
+        Returns:
+            The fresh cached response, or None and the headers of the conditional request to send instead."""
+        meta, body = self._read_entry(url)
+        headers = {}  # type: Dict[str, str]
+        if meta and body is not None:
+            if self._fresh(meta):
+                return self._response(url, meta, body), headers
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return None, headers
+
+    def store(self, url: str, response: Response) -> Response:
+        """Cache the response of a request sent after lookup.
+
+        Args:
+            url: The URL in string.
+            response: The requests.Response object, or an httpx.Response object, which has the same attributes.
+
+        Returns:
+            The cached response if the server responded with 304 Not Modified. The provided response otherwise."""
+        if response.status_code == 304:
+            meta, body = self._read_entry(url)
+            if meta is not None and body is not None:
+                meta["fetched_at"] = time.time()
+                self._write(url, meta)
+                return self._response(url, meta, body)
+        if response.status_code == 200:
+            self._write(
+                url,
+                {
+                    "url": url,
+                    "status_code": 200,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "content_type": response.headers.get("Content-Type"),
+                    "fetched_at": time.time(),
+                    # the page may have changed, so the paper extracted from the old page is dropped
+                    "paper": None,
+                },
+                response.content,
+            )
+        return response
+
+    @staticmethod
+    def _response(url: str, meta: dict, body: bytes) -> Response:
+        """Build a requests.Response object from a cached entry."""
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        response._content = body
+        if meta.get("content_type"):
+            response.headers = CaseInsensitiveDict({"Content-Type": meta["content_type"]})
+        return response
+
+
+_cache = None  # type: Union[ResponseCache, None]
+
+
+def configure_response_cache(directory: Union[str, Path], max_bytes: int, ttl: datetime.timedelta):
+    """Enable the shared response cache. Should be called once at start up.
+
+    Args:
+        directory: The directory where the cache is stored. It is created if it doesn't exist.
+        max_bytes: The maximum total size of the cache in bytes.
+        ttl: How long an entry is used without revalidation."""
+    global _cache
+    _cache = ResponseCache(directory, max_bytes, ttl)
+
+
+def get_paper(url: str) -> Union[Paper, None]:
+    """Get the paper extracted from a URL from the shared cache. None if the cache is disabled."""
+    return _cache.get_paper(url) if _cache else None
+
+
+def set_paper(url: str, paper: Paper):
+    """Cache the paper extracted from a URL in the shared cache, if it is enabled."""
+    if _cache:
+        _cache.set_paper(url, paper)
+
+
+def cached_get(url: str, http_get: Callable[..., Response]) -> Response:
+    """Get a URL through the shared cache, or directly with http_get if the cache is disabled."""
+    return _cache.get(url, http_get) if _cache else http_get(url)
+
+
+def is_enabled() -> bool:
+    """Check if the shared cache is enabled."""
+    return _cache is not None
+
+
+def lookup(url: str) -> Tuple[Union[Response, None], Dict[str, str]]:
+    """Look up the cached response of a URL in the shared cache. See ResponseCache.lookup."""
+    return _cache.lookup(url) if _cache else (None, {})
+
+
+def store(url: str, response: Response) -> Response:
+    """Cache the response of a request sent after lookup in the shared cache. See ResponseCache.store."""
+    return _cache.store(url, response) if _cache else response
@@ -0,0 +1,620 @@
+"""Message-scoped pipeline stages used to route papers shared in a Slack message to users.
+
+A message is processed in stages: the URLs in the message are first resolved to papers exactly once, then the
+resolved papers are fanned out to every (user, project) pair that should receive a recommendation.
+"""
+
+import datetime
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+from bson.objectid import ObjectId
+from pymongo.database import Database
+
+import numpy as np
+
+from .engine.base import RecommendationOutput
+from .engine.embedding import embed_texts, cosine_similarity, select_pairs
+from .engine.open_ai import batch_projects
+from .paper_extraction.base import Paper
+from .paper_extraction.from_url import extract_abstracts_from_urls, canonical_url
+from .mangodb import crud as db_crud
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResolvedPaper:
+    """Data class for a paper that has been extracted from a URL and recorded in the database.
+
+    Attributes:
+        url: The URL shared in the message.
+        paper: The extracted Paper dataclass.
+        paper_id: The ID of the paper document in the papers collection."""
+
+    url: str
+    paper: Paper
+    paper_id: ObjectId
+
+
+@dataclass
+class ProjectTarget:
+    """Data class for a (user, project) pair that a paper can be recommended to.
+
+    Attributes:
+        user_id: The Slack user ID.
+        project_id: The ID of the project document in the projects collection.
+        project_description: The description of the project.
+        vip: The VIP status of the user."""
+
+    user_id: str
+    project_id: ObjectId
+    project_description: str
+    vip: bool
+
+
+@dataclass
+class MessagePapers:
+    """Data class for the papers resolved from a single message.
+
+    Attributes:
+        papers: The papers successfully resolved from the URLs in the message.
+        urls: The number of URLs found in the message, including repeated ones.
+        fetches: The number of extractions (network fetches) performed to resolve the papers.
+        known: The number of papers found in the database without extraction.
+        db_errors: The number of extracted papers that failed to be recorded in the database, and were skipped."""
+
+    papers: List[ResolvedPaper] = field(default_factory=list)
+    urls: int = 0
+    fetches: int = 0
+    known: int = 0
+    db_errors: int = 0
+
+    def fetches_saved(self, num_targets: int) -> int:
+        """Number of fetches saved compared to extracting every URL once per (user, project) pair.
+
+        Args:
+            num_targets: The number of (user, project) pairs the papers are fanned out to.
+
+        Returns:
+            The number of fetches that were avoided."""
+        return max(self.urls * num_targets - self.fetches, 0)
+
+
+@dataclass
+class PendingDelivery:
+    """Data class for a recommendation waiting to be recorded in the database and sent to the user.
+
+    Attributes:
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+        recommendation: The output of the engine.
+        record: The recommendation record to be inserted in the recommendations collection."""
+
+    target: ProjectTarget
+    resolved_paper: ResolvedPaper
+    recommendation: RecommendationOutput
+    record: dict
+
+
+class RecommendationBuffer:
+    """Buffers the recommendations of a message, so that their records are inserted in bulk.
+
+    The buffer is ready to be flushed once it holds batch_size recommendations, or once its oldest recommendation
+    has waited flush_interval seconds, so that the first messages are not held back until the end of a large fan-out.
+
+    Args:
+        batch_size: The maximum number of recommendations inserted together.
+        flush_interval: The maximum number of seconds a recommendation waits for the buffer to fill up.
+        source: The source of the recommendations, see message_source. If set, the records get a delivery key."""
+
+    def __init__(self, batch_size: int, flush_interval: float, source: Union[str, None] = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.source = source
+        self._pending = []  # type: List[PendingDelivery]
+        self._oldest = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, target: ProjectTarget, resolved_paper: ResolvedPaper, recommendation: RecommendationOutput):
+        """Add a recommendation to the buffer, along with its record."""
+        if not self._pending:
+            self._oldest = time.monotonic()
+        record = recommendation_record(target, resolved_paper, recommendation, self.source)
+        self._pending.append(PendingDelivery(target, resolved_paper, recommendation, record))
+
+    def ready(self) -> bool:
+        """Check if the buffer should be flushed."""
+        return bool(self._pending) and (
+            len(self._pending) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval
+        )
+
+    def time_left(self) -> Union[float, None]:
+        """Seconds until the oldest recommendation has waited flush_interval seconds. None if the buffer is empty.
+
+        Passed as the flush_timeout of the fan-outs, so that the buffer is flushed on time even if no other result
+        arrives."""
+        if not self._pending:
+            return None
+        return max(0.0, self._oldest + self.flush_interval - time.monotonic())
+
+    def take(self) -> List[PendingDelivery]:
+        """Remove and return all the buffered recommendations."""
+        pending, self._pending = self._pending, []
+        return pending
+
+
+def message_source(message: dict) -> Union[str, None]:
+    """Identify a Slack message by its channel and timestamp, which are unique.
+
+    Args:
+        message: The Slack message event, or the message of a job.
+
+    Returns:
+        The source in string, e.g. "C0123456789:1700000000.000100". None if the message has no channel or timestamp.
+    """
+    if not message.get("channel") or not message.get("ts"):
+        return None
+    return f"{message['channel']}:{message['ts']}"
+
+
+def delivery_key(source: str, target: ProjectTarget, resolved_paper: ResolvedPaper) -> str:
+    """Identify the recommendation of a paper shared in a message to a project, so that it is recorded only once.
+
+    Args:
+        source: The message the paper was shared in, see message_source.
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+
+    Returns:
+        The delivery key in string."""
+    return f"{source}:{target.project_id}:{resolved_paper.paper_id}"
+
+
+def recommendation_record(
+    target: ProjectTarget,
+    resolved_paper: ResolvedPaper,
+    recommendation: RecommendationOutput,
+    source: Union[str, None] = None,
+) -> dict:
+    """Create the record of a recommendation for the recommendations collection.
+
+    The project description and the paper abstract are not copied into the record. They can be joined back in
+    with db_crud.get_recommendations_with_text.
+
+    Args:
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+        recommendation: The output of the engine.
+        source: The message the paper was shared in, see message_source. If set, the record gets a unique
+            delivery_key, so that the retries of a job don't record and send the recommendation again.
+
+    Returns:
+        The recommendation record in dictionary."""
+    record = {
+        "user_id": target.user_id,
+        "project_id": target.project_id,
+        "paper_id": resolved_paper.paper_id,
+        # the texts are referenced by project_id and paper_id; the hash records which versions were scored
+        "content_hash": db_crud.recommendation_content_hash(target.project_description, resolved_paper.paper.abstract),
+        "paper_url": resolved_paper.url,
+        "recommend": recommendation.decision,
+        "explanation": recommendation.explanation,
+        "created_at": datetime.datetime.now(tz=datetime.timezone.utc),
+    }
+    if source:
+        record["delivery_key"] = delivery_key(source, target, resolved_paper)
+    return record
+
+
+def resolve_papers(db: Database, urls: List[str]) -> MessagePapers:
+    """Resolve each URL in a message to a paper and a paper ID exactly once.
+
+    Papers already in the database are found by the canonical form of the URL with a single indexed read,
+    without any network request. Other URLs are extracted once, even if they are repeated in the message,
+    and all the arxiv papers in the message are retrieved together.
+    URLs that fail extraction or database insertion are skipped.
+
+    Args:
+        db: The MongoDB database object.
+        urls: The URLs extracted from the message.
+
+    Returns:
+        A MessagePapers dataclass containing the resolved papers and the fetch statistics."""
+    resolved = MessagePapers(urls=len(urls))
+    # dict.fromkeys removes repeated URLs while keeping their order in the message
+    canonicals = {url: canonical_url(url) for url in dict.fromkeys(urls)}
+    known = {}  # type: dict
+    for url, canonical in canonicals.items():
+        document = db_crud.find_paper_by_canonical_url(db, canonical)
+        if document:
+            known[url] = document
+
+    # the remaining URLs are extracted together, so that arxiv papers are retrieved with a single API request
+    unknown_urls = [url for url in canonicals if url not in known]
+    resolved.fetches = len(unknown_urls)
+    resolved.known = len(known)
+    extracted = extract_abstracts_from_urls(unknown_urls) if unknown_urls else {}
+
+    for url, canonical in canonicals.items():
+        if url in known:
+            document = known[url]
+            paper = Paper(
+                url=document["url"],
+                title=document["title"],
+                authors=document["authors"],
+                abstract=document["abstract"],
+            )
+            resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=document["_id"]))
+            continue
+
+        paper = extracted.get(url)
+        if not paper:
+            continue
+        # record the paper in the database, along with the canonical URLs it can be found by
+        paper_id = db_crud.insert_paper(db, paper, [canonical, canonical_url(paper.url)])
+        # if not paper_id it means paper insertion or retrieval failed
+        # in that case, skip the recommendation process
+        if not paper_id:
+            resolved.db_errors += 1
+            continue
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=paper_id))
+    return resolved
+
+
+def resolve_extracted_paper(db: Database, url: str, extract: Callable[[], Union[Paper, None]]) -> MessagePapers:
+    """Resolve a paper shared as a file, rather than a URL, to a paper and a paper ID.
+
+    The paper is found in the database by the canonical form of its URL, such as the permalink of a PDF file shared
+    in Slack, so that a file shared again is not downloaded and extracted again. Otherwise it is extracted once.
+
+    Args:
+        db: The MongoDB database object.
+        url: The URL the paper is recorded with.
+        extract: A function that extracts the paper, returning None if the extraction failed.
+
+    Returns:
+        A MessagePapers dataclass containing the resolved paper, if any, and the fetch statistics."""
+    resolved = MessagePapers(urls=1)
+    canonical = canonical_url(url)
+    document = db_crud.find_paper_by_canonical_url(db, canonical)
+    if document:
+        resolved.known = 1
+        paper = Paper(
+            url=document["url"],
+            title=document["title"],
+            authors=document["authors"],
+            abstract=document["abstract"],
+        )
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=document["_id"]))
+        return resolved
+
+    resolved.fetches = 1
+    paper = extract()
+    if not paper:
+        return resolved
+    paper_id = db_crud.insert_paper(db, paper, [canonical])
+    if paper_id:
+        resolved.papers.append(ResolvedPaper(url=url, paper=paper, paper_id=paper_id))
+    else:
+        resolved.db_errors += 1
+    return resolved
+
+
+def get_project_targets(db: Database, user_id: Union[str, None] = None) -> List[ProjectTarget]:
+    """Get all the (user, project) pairs that shared papers should be recommended to.
+
+    Args:
+        db: The MongoDB database object.
+        user_id: If provided, only the projects of this user are returned. Used for "#dev" messages.
+
+    Returns:
+        A list of ProjectTarget dataclasses."""
+    query = {"_id": user_id} if user_id else {}
+    users_curser = db.users.find(
+        query,
+        projection={
+            "_id": 1,
+            "projects": 1,
+            "vip": 1,
+        },
+    )
+    # NOTE: curser object is not list; it can only be iterated once and indexing would be very inefficient
+    return [
+        ProjectTarget(
+            user_id=user["_id"],
+            project_id=project["project_id"],
+            project_description=project["description"],
+            vip=user.get("vip", False),
+        )
+        for user in users_curser
+        for project in user.get("projects", [])
+    ]
+
+
+def log_fetches_saved(resolved: MessagePapers, num_targets: int) -> int:
+    """Report how many fetches were saved by resolving the papers of a message once.
+
+    Args:
+        resolved: The papers resolved from the message.
+        num_targets: The number of (user, project) pairs the papers are fanned out to.
+
+    Returns:
+        The number of fetches saved."""
+    saved = resolved.fetches_saved(num_targets)
+    logger.info(
+        "Resolved %d paper(s) from %d URL(s) with %d fetch(es) and %d known paper(s) for %d project(s); "
+        "saved %d fetch(es).",
+        len(resolved.papers),
+        resolved.urls,
+        resolved.fetches,
+        resolved.known,
+        num_targets,
+        saved,
+    )
+    return saved
+
+
+def all_pairs(targets: List[ProjectTarget], papers: List[ResolvedPaper]) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Pair every (user, project) pair with every paper resolved from the message.
+
+    Args:
+        targets: The (user, project) pairs.
+        papers: The papers resolved from the message.
+
+    Returns:
+        A list of (target, paper) tuples."""
+    return [(target, resolved_paper) for target in targets for resolved_paper in papers]
+
+
+def skip_recorded_pairs(
+    db: Database, pairs: List[Tuple[ProjectTarget, ResolvedPaper]], source: str
+) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Remove the (user, project) and paper pairs whose recommendation is already recorded for a message.
+
+    Used by the retries of a job, so that the pairs recorded by an earlier attempt are neither scored nor sent
+    again. The unique index on delivery_key still prevents duplicates if the lookup fails.
+
+    Args:
+        db: The MongoDB database object.
+        pairs: The (ProjectTarget, ResolvedPaper) pairs.
+        source: The message the papers were shared in, see message_source.
+
+    Returns:
+        The pairs without a recorded recommendation."""
+    keys = [delivery_key(source, target, resolved_paper) for target, resolved_paper in pairs]
+    recorded = db_crud.find_recorded_delivery_keys(db, keys)
+    if recorded is False:
+        return pairs
+    if recorded:
+        logger.info("Skipped %d pair(s) already recorded for message '%s'.", len(recorded), source)
+    return [pair for pair, key in zip(pairs, keys) if key not in recorded]
+
+
+def _get_or_create_embeddings(db: Database, collection: str, documents: dict, model: str) -> np.ndarray:
+    """Get the stored embeddings of documents, embedding and storing the ones that are missing.
+
+    Args:
+        db: The MongoDB database object.
+        collection: The name of the collection, either "projects" or "papers".
+        documents: A dictionary mapping document IDs to the texts to be embedded.
+        model: The embedding model.
+
+    Returns:
+        A 2D array with one row per document, in the order of the documents dictionary."""
+    ids = list(documents)
+    embeddings = db_crud.get_embeddings(db, collection, ids, model)
+    missing = [doc_id for doc_id in ids if doc_id not in embeddings]
+    if missing:
+        vectors = embed_texts([documents[doc_id] for doc_id in missing], model)
+        new_embeddings = {doc_id: vector.tolist() for doc_id, vector in zip(missing, vectors)}
+        db_crud.set_embeddings(db, collection, new_embeddings, model)
+        embeddings.update(new_embeddings)
+    return np.array([embeddings[doc_id] for doc_id in ids], dtype=np.float32)
+
+
+def prefilter_pairs(
+    db: Database,
+    targets: List[ProjectTarget],
+    papers: List[ResolvedPaper],
+    configs: dict,
+) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Select the (project, paper) pairs to be sent to the engine using the cosine similarity of their embeddings.
+
+    Project descriptions and paper abstracts are embedded once and stored alongside the documents in the projects
+    and papers collections. For each paper, the `prefilter_top_k` most similar projects and any project with a
+    similarity of at least `prefilter_threshold` are kept. If the embeddings cannot be created, every pair is kept.
+
+    Args:
+        db: The MongoDB database object.
+        targets: The (user, project) pairs.
+        papers: The papers resolved from the message.
+        configs: The app configurations.
+
+    Returns:
+        A list of (target, paper) tuples."""
+    if not targets or not papers:
+        return []
+    model = configs["Engine"].get("embedding_model", "text-embedding-3-small")
+    # keyed by ID, since two URLs in a message can resolve to the same paper
+    projects = {target.project_id: target.project_description for target in targets}
+    abstracts = {resolved_paper.paper_id: resolved_paper.paper.abstract for resolved_paper in papers}
+    try:
+        project_vectors = _get_or_create_embeddings(db, "projects", projects, model)
+        paper_vectors = _get_or_create_embeddings(db, "papers", abstracts, model)
+    except Exception:
+        logger.exception("Failed to embed the projects and papers. All pairs are sent to the engine.")
+        return all_pairs(targets, papers)
+
+    return select_prefiltered_pairs(targets, papers, project_vectors, paper_vectors, configs)
+
+
+def select_prefiltered_pairs(
+    targets: List[ProjectTarget],
+    papers: List[ResolvedPaper],
+    project_vectors: np.ndarray,
+    paper_vectors: np.ndarray,
+    configs: dict,
+) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Select the (project, paper) pairs whose embeddings are similar enough. Shared by the sync and async pre-filters.
+
+    Args:
+        targets: The (user, project) pairs.
+        papers: The papers resolved from the message.
+        project_vectors: The embeddings of the distinct projects, in the order they first appear in targets.
+        paper_vectors: The embeddings of the distinct papers, in the order they first appear in papers.
+        configs: The app configurations.
+
+    Returns:
+        A list of (target, paper) tuples."""
+    project_index = {}  # type: dict
+    for target in targets:
+        project_index.setdefault(target.project_id, len(project_index))
+    paper_index = {}  # type: dict
+    for resolved_paper in papers:
+        paper_index.setdefault(resolved_paper.paper_id, len(paper_index))
+    similarities = cosine_similarity(project_vectors, paper_vectors)
+    selected = set(
+        select_pairs(
+            similarities,
+            top_k=configs["Engine"].getint("prefilter_top_k", fallback=10),
+            threshold=configs["Engine"].getfloat("prefilter_threshold", fallback=0.3),
+        )
+    )
+    pairs = [
+        (target, resolved_paper)
+        for target in targets
+        for resolved_paper in papers
+        if (project_index[target.project_id], paper_index[resolved_paper.paper_id]) in selected
+    ]
+    logger.info("Pre-filter kept %d of %d (project, paper) pairs.", len(pairs), len(targets) * len(papers))
+    return pairs
+
+
+def unique_pairs(pairs: List[Tuple[ProjectTarget, ResolvedPaper]]) -> List[Tuple[ProjectTarget, ResolvedPaper]]:
+    """Remove the repeated (project, paper) pairs, e.g. when a message links the same paper with two URLs, such as
+    its arxiv abstract page and its PDF, so that each project is scored and messaged once per paper.
+
+    Args:
+        pairs: The (target, paper) tuples.
+
+    Returns:
+        The (target, paper) tuples with the first URL of each (project, paper) pair, in their original order."""
+    seen = set()  # type: set
+    unique = []
+    for target, resolved_paper in pairs:
+        key = (resolved_paper.paper_id, target.project_id)
+        if key not in seen:
+            seen.add(key)
+            unique.append((target, resolved_paper))
+    return unique
+
+
+def _completed(
+    futures: Iterable[Future], flush_timeout: Union[Callable[[], Union[float, None]], None]
+) -> Iterator[Union[Future, None]]:
+    """Yield the futures as they complete, like as_completed, and None whenever flush_timeout() seconds pass without
+    any of them completing. Without flush_timeout, only the futures are yielded."""
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=flush_timeout() if flush_timeout else None, return_when=FIRST_COMPLETED)
+        if not done:
+            yield None
+        yield from done
+
+
+def fan_out_recommendations(
+    executor: Executor,
+    pairs: List[Tuple[ProjectTarget, ResolvedPaper]],
+    score: Callable[[ProjectTarget, ResolvedPaper], Union[RecommendationOutput, None]],
+    flush_timeout: Union[Callable[[], Union[float, None]], None] = None,
+) -> Iterator[Union[Tuple[ProjectTarget, ResolvedPaper, RecommendationOutput], None]]:
+    """Score the (project, paper) pairs concurrently and yield the results as they arrive.
+
+    The concurrency is bounded by the number of workers of the executor. Repeated (project, paper) pairs are scored
+    once, and pairs that the engine failed to score are skipped.
+
+    Args:
+        executor: The executor used to run the engine calls.
+        pairs: The (target, paper) tuples to be scored.
+        score: The function that scores a paper against a project.
+        flush_timeout: If provided, returns the number of seconds to wait for the next result, or None to wait
+            indefinitely. None is yielded when no result arrives in time, so that the caller can flush its buffer.
+
+    Returns:
+        An iterator of (target, paper, recommendation) tuples in the order they are completed, and None on timeouts."""
+    futures = {
+        executor.submit(score, target, resolved_paper): (target, resolved_paper)
+        for target, resolved_paper in unique_pairs(pairs)
+    }
+    for future in _completed(futures, flush_timeout):
+        if future is None:
+            yield None
+            continue
+        target, resolved_paper = futures[future]
+        try:
+            recommendation = future.result()
+        except Exception:
+            logger.exception("Failed to score paper '%s' for project '%s'.", resolved_paper.url, target.project_id)
+            continue
+        if recommendation is None:
+            continue
+        yield target, resolved_paper, recommendation
+
+
+def fan_out_batch_recommendations(
+    executor: Executor,
+    pairs: List[Tuple[ProjectTarget, ResolvedPaper]],
+    score_batch: Callable[[List[ProjectTarget], ResolvedPaper], List[Union[RecommendationOutput, None]]],
+    configs: dict,
+    flush_timeout: Union[Callable[[], Union[float, None]], None] = None,
+) -> Iterator[Union[Tuple[ProjectTarget, ResolvedPaper, RecommendationOutput], None]]:
+    """Score the (project, paper) pairs concurrently in batches of projects, and yield the results as they arrive.
+
+    The repeated (project, paper) pairs are removed, then the pairs are grouped by paper, and the projects of each
+    paper are split into batches within the `batch_size` and `batch_token_budget` settings, so that each batch only
+    needs one request to the engine.
+
+    Args:
+        executor: The executor used to run the engine calls.
+        pairs: The (target, paper) tuples to be scored.
+        score_batch: The function that scores a paper against a batch of projects.
+        configs: The app configurations.
+        flush_timeout: As in fan_out_recommendations.
+
+    Returns:
+        An iterator of (target, paper, recommendation) tuples in the order they are completed, and None on timeouts."""
+    pairs = unique_pairs(pairs)
+    groups = {}  # type: dict
+    for target, resolved_paper in pairs:
+        groups.setdefault(resolved_paper.paper_id, (resolved_paper, []))[1].append(target)
+
+    futures = {}
+    for resolved_paper, targets in groups.values():
+        for batch in batch_projects(
+            [target.project_description for target in targets],
+            resolved_paper.paper.abstract,
+            max_batch_size=configs["Engine"].getint("batch_size", fallback=10),
+            token_budget=configs["Engine"].getint("batch_token_budget", fallback=12000),
+        ):
+            batch_targets = [targets[index] for index in batch]
+            futures[executor.submit(score_batch, batch_targets, resolved_paper)] = (batch_targets, resolved_paper)
+    logger.info("Scoring %d (project, paper) pairs in %d batch(es).", len(pairs), len(futures))
+
+    for future in _completed(futures, flush_timeout):
+        if future is None:
+            yield None
+            continue
+        batch_targets, resolved_paper = futures[future]
+        try:
+            recommendations = future.result()
+        except Exception:
+            logger.exception("Failed to score paper '%s' for a batch of projects.", resolved_paper.url)
+            continue
+        for target, recommendation in zip(batch_targets, recommendations):
+            if recommendation is not None:
+                yield target, resolved_paper, recommendation
@@ -0,0 +1,264 @@
+"""Recommend the papers shared in Slack to users based on their project descriptions.
+
+The recommendation pipeline is shared by the Slack app (app.py) and the worker processes (worker.py). It does not
+create the Slack app, so that workers can import it without connecting to Slack: the recommendation messages are sent
+with a WebClient, which only calls the Slack API when a message is sent.
+"""
+
+import os
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set, Union
+from bson.objectid import ObjectId
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+from slack_sdk import WebClient
+
+from .settings import configs
+from .engine.base import RecommendationOutput
+from .engine.open_ai import paper_recommendation, paper_recommendation_batch
+from .mangodb import crud as db_crud
+from .delivery import DirectMessageSender, RecommendationItem
+from .pipeline import (
+    ProjectTarget,
+    ResolvedPaper,
+    MessagePapers,
+    PendingDelivery,
+    RecommendationBuffer,
+    resolve_papers,
+    get_project_targets,
+    message_source,
+    skip_recorded_pairs,
+    log_fetches_saved,
+    all_pairs,
+    prefilter_pairs,
+    fan_out_recommendations,
+    fan_out_batch_recommendations,
+)
+
+### Initialise the database ###
+# create a MongoClient instance
+# Set the Stable API version when creating a new client
+mongo_client = MongoClient(configs["App"]["mongodb_connect_str"], server_api=ServerApi("1"))  # type: MongoClient
+# connect to the paper_recommender database
+# A new database with the specified name will be created if it doesn't exist, when inserting a document
+db = mongo_client["paper_recommender"]
+
+# The engine calls of a message are fanned out to their own pool, bounded by the `max_concurrency` setting.
+scoring_executor = ThreadPoolExecutor(
+    max_workers=configs["Engine"].getint("max_concurrency", fallback=8), thread_name_prefix="engine"
+)
+# The recommendation messages are sent by a background sender, which coalesces the recommendations for the same user
+# into one message and stays within the rate limits of chat.postMessage.
+dm_sender = DirectMessageSender(
+    WebClient(token=os.environ.get("SLACK_BOT_TOKEN")).chat_postMessage,
+    rate=configs["App"].getfloat("dm_rate_per_second", fallback=5),
+    burst=configs["App"].getint("dm_burst", fallback=10),
+    window=configs["App"].getfloat("dm_coalesce_seconds", fallback=5),
+    max_retries=configs["App"].getint("dm_max_retries", fallback=3),
+)
+
+
+def recommend_papers(message: dict, urls: List[str]) -> Set[str]:
+    """Recommends the papers shared in a message to users based on their project descriptions.
+
+    Each URL is resolved to a paper once. The (project, paper) pairs, optionally pre-filtered by embedding
+    similarity, are then scored concurrently by the engine, bounded by the `max_concurrency` setting, and the
+    private messages are queued to the DM sender as soon as each result is recorded. In "batch" mode, the projects
+    of each paper are scored in batches with one request per batch.
+
+    The records are keyed by the message, so processing the same message again, e.g. when a job is retried, only
+    scores and sends the pairs that were not recorded yet.
+
+    Args:
+        message: The Slack message event. Only the "text", "user", "channel" and "ts" fields are used.
+        urls: The URLs of known domains extracted from the message.
+
+    Returns:
+        The IDs of the users whose messages may still be waiting in the DM sender.
+
+    Raises:
+        Any unexpected exception, such as a database error while reading the projects, and RuntimeError if a paper
+        or a recommendation failed to be recorded, so that jobs can be retried.
+    """
+    # if the message starts with "#dev", only send the message to the message sender
+    if message["text"].startswith("#dev"):
+        targets = get_project_targets(db, message["user"])
+    else:
+        # get the projects of all users
+        targets = get_project_targets(db)
+
+    # resolve every URL in the message to a paper once, then fan the papers out to every project
+    resolved = resolve_papers(db, urls)
+    log_fetches_saved(resolved, len(targets))
+    failed_records = recommend_resolved_papers(targets, resolved, message_source(message))
+    # the crud functions log and swallow database errors, which would otherwise complete the job without its papers
+    if resolved.db_errors or failed_records:
+        raise RuntimeError(
+            f"Failed to record {resolved.db_errors} paper(s) and {failed_records} recommendation(s) in the database."
+        )
+    return {target.user_id for target in targets}
+
+
+def recommend_resolved_papers(
+    targets: List[ProjectTarget], resolved: MessagePapers, source: Union[str, None] = None
+) -> int:
+    """Recommends resolved papers to the (user, project) pairs, and queues the private messages to the DM sender.
+
+    Args:
+        targets: The (user, project) pairs.
+        resolved: The papers resolved from a message or a shared file.
+        source: The message the papers were shared in, see pipeline.message_source. If set, the pairs already
+            recorded for the message are skipped, and a message is only sent for the newly inserted records.
+
+    Returns:
+        The number of recommendations that failed to be recorded, and were not sent.
+    """
+    # only send the pairs that are similar enough to the engine, if the pre-filter is enabled
+    if configs["Engine"].getboolean("prefilter", fallback=False):
+        pairs = prefilter_pairs(db, targets, resolved.papers, configs)
+    else:
+        pairs = all_pairs(targets, resolved.papers)
+    if source:
+        pairs = skip_recorded_pairs(db, pairs, source)
+
+    # the records are inserted in bulk, and the messages are sent once their records are inserted
+    buffer = RecommendationBuffer(
+        batch_size=configs["App"].getint("recommendation_batch_size", fallback=50),
+        flush_interval=configs["App"].getfloat("recommendation_flush_seconds", fallback=2),
+        source=source,
+    )
+    if configs["Engine"].get("mode", "two_calls") == "batch":
+        results = fan_out_batch_recommendations(
+            scoring_executor, pairs, score_papers_batch, configs, flush_timeout=buffer.time_left
+        )
+    else:
+        results = fan_out_recommendations(scoring_executor, pairs, score_paper, flush_timeout=buffer.time_left)
+    failed_records = 0
+    # None is yielded when the oldest buffered recommendation is due, even if no other result has arrived
+    for result in results:
+        if result is not None:
+            buffer.add(*result)
+        if buffer.ready():
+            failed_records += deliver_recommendations(buffer.take())
+    return failed_records + deliver_recommendations(buffer.take())
+
+
+def score_paper(target: ProjectTarget, resolved_paper: ResolvedPaper) -> Union[RecommendationOutput, None]:
+    """Scores a resolved paper against the project of a (user, project) pair using the engine.
+
+    Recommendations are cached by the hash of the project description, the paper ID and the model, so that
+    a reposted paper does not call the engine again for the same project.
+
+    Args:
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+
+    Returns:
+        The RecommendationOutput dataclass. Or None if the engine failed.
+    """
+    return score_papers_batch([target], resolved_paper)[0]
+
+
+def score_papers_batch(
+    targets: List[ProjectTarget],
+    resolved_paper: ResolvedPaper,
+) -> List[Union[RecommendationOutput, None]]:
+    """Scores a resolved paper against the projects of several (user, project) pairs using the engine.
+
+    Cached recommendations are used where possible. In "batch" mode, the remaining projects are scored with a single
+    request; otherwise they are scored one by one.
+
+    Args:
+        targets: The (user, project) pairs.
+        resolved_paper: The paper resolved from the shared URL.
+
+    Returns:
+        A list with a RecommendationOutput for each target. An item is None if the engine failed.
+    """
+    use_cache = configs["Engine"].getboolean("cache_recommendations", fallback=True)
+    recommendations = [None] * len(targets)  # type: List[Union[RecommendationOutput, None]]
+    keys = []  # type: List[dict]
+    if use_cache:
+        # a project that has already scored the paper with the same model is served from the cache
+        keys = [
+            db_crud.recommendation_cache_key(
+                target.project_description, resolved_paper.paper_id, configs["Engine"]["model"]
+            )
+            for target in targets
+        ]
+        recommendations = [db_crud.get_cached_recommendation(db, key) for key in keys]
+
+    missing = [index for index, recommendation in enumerate(recommendations) if recommendation is None]
+    if not missing:
+        return recommendations
+    if configs["Engine"].get("mode", "two_calls") == "batch":
+        scored = paper_recommendation_batch(
+            [targets[index].project_description for index in missing], resolved_paper.paper.abstract, configs
+        )
+    else:
+        scored = [
+            paper_recommendation(targets[index].project_description, resolved_paper.paper.abstract, configs)
+            for index in missing
+        ]
+
+    for index, recommendation in zip(missing, scored):
+        recommendations[index] = recommendation
+        if use_cache and recommendation is not None:
+            db_crud.cache_recommendation(
+                db,
+                keys[index],
+                recommendation,
+                ttl=datetime.timedelta(days=configs["Engine"].getfloat("cache_ttl_days", fallback=30)),
+                max_entries=configs["Engine"].getint("cache_max_entries", fallback=10000),
+            )
+    return recommendations
+
+
+def deliver_recommendations(deliveries: List[PendingDelivery]) -> int:
+    """Records recommendations in bulk, then sends them to the users of their (user, project) pairs.
+
+    The recommendations are recorded in the database regardless of the decision. A recommendation whose record
+    failed to be inserted is not sent, since the feedback on its message could not be recorded, and neither is a
+    recommendation that was already recorded by an earlier attempt.
+
+    Args:
+        deliveries: The recommendations to be recorded and sent.
+
+    Returns:
+        The number of recommendations that failed to be recorded.
+    """
+    if not deliveries:
+        return 0
+    recommendation_ids = db_crud.insert_recommendations(db, [delivery.record for delivery in deliveries])
+    for delivery, recommendation_id in zip(deliveries, recommendation_ids):
+        # if recommendation insertion failed, or the recommendation was already recorded, skip the message posting
+        if recommendation_id:
+            send_recommendation(delivery.target, delivery.resolved_paper, delivery.recommendation, recommendation_id)
+    return recommendation_ids.count(False)
+
+
+def send_recommendation(
+    target: ProjectTarget,
+    resolved_paper: ResolvedPaper,
+    recommendation: RecommendationOutput,
+    recommendation_id: ObjectId,
+):
+    """Queues a recorded recommendation to be sent to the user of a (user, project) pair.
+
+    A private message is sent to the user if the paper is recommended, or if the user is a VIP member. The
+    recommendations for the same user within the `dm_coalesce_seconds` window are sent in one message.
+
+    Args:
+        target: The (user, project) pair.
+        resolved_paper: The paper resolved from the shared URL.
+        recommendation: The output of the engine.
+        recommendation_id: The ID of the recommendation record, used to record the feedback on the message.
+    """
+    if recommendation.decision or target.vip:
+        dm_sender.submit(
+            target.user_id,
+            RecommendationItem(
+                recommendation.decision, resolved_paper.url, recommendation.explanation, str(recommendation_id)
+            ),
+        )
@@ -0,0 +1,61 @@
+"""Loads the configurations of the app from the configs.ini file, and configures the shared paper extraction
+components accordingly.
+
+This module is shared by the synchronous app (app.py) and the asynchronous app (async_app.py).
+"""
+
+import datetime
+import configparser
+import logging
+from pathlib import Path
+
+from .paper_extraction.citation_meta import CitationMeta, configure_citation_meta
+from .paper_extraction.http_session import configure_session
+from .paper_extraction.registry import registry
+from .paper_extraction.response_cache import configure_response_cache
+
+### Load the configurations from the configs.ini file ###
+project_dir = Path(__file__).parent.parent.parent
+config_path = (project_dir / "configs/configs.ini").resolve()
+configs = configparser.ConfigParser(allow_no_value=True)
+configs.read(config_path)
+if not configs["App"]["app_log"]:
+    Path(str((project_dir / "logs").resolve())).mkdir(parents=True, exist_ok=True)
+    configs["App"]["app_log"] = str((project_dir / "logs/app.log").resolve())
+if not configs["App"]["unknown_domains"]:
+    configs["App"]["unknown_domains"] = str((project_dir / "logs/unknown_domains.txt").resolve())
+
+
+def configure_logging():
+    """Set up the logging level and location of the app. Called by the entry points of the app and the workers.
+
+    Other libraries log from the WARNING level, and the modules of this package from the `log_level` setting, so
+    that their statistics, such as the fetches saved by resolving the papers of a message once, are reported."""
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%d/%m/%Y %H:%M:%S %z",
+        filename=configs["App"]["app_log"],
+    )
+    logging.getLogger(__package__).setLevel(configs["App"].get("log_level", fallback="INFO").upper())
+
+
+### Configure the HTTP session shared by the paper extractors ###
+configure_session(
+    timeout=configs.getfloat("HTTP", "timeout", fallback=10),
+    pool_connections=configs.getint("HTTP", "pool_connections", fallback=10),
+    pool_maxsize=configs.getint("HTTP", "pool_maxsize", fallback=8),
+    retries=configs.getint("HTTP", "retries", fallback=3),
+    backoff_factor=configs.getfloat("HTTP", "backoff_factor", fallback=0.5),
+)
+if configs.getboolean("HTTP", "cache", fallback=True):
+    configure_response_cache(
+        configs.get("HTTP", "cache_dir", fallback=None) or str((project_dir / "logs/http_cache").resolve()),
+        max_bytes=int(configs.getfloat("HTTP", "cache_max_mb", fallback=200) * 1024 * 1024),
+        ttl=datetime.timedelta(hours=configs.getfloat("HTTP", "cache_ttl_hours", fallback=168)),
+    )
+
+### Extract the papers of unknown domains from their citation meta tags ###
+if configs.getboolean("App", "generic_extraction", fallback=False):
+    configure_citation_meta(max_head_bytes=int(configs.getfloat("HTTP", "max_head_kb", fallback=256) * 1024))
+    registry.set_fallback(CitationMeta)
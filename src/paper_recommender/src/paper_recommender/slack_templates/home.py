@@ -1,6 +1,15 @@
-"""Defines view templates for the Slack home tab."""
+"""Defines view templates for the Slack home tab.
 
-from typing import List, Union
+The home view is rebuilt every time a user opens the App Home or changes a project. The static blocks are built once
+at import time, and the blocks of each project are memoized, so that a view is assembled from cached blocks. The
+blocks are shared by all the views and must not be modified.
+"""
+
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+# maximum number of memoized project and add-project blocks
+PROJECT_CACHE_SIZE = 4096
 
 
 def project_view(project_id: str, project_description: str, title: Union[str, None]) -> List:
@@ -14,7 +23,13 @@ def project_view(project_id: str, project_description: str, title: Union[str, No
     Returns:
         A dictionary representing a Slack home view.
     """
-    view = [
+    return list(_project_blocks(project_id, project_description, title))
+
+
+@lru_cache(maxsize=PROJECT_CACHE_SIZE)
+def _project_blocks(project_id: str, project_description: str, title: Union[str, None]) -> Tuple:
+    """Builds the blocks of a project. Memoized by the project ID, description and title."""
+    view = (
         {
             "type": "header",
             "text": {
@@ -54,67 +69,75 @@ def project_view(project_id: str, project_description: str, title: Union[str, No
             ],
         },
         {"type": "divider"},
-    ]
+    )
     return view
 
 
 def vip_club_view() -> List:
     """Prepares a block element for the Lab-Rats VIP Club."""
-    view = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": "Lab-Rats VIP",
-                "emoji": True,
-            },
+    return list(_VIP_CLUB_BLOCKS)
+
+
+_VIP_CLUB_BLOCKS = (
+    {
+        "type": "header",
+        "text": {
+            "type": "plain_text",
+            "text": "Lab-Rats VIP",
+            "emoji": True,
         },
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": (
-                    "By default paper_recommender only sends a shared paper to you if it thinks it is relevant to "
-                    "your project. By joining the secretive, exclusive and prestigious *Lab-Rats VIP Club*, "
-                    "you will be sent papers that paper_recommender deemed irrelevant to you, along with its explanations. "
-                    "Additionally, you will gain early access to new and more advanced features as they are "
-                    "added to paper_recommender."
-                ),
-            },
+    },
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": (
+                "By default paper_recommender only sends a shared paper to you if it thinks it is relevant to "
+                "your project. By joining the secretive, exclusive and prestigious *Lab-Rats VIP Club*, "
+                "you will be sent papers that paper_recommender deemed irrelevant to you, along with its explanations. "
+                "Additionally, you will gain early access to new and more advanced features as they are "
+                "added to paper_recommender."
+            ),
         },
-        {
-            "type": "actions",
-            "block_id": "vip_club",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "emoji": True,
-                        "text": "Join :mouse2:",
-                    },
-                    "style": "primary",
-                    "action_id": "join_club",
+    },
+    {
+        "type": "actions",
+        "block_id": "vip_club",
+        "elements": [
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "emoji": True,
+                    "text": "Join :mouse2:",
                 },
-                {
-                    "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "emoji": True,
-                        "text": "Leave :broken_heart:",
-                    },
-                    "style": "danger",
-                    "action_id": "leave_club",
+                "style": "primary",
+                "action_id": "join_club",
+            },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "emoji": True,
+                    "text": "Leave :broken_heart:",
                 },
-            ],
-        },
-    ]
-    return view
+                "style": "danger",
+                "action_id": "leave_club",
+            },
+        ],
+    },
+)
 
 
 def add_project_block(custom_message: str) -> List:
     """Prepares a block element for adding project."""
-    view = [
+    return list(_add_project_blocks(custom_message))
+
+
+@lru_cache(maxsize=PROJECT_CACHE_SIZE)
+def _add_project_blocks(custom_message: str) -> Tuple:
+    """Builds the blocks for adding a project. Memoized by the message."""
+    view = (
         {
             "type": "header",
             "text": {
@@ -146,7 +169,7 @@ def add_project_block(custom_message: str) -> List:
             ],
         },
         {"type": "divider"},
-    ]
+    )
     return view
 
 
@@ -165,13 +188,12 @@ def home_view(projects: List[dict], user_exists: bool) -> dict:
         A dictionary representing a Slack home view.
     """
     if user_exists:
-        projects_blocks = []
+        blocks = []  # type: List[dict]
         for project in projects:
-            projects_blocks += project_view(str(project["project_id"]), project["description"], project["title"])
-        view = {
-            "type": "home",
-            "blocks": projects_blocks + add_project_block("Feel free to add more projects!") + vip_club_view(),
-        }
+            blocks += _project_blocks(str(project["project_id"]), project["description"], project["title"])
+        blocks += _add_project_blocks("Feel free to add more projects!")
+        blocks += _VIP_CLUB_BLOCKS
+        view = {"type": "home", "blocks": blocks}
     else:
-        view = {"type": "home", "blocks": add_project_block("Register by adding a project!")}
+        view = {"type": "home", "blocks": list(_add_project_blocks("Register by adding a project!"))}
     return view
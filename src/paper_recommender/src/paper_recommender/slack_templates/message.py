@@ -1,13 +1,53 @@
 """Defines block templates for Slack messages"""
 
-from typing import List
+from typing import List, Tuple
 
 
-def recommendation_block(custom_message: str) -> List:
+def feedback_block(recommendation_id: str = "") -> dict:
+    """A block template for the feedback buttons of a recommendation.
+
+    Args:
+        recommendation_id: The recommendation ID, stored as the value of the buttons so that the feedback can be
+            recorded when several recommendations are sent in one message. Empty to rely on the message metadata.
+
+    Returns:
+        An object that defines the actions block.
+    """
+    elements = [
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Yes!"},
+            "style": "primary",
+            "action_id": "feedback_positive",
+        },
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Nope..."},
+            "action_id": "feedback_negative",
+        },
+        {
+            "type": "button",
+            "text": {"type": "plain_text", "text": "Additional Feedback"},
+            "action_id": "feedback_explanation",
+        },
+    ]
+    if recommendation_id:
+        for element in elements:
+            element["value"] = recommendation_id
+    return {
+        "type": "actions",
+        # block IDs must be unique within a message
+        "block_id": f"user_feedback_{recommendation_id}" if recommendation_id else "user_feedback",
+        "elements": elements,
+    }
+
+
+def recommendation_block(custom_message: str, recommendation_id: str = "") -> List:
     """A block template for a recommendation message.
 
     Args:
         custom_message: A custom message to be displayed before the recommendation.
+        recommendation_id: The recommendation ID, stored in the feedback buttons. Optional.
 
     Returns:
         A list of objects that define the blocks of the message.
@@ -25,61 +65,82 @@ def recommendation_block(custom_message: str) -> List:
                 "text": "Do you agree with the recommendation decision? Please provide feedback below.",
             },
         },
-        {
-            "type": "actions",
-            "block_id": "user_feedback",
-            "elements": [
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Yes!"},
-                    "style": "primary",
-                    "action_id": "feedback_positive",
-                },
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Nope..."},
-                    "action_id": "feedback_negative",
-                },
-                {
-                    "type": "button",
-                    "text": {"type": "plain_text", "text": "Additional Feedback"},
-                    "action_id": "feedback_explanation",
-                },
-            ],
-        },
+        feedback_block(recommendation_id),
     ]
     return blocks
 
 
-def positive_recommendation_block(user_id: str, url: str, explanation: str) -> List:
+def positive_recommendation_block(user_id: str, url: str, explanation: str, recommendation_id: str = "") -> List:
     """A block template for a positive recommendation message.
 
     Args:
         user_id: The user ID.
         url: The URL of the recommended paper.
         explanation: The explanation of the recommendation decision.
+        recommendation_id: The recommendation ID, stored in the feedback buttons. Optional.
 
     Returns:
         A list of objects that define the blocks of the message.
     """
     blocks = recommendation_block(
         f":spock-hand: Hi there, <@{user_id}>! Here is a paper you might be interested in: {url}\n{explanation}",
+        recommendation_id,
     )
     return blocks
 
 
-def negative_recommendation_block(user_id: str, url: str, explanation: str) -> List:
+def negative_recommendation_block(user_id: str, url: str, explanation: str, recommendation_id: str = "") -> List:
     """A block template for a negative recommendation message.
 
     Args:
         user_id: The user ID. Not used at the moment.
         url: The URL of the recommended paper.
         explanation: The explanation of the recommendation decision.
+        recommendation_id: The recommendation ID, stored in the feedback buttons. Optional.
 
     Returns:
         A list of objects that define the blocks of the message.
     """
     blocks = recommendation_block(
         f"I don't think this paper is relevant to you, but you might disagree: {url}\n{explanation}",
+        recommendation_id,
     )
     return blocks
+
+
+def recommendation_digest_block(user_id: str, recommendations: List[Tuple[bool, str, str, str]]) -> List:
+    """A block template for a message with several recommendations for the same user.
+
+    Slack allows at most 50 blocks in a message, and each recommendation uses 3 blocks, so the caller should send
+    at most 16 recommendations in one message.
+
+    Args:
+        user_id: The user ID.
+        recommendations: A list of (decision, url, explanation, recommendation_id) tuples.
+
+    Returns:
+        A list of objects that define the blocks of the message.
+    """
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": (
+                    f":spock-hand: Hi there, <@{user_id}>! Here are {len(recommendations)} papers shared recently. "
+                    "Do you agree with the recommendation decisions? Please provide feedback below each paper."
+                ),
+            },
+        },
+    ]  # type: List[dict]
+    for decision, url, explanation, recommendation_id in recommendations:
+        if decision:
+            text = f"Here is a paper you might be interested in: {url}\n{explanation}"
+        else:
+            text = f"I don't think this paper is relevant to you, but you might disagree: {url}\n{explanation}"
+        blocks += [
+            {"type": "divider"},
+            {"type": "section", "text": {"type": "mrkdwn", "text": text}},
+            feedback_block(recommendation_id),
+        ]
+    return blocks
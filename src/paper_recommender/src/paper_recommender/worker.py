@@ -0,0 +1,130 @@
+"""Entry point for the worker processes that recommend the papers of queued messages.
+
+When the `job_queue` setting is enabled, the Slack listener only records the URLs of each message as a job in the
+jobs collection. Workers claim the jobs with a lease, process them with recommender.recommend_papers, and record
+their status. A job that fails is retried with exponential backoff, and a job whose worker crashed is claimed again
+once its lease expires. Any number of workers can run at the same time, on the same host or on different hosts.
+
+A job also fails if one of its papers or recommendations could not be recorded in the database. The workers do not
+create the Slack app, and only use the Slack API to send the recommendation messages.
+
+Retries are idempotent: each recommendation record has a unique delivery key made of the channel and timestamp of the
+message, the project and the paper, so a retry only scores, records and sends the pairs that an earlier attempt did
+not record. The messages of a job are sent before it is completed. Delivery is at most once: a message whose record
+was inserted by an attempt that crashed before sending it is not sent again.
+"""
+
+import os
+import time
+import uuid
+import socket
+import logging
+import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Union
+from bson.objectid import ObjectId
+
+from .settings import configs, configure_logging
+from .mangodb import crud as db_crud
+from .mangodb.indexes import ensure_indexes
+from .recommender import db, dm_sender, recommend_papers
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts: int, max_attempts: int, backoff: float) -> Union[datetime.timedelta, None]:
+    """Compute how long to wait before retrying a failed job.
+
+    Args:
+        attempts: The number of times the job has been attempted, including the failed attempt.
+        max_attempts: The maximum number of attempts of a job.
+        backoff: The delay before the first retry, in seconds. It doubles with every attempt.
+
+    Returns:
+        The delay before the next attempt. None if the job should not be retried."""
+    if attempts >= max_attempts:
+        return None
+    return datetime.timedelta(seconds=backoff * 2 ** (attempts - 1))
+
+
+def run_job(job: dict, worker_id: str, max_attempts: int, backoff: float, flush_timeout: Union[float, None] = None):
+    """Process a claimed job, then record its status.
+
+    A job fails if recommend_papers raises, including when a paper or a recommendation could not be recorded. The
+    messages of the job waiting in the DM sender are sent before the job is completed.
+
+    Args:
+        job: The claimed job document.
+        worker_id: The ID of the worker holding the lease of the job.
+        max_attempts: The maximum number of attempts of a job.
+        backoff: The delay before the first retry, in seconds.
+        flush_timeout: The maximum number of seconds to wait for the messages of the job to be sent. None to wait
+            until they are sent.
+    """
+    if job["attempts"] > max_attempts:
+        # the lease of the job has expired too many times, e.g. the job keeps crashing its workers
+        db_crud.fail_job(db, job["_id"], worker_id, "Exceeded the maximum number of attempts.", None)
+        return
+    try:
+        user_ids = recommend_papers(job["message"], job["urls"])
+    except Exception as e:
+        logger.exception("Failed to process job '%s' (attempt %d).", job["_id"], job["attempts"])
+        db_crud.fail_job(db, job["_id"], worker_id, repr(e), retry_delay(job["attempts"], max_attempts, backoff))
+        return
+    # the records of the job are inserted, so a retry would not send its messages: they are sent before completing
+    if not dm_sender.flush(timeout=flush_timeout, user_ids=user_ids):
+        logger.error("The messages of job '%s' were not all sent within %s seconds.", job["_id"], flush_timeout)
+    db_crud.complete_job(db, job["_id"], worker_id)
+
+
+def start_worker():
+    """Entry point to start a worker. Once the package has been installed using pip, a worker can be started by
+    running `paper_recommender_worker` in the terminal.
+
+    The worker requires the same environment variables and configurations as app.start_app, except SLACK_APP_TOKEN.
+    It runs until it is interrupted; the jobs in progress are finished before it stops.
+    """
+    configure_logging()
+    ensure_indexes(db)
+    concurrency = configs.getint("Worker", "concurrency", fallback=4)
+    lease = datetime.timedelta(seconds=configs.getfloat("Worker", "lease_seconds", fallback=300))
+    max_attempts = configs.getint("Worker", "max_attempts", fallback=5)
+    backoff = configs.getfloat("Worker", "retry_backoff_seconds", fallback=30)
+    poll_interval = configs.getfloat("Worker", "poll_interval_seconds", fallback=2)
+    # the messages of a job are sent well within its lease
+    flush_timeout = lease.total_seconds() / 3
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+    running = {}  # type: Dict[Future, ObjectId]
+    last_renewal = time.monotonic()
+    try:
+        while True:
+            for future in [future for future in running if future.done()]:
+                del running[future]
+
+            # renew the leases well before they expire, so that long jobs are not claimed by other workers
+            if time.monotonic() - last_renewal >= lease.total_seconds() / 3:
+                for job_id in running.values():
+                    db_crud.renew_job_lease(db, job_id, worker_id, lease)
+                last_renewal = time.monotonic()
+
+            claimed = False
+            while len(running) < concurrency:
+                job = db_crud.claim_job(db, worker_id, lease)
+                if job is None:
+                    break
+                running[executor.submit(run_job, job, worker_id, max_attempts, backoff, flush_timeout)] = job["_id"]
+                claimed = True
+            if not claimed:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        logger.warning("Worker '%s' is stopping after finishing %d job(s) in progress.", worker_id, len(running))
+    finally:
+        executor.shutdown(wait=True)
+        # send the recommendations still waiting for their coalescing window
+        dm_sender.flush(timeout=configs["App"].getfloat("dm_coalesce_seconds", fallback=5) * 2)
+
+
+if __name__ == "__main__":
+    start_worker()
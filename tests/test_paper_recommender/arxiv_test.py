@@ -0,0 +1,77 @@
+import datetime
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from requests import Response
+from paper_recommender.paper_extraction import response_cache
+from paper_recommender.paper_extraction.arxiv import Arxiv
+from paper_recommender.paper_extraction.response_cache import ResponseCache
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>http://arxiv.org/abs/2301.00001v2</id>
+    <title>First Paper</title>
+    <summary>First abstract.</summary>
+    <author><name>Alice</name></author>
+    <link href="http://arxiv.org/abs/2301.00001v2" rel="alternate" type="text/html"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2301.00002v1</id>
+    <title>Second Paper</title>
+    <summary>Second abstract.</summary>
+    <author><name>Bob</name></author>
+    <author><name>Carol</name></author>
+    <link href="http://arxiv.org/abs/2301.00002v1" rel="alternate" type="text/html"/>
+  </entry>
+</feed>
+"""
+
+
+def feed_response(url, **kwargs):
+    response = Response()
+    response.status_code = 200
+    response._content = FEED
+    return response
+
+
+class TestArxiv(unittest.TestCase):
+    """Unit tests for retrieving many arxiv papers at once, without network access."""
+
+    def test_extract_paper_ids(self):
+        urls = [
+            "https://arxiv.org/abs/2301.00001v2",
+            "https://arxiv.org/pdf/2301.00002.pdf",
+            "https://www.nature.com/articles/s41586-023-06004-9",
+            "https://arxiv.org/abs/2301.00001",
+        ]
+        self.assertEqual(Arxiv.extract_paper_ids(urls), ["2301.00001", "2301.00002"])
+
+    @patch.object(Arxiv, "API_DELAY", 0)
+    @patch("paper_recommender.paper_extraction.arxiv.cached_http_get", side_effect=feed_response)
+    def test_extract_from_ids_uses_one_request(self, mock_get):
+        papers = Arxiv.extract_from_ids(["2301.00001", "2301.00002", "2301.00003"])
+        mock_get.assert_called_once()
+        self.assertIn("id_list=2301.00001,2301.00002,2301.00003", mock_get.call_args[0][0])
+        self.assertEqual(sorted(papers), ["2301.00001", "2301.00002"])
+        self.assertEqual(papers["2301.00002"].authors, ["Bob", "Carol"])
+        self.assertEqual(papers["2301.00001"].abstract, "First abstract.")
+
+    @patch.object(Arxiv, "API_DELAY", 60)
+    @patch("paper_recommender.paper_extraction.arxiv.http_get", side_effect=feed_response)
+    def test_cached_response_does_not_wait(self, mock_get):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory, 10_000, datetime.timedelta(hours=1))
+            with patch.object(response_cache, "_cache", cache), patch.object(Arxiv, "_api_last_request", 0.0):
+                Arxiv.extract_from_ids(["2301.00001", "2301.00002"])
+                start = time.monotonic()
+                papers = Arxiv.extract_from_ids(["2301.00001", "2301.00002"])
+        # the second request is not sent, so it does not wait for the API delay
+        self.assertLess(time.monotonic() - start, 1)
+        mock_get.assert_called_once()
+        self.assertEqual(sorted(papers), ["2301.00001", "2301.00002"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from paper_recommender import async_app
+from paper_recommender.pipeline import MessagePapers
+
+
+def shared_file(**fields):
+    file = {
+        "filetype": "pdf",
+        "user": "U1",
+        "permalink": "https://example.slack.com/files/U1/F1/paper.pdf",
+        "channels": ["C1"],
+        "initial_comment": {"comment": "A paper"},
+    }
+    file.update(fields)
+    return file
+
+
+@patch("paper_recommender.async_app.recommend_resolved_papers", new_callable=AsyncMock)
+@patch("paper_recommender.async_app.log_fetches_saved")
+@patch("paper_recommender.async_app.async_resolve_extracted_paper", new_callable=AsyncMock)
+@patch("paper_recommender.async_app.async_get_project_targets", new_callable=AsyncMock, return_value=[])
+class TestProcessPDF(unittest.TestCase):
+    """Unit tests for the handling of the shared PDF files, using a mocked Slack client and database."""
+
+    def process_pdf(self, file, channel_id="C1"):
+        logger = MagicMock()
+        with patch.object(async_app.app.client, "files_info", new_callable=AsyncMock, return_value={"file": file}):
+            asyncio.run(async_app.process_pdf("F1", channel_id, logger))
+        logger.exception.assert_not_called()
+
+    def test_pdf_shared_in_channel(self, mock_targets, mock_resolve, mock_log, mock_recommend):
+        mock_resolve.return_value = MessagePapers(urls=1, fetches=1)
+        self.process_pdf(shared_file())
+        mock_targets.assert_awaited_once_with(async_app.db)
+        mock_recommend.assert_awaited_once_with([], mock_resolve.return_value)
+
+    def test_dev_comment(self, mock_targets, mock_resolve, mock_log, mock_recommend):
+        mock_resolve.return_value = MessagePapers(urls=1, fetches=1)
+        self.process_pdf(shared_file(initial_comment={"comment": "#dev A paper"}))
+        # only the user who shared the file receives the recommendation
+        mock_targets.assert_awaited_once_with(async_app.db, "U1")
+        mock_recommend.assert_awaited_once()
+
+    def test_ignored_files(self, mock_targets, mock_resolve, mock_log, mock_recommend):
+        for name, file, channel_id in [
+            ("not a pdf", shared_file(filetype="png"), "C1"),
+            ("private channel", shared_file(channels=[], groups=["G1"]), "G1"),
+            ("direct message", shared_file(channels=[], ims=["D1"]), "D1"),
+            ("also shared in a direct message", shared_file(ims=["D1"]), "D1"),
+        ]:
+            with self.subTest(name):
+                self.process_pdf(file, channel_id)
+        mock_targets.assert_not_awaited()
+        mock_resolve.assert_not_awaited()
+        mock_recommend.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from paper_recommender.paper_extraction import citation_meta
+from paper_recommender.paper_extraction.citation_meta import CitationMeta
+from paper_recommender.paper_extraction.registry import ExtractorRegistry
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def streamed_response(content: bytes, content_type: str = "text/html; charset=utf-8") -> MagicMock:
+    response = MagicMock(status_code=200, headers={"Content-Type": content_type}, encoding="utf-8")
+    response.__enter__.return_value = response
+    chunks = [content[i : i + 1024] for i in range(0, len(content), 1024)]
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+
+class TestCitationMeta(unittest.TestCase):
+    """Unit tests for the generic extractor reading the citation meta tags."""
+
+    def test_extract_from_streamed_head(self):
+        content = (FIXTURES / "nature.html").read_bytes()
+        response = streamed_response(content)
+        with patch.object(citation_meta, "http_get", return_value=response) as http_get:
+            paper = CitationMeta.extract_from_url("https://www.example.org/paper")
+        http_get.assert_called_once_with("https://www.example.org/paper", stream=True)
+        self.assertEqual(paper.title, "Scalable Attention for Structured Representation Learning")
+        self.assertEqual(paper.authors, ["Alice Smith", "Bob Jones", "Carol Wang", "Dan Brown"])
+        self.assertTrue(paper.abstract.startswith("Method training approach"))
+        # the body of the page is not downloaded
+        self.assertGreater(len(list(response.iter_content.return_value)), 0)
+
+    def test_preferred_tags_and_markup(self):
+        content = (
+            b"<html><head><meta property='og:title' content='OpenGraph title'>"
+            b"<meta name='citation_title' content='Highwire title'>"
+            b"<meta name='DC.title' content='Dublin Core title'>"
+            b"<meta name='citation_authors' content='Smith, Alice; Jones, Bob'>"
+            b"<meta name='description' content='Short description'>"
+            b"<meta name='citation_abstract' content='&lt;p&gt;The  abstract &amp; more.&lt;/p&gt;'>"
+            b"</head><body></body></html>"
+        )
+        paper = CitationMeta.extract_from_response(
+            "https://www.example.org/paper", MagicMock(content=content, encoding=None)
+        )
+        self.assertEqual(paper.title, "Highwire title")
+        self.assertEqual(paper.authors, ["Smith, Alice", "Jones, Bob"])
+        self.assertEqual(paper.abstract, "The abstract & more.")
+
+    def test_citation_title_is_required(self):
+        # a blog post described by Dublin Core and OpenGraph tags
+        content = (
+            b"<html><head><meta property='og:title' content='A blog post'>"
+            b"<meta name='DC.creator' content='Alice Smith'>"
+            b"<meta property='og:description' content='What we learned this year.'>"
+            b"</head><body></body></html>"
+        )
+        response = MagicMock(content=content, encoding=None)
+        self.assertIsNone(CitationMeta.extract_from_response("https://blog.example.org/post", response))
+
+    def test_not_a_paper(self):
+        content = b"<html><head><meta property='og:title' content='A repository'></head><body></body></html>"
+        with patch.object(citation_meta, "http_get", return_value=streamed_response(content)):
+            self.assertIsNone(CitationMeta.extract_from_url("https://www.example.org/repository"))
+        with patch.object(citation_meta, "http_get", return_value=streamed_response(b"%PDF", "application/pdf")):
+            self.assertIsNone(CitationMeta.extract_from_url("https://www.example.org/paper.pdf"))
+
+    def test_registry_fallback(self):
+        registry = ExtractorRegistry(discover=False)
+        self.assertIsNone(registry.get("https://www.example.org/paper"))
+        registry.set_fallback(f"{citation_meta.__name__}:CitationMeta")
+        self.assertTrue(registry.has_fallback)
+        self.assertIs(registry.get("https://www.example.org/paper"), CitationMeta)
+        registry.set_fallback(None)
+        self.assertIsNone(registry.get("https://www.example.org/paper"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from slack_sdk.errors import SlackApiError
+from paper_recommender import delivery
+from paper_recommender.delivery import DirectMessageSender, Outbox, RecommendationItem, TokenBucket, build_message
+
+
+def item(index, decision=True):
+    return RecommendationItem(decision, f"https://arxiv.org/abs/{index}", "explanation", f"id{index}")
+
+
+class TestDelivery(unittest.TestCase):
+    """Unit tests for the rate limited sender of recommendation messages, using a mocked Slack client."""
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        bucket.pause(5)
+        self.assertGreater(bucket.reserve(), 4.9)
+
+    def test_outbox_coalesces_per_user(self):
+        outbox = Outbox(window=60, max_items=2)
+        outbox.add("U1", item(1))
+        outbox.add("U2", item(2))
+        self.assertEqual(outbox.pop_due(), [])
+        outbox.add("U1", item(3))
+        outbox.add("U1", item(4))
+        # U1 is full, so its message is due before the end of its window
+        self.assertEqual(outbox.pop_due(), [("U1", [item(1), item(3)]), ("U1", [item(4)])])
+        self.assertEqual(outbox.pop_due(everything=True), [("U2", [item(2)])])
+        self.assertIsNone(outbox.next_due())
+
+    def test_build_message(self):
+        single = build_message("U1", [item(1, decision=False)])
+        self.assertEqual(single["metadata"]["event_payload"], {"recommendation_id": "id1"})
+        self.assertEqual(single["blocks"][-1]["elements"][0]["value"], "id1")
+        digest = build_message("U1", [item(1), item(2)])
+        self.assertEqual(digest["metadata"]["event_payload"], {"recommendation_ids": ["id1", "id2"]})
+        self.assertEqual(len(digest["blocks"]), 7)
+
+    def test_sender_retries_after_rate_limit(self):
+        response = MagicMock(status_code=429, headers={"Retry-After": "0.05"})
+        post_message = MagicMock(side_effect=[SlackApiError("ratelimited", response), None])
+        sender = DirectMessageSender(post_message, rate=100, burst=1, window=60)
+        sender.submit("U1", item(1))
+        sender.submit("U1", item(2))
+        start = time.monotonic()
+        self.assertTrue(sender.flush(timeout=5))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(post_message.call_count, 2)
+        self.assertEqual(post_message.call_args.kwargs["channel"], "U1")
+        self.assertEqual(
+            post_message.call_args.kwargs["metadata"]["event_payload"]["recommendation_ids"], ["id1", "id2"]
+        )
+
+    def test_sender_gives_up_on_other_errors(self):
+        response = MagicMock(status_code=200, headers={})
+        post_message = MagicMock(side_effect=SlackApiError("channel_not_found", response))
+        sender = DirectMessageSender(post_message, rate=100, burst=1, window=60)
+        sender.submit("U1", item(1))
+        with patch.object(delivery.logger, "exception"):
+            self.assertTrue(sender.flush(timeout=5))
+        post_message.assert_called_once()
+
+    def test_flush_users(self):
+        post_message = MagicMock()
+        sender = DirectMessageSender(post_message, rate=100, burst=10, window=60)
+        sender.submit("U1", item(1))
+        sender.submit("U2", item(2))
+        self.assertTrue(sender.flush(timeout=5, user_ids={"U1"}))
+        self.assertEqual([call.kwargs["channel"] for call in post_message.call_args_list], ["U1"])
+        # the other users keep waiting for their windows
+        time.sleep(0.05)
+        post_message.assert_called_once()
+        self.assertTrue(sender.flush(timeout=5))
+        self.assertEqual(post_message.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
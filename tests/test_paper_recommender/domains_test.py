@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from paper_recommender.paper_extraction.arxiv import Arxiv
+from paper_recommender.paper_extraction.nature import Nature
+from paper_recommender.paper_extraction.domains import UnknownDomainLog, url_host
+from paper_recommender.paper_extraction import from_url
+from paper_recommender.paper_extraction.from_url import canonical_url, get_extractor, known_domain
+
+
+class TestDomains(unittest.TestCase):
+    """Unit tests for the matching of URLs to paper sources, and the log of unknown domains."""
+
+    def setUp(self):
+        # the settings of the app may have set the citation meta tags extractor as the fallback of unknown domains
+        fallback = patch.object(from_url.registry, "_fallback", None)
+        fallback.start()
+        self.addCleanup(fallback.stop)
+
+    def test_url_host(self):
+        self.assertEqual(url_host("https://user@WWW.Arxiv.org.:443/abs/2301.00001?x=1"), "www.arxiv.org")
+        self.assertEqual(url_host("not a url"), "")
+
+    def test_subdomains_and_mirrors(self):
+        for url in [
+            "https://arxiv.org/pdf/2301.00001",
+            "https://www.arxiv.org/abs/2301.00001",
+            "http://export.arxiv.org/abs/2301.00001",
+            "https://xxx.lanl.gov/abs/2301.00001",
+        ]:
+            self.assertIs(get_extractor(url), Arxiv, url)
+        self.assertIs(get_extractor("https://nature.com/articles/s41586-023-06004-9"), Nature)
+        self.assertIsNone(get_extractor("https://notarxiv.org/abs/2301.00001"))
+        # other subdomains host other content than the papers of the dedicated extractors
+        for url in [
+            "https://blogs.nature.com/news/2023/01/a-post.html",
+            "https://mail.jmlr.org/papers/v24/22-0001.html",
+            "https://2023.ijcai.org/accepted-papers",
+            "https://static.arxiv.org/abs/2301.00001",
+        ]:
+            self.assertIsNone(get_extractor(url), url)
+        self.assertEqual(Arxiv.extract_paper_ids(["https://static.arxiv.org/abs/2301.00001"]), [])
+        self.assertEqual(canonical_url("https://www.arxiv.org/pdf/2301.00001v2"), "arxiv:2301.00001")
+        self.assertEqual(Arxiv.extract_paper_ids(["http://export.arxiv.org/abs/2301.00001"]), ["2301.00001"])
+
+    def test_unknown_domains_are_buffered_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "unknown_domains.txt")
+            with self.assertLogs("paper_recommender.paper_extraction.domains", "WARNING"):
+                self.assertFalse(known_domain("https://example.com/a", file_path))
+                self.assertFalse(known_domain("https://Example.com/b", file_path))
+            self.assertTrue(known_domain("https://arxiv.org/abs/2301.00001", file_path))
+            self.assertFalse(os.path.exists(file_path))
+            from_url._unknown_domain_logs[file_path].flush()
+
+            log = UnknownDomainLog(file_path, flush_interval=60)
+            log.record("example.org", "https://example.org/c")
+            log.flush()
+            with open(file_path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "example.com,https://example.com/a\nexample.org,https://example.org/c\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
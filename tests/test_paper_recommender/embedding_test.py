@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+import configparser
+from unittest.mock import AsyncMock, patch
+import numpy as np
+from paper_recommender.engine.embedding import HASHING_MODEL, embed_texts, cosine_similarity, select_pairs
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.pipeline import ProjectTarget, ResolvedPaper, prefilter_pairs
+from paper_recommender.async_pipeline import async_prefilter_pairs
+
+
+class TestEmbedding(unittest.TestCase):
+    """Unit tests for the embedding pre-filter, using the offline hashing model."""
+
+    def test_hashing_embedding_is_deterministic(self):
+        first = embed_texts(["Graph neural networks for molecules"], HASHING_MODEL)
+        second = embed_texts(["Graph neural networks for molecules"], HASHING_MODEL)
+        np.testing.assert_array_equal(first, second)
+
+    def test_cosine_similarity(self):
+        a = np.array([[1.0, 0.0], [0.0, 0.0]])
+        b = np.array([[2.0, 0.0], [0.0, 3.0]])
+        np.testing.assert_allclose(cosine_similarity(a, b), [[1.0, 0.0], [0.0, 0.0]])
+
+    def test_select_pairs_top_k_and_threshold(self):
+        similarities = np.array([[0.9, 0.1], [0.5, 0.2], [0.1, 0.05]])
+        self.assertEqual(sorted(select_pairs(similarities, top_k=1, threshold=0.4)), [(0, 0), (1, 0), (1, 1)])
+        self.assertEqual(sorted(select_pairs(similarities, top_k=0, threshold=0.4)), [(0, 0), (1, 0)])
+
+    def _prefilter_inputs(self):
+        configs = configparser.ConfigParser()
+        configs.read_dict(
+            {"Engine": {"embedding_model": HASHING_MODEL, "prefilter_top_k": "0", "prefilter_threshold": "0.3"}}
+        )
+        targets = [
+            ProjectTarget("U1", "p1", "reinforcement learning agents for robot control", False),
+            ProjectTarget("U2", "p2", "medieval history of european trade routes", False),
+        ]
+        paper = Paper(
+            "https://arxiv.org/abs/1", "title", ["author"], "robot control with reinforcement learning agents"
+        )
+        papers = [ResolvedPaper("https://arxiv.org/abs/1", paper, "paper1")]
+        return targets, papers, configs
+
+    @patch("paper_recommender.pipeline.db_crud.set_embeddings", return_value=True)
+    @patch("paper_recommender.pipeline.db_crud.get_embeddings", return_value={})
+    def test_prefilter_pairs(self, mock_get, mock_set):
+        targets, papers, configs = self._prefilter_inputs()
+        pairs = prefilter_pairs(None, targets, papers, configs)
+        self.assertEqual([target.user_id for target, _ in pairs], ["U1"])
+        # the missing embeddings are stored for both collections
+        self.assertEqual(mock_set.call_count, 2)
+
+    @patch("paper_recommender.async_pipeline.db_crud.set_embeddings", new_callable=AsyncMock, return_value=True)
+    @patch("paper_recommender.async_pipeline.db_crud.get_embeddings", new_callable=AsyncMock, return_value={})
+    def test_async_prefilter_pairs(self, mock_get, mock_set):
+        targets, papers, configs = self._prefilter_inputs()
+        pairs = asyncio.run(async_prefilter_pairs(None, targets, papers, configs))
+        self.assertEqual([target.user_id for target, _ in pairs], ["U1"])
+        self.assertEqual(mock_set.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
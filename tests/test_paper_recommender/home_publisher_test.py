@@ -0,0 +1,38 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+from paper_recommender.home_publisher import HomePublisher
+
+
+class TestHomePublisher(unittest.TestCase):
+    """Unit tests for the debounced publishing of home views, using a mocked Slack client."""
+
+    def setUp(self):
+        self.state = {"U1": 1}
+        self.publish = MagicMock()
+        self.render = MagicMock(side_effect=lambda user_id: {"type": "home", "blocks": [self.state[user_id]]})
+        self.publisher = HomePublisher(self.publish, self.render, window=0.05)
+
+    def test_burst_is_published_once_with_latest_state(self):
+        for value in range(3):
+            self.state["U1"] = value
+            self.publisher.schedule("U1")
+        time.sleep(0.2)
+        self.render.assert_called_once_with("U1")
+        self.publish.assert_called_once_with(user_id="U1", view={"type": "home", "blocks": [2]})
+
+    def test_unchanged_view_is_skipped(self):
+        self.publisher.schedule("U1")
+        time.sleep(0.2)
+        self.publisher.schedule("U1")
+        time.sleep(0.2)
+        self.assertEqual(self.render.call_count, 2)
+        self.publish.assert_called_once()
+        self.state["U1"] = 2
+        self.publisher.schedule("U1")
+        time.sleep(0.2)
+        self.assertEqual(self.publish.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
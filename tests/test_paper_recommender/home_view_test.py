@@ -0,0 +1,32 @@
+import unittest
+from paper_recommender.slack_templates import home
+
+
+class TestHomeView(unittest.TestCase):
+    """Unit tests for the memoized App Home view templates."""
+
+    def setUp(self):
+        self.projects = [{"project_id": "0123456789ab0123456789ab", "title": None, "description": "description"}]
+
+    def test_home_view(self):
+        view = home.home_view(self.projects, True)
+        self.assertEqual(view["type"], "home")
+        self.assertEqual(view["blocks"][0]["text"]["text"], "Your current project")
+        self.assertEqual(view["blocks"][2]["block_id"], "0123456789ab0123456789ab")
+        self.assertEqual(view["blocks"][-1]["block_id"], "vip_club")
+        self.assertEqual(len(view["blocks"]), 4 + 4 + 3)
+        self.assertEqual(len(home.home_view([], False)["blocks"]), 4)
+
+    def test_project_blocks_are_memoized(self):
+        home._project_blocks.cache_clear()
+        home.home_view(self.projects, True)
+        home.home_view(self.projects, True)
+        self.projects[0]["description"] = "new description"
+        view = home.home_view(self.projects, True)
+        self.assertEqual(view["blocks"][1]["text"]["text"], "new description")
+        self.assertEqual(home._project_blocks.cache_info().hits, 1)
+        self.assertEqual(home._project_blocks.cache_info().misses, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import MagicMock
+from pymongo import ASCENDING, TEXT
+from paper_recommender.mangodb.indexes import INDEXES, ensure_indexes, find_collection_scans
+
+
+def plan(stage, *children):
+    node = {"stage": stage}
+    if len(children) == 1:
+        node["inputStage"] = children[0]
+    elif children:
+        node["inputStages"] = list(children)
+    return node
+
+
+def index_info(index):
+    """The entry of an IndexModel in the output of index_information(), as returned by MongoDB."""
+    options = {k: v for k, v in index.document.items() if k not in ("key", "name")}
+    key = list(index.document["key"].items())
+    if any(direction == TEXT for _, direction in key):
+        options["weights"] = {field: 1 for field, _ in key}
+        key = [("_fts", "text"), ("_ftsx", 1)]
+    return dict(options, key=key, v=2)
+
+
+def fake_db(existing):
+    """A mocked database whose collections create the indexes passed to create_indexes."""
+    collections = {}
+
+    def collection(name):
+        if name not in collections:
+            info = {"_id_": {"key": [("_id", 1)], "v": 2}}
+            info.update(existing.get(name, {}))
+            collections[name] = MagicMock()
+            collections[name].index_information.side_effect = lambda: dict(info)
+            collections[name].create_indexes.side_effect = lambda indexes: info.update(
+                {index.document["name"]: index_info(index) for index in indexes}
+            )
+        return collections[name]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = collection
+    return db, collections
+
+
+class TestIndexes(unittest.TestCase):
+    """Unit tests for the index bootstrap, using a mocked database."""
+
+    def test_ensure_indexes_creates_each_missing_index(self):
+        db, collections = fake_db({})
+        self.assertTrue(ensure_indexes(db))
+        for name, indexes in INDEXES.items():
+            self.assertEqual(collections[name].create_indexes.call_count, len(indexes))
+        # every index exists on the next start up
+        for collection in collections.values():
+            collection.create_indexes.reset_mock()
+        self.assertTrue(ensure_indexes(db))
+        self.assertFalse(any(collection.create_indexes.called for collection in collections.values()))
+
+    def test_ensure_indexes_matches_equivalent_indexes(self):
+        # indexes created by hand, with the names generated by MongoDB
+        db, collections = fake_db(
+            {
+                "papers": {
+                    "title_text_authors_text_abstract_text": {
+                        "key": [("_fts", "text"), ("_ftsx", 1)],
+                        "weights": {"abstract": 1, "authors": 1, "title": 1},
+                    },
+                    "url_1_title_1_authors_1": {
+                        "key": [("url", ASCENDING), ("title", ASCENDING), ("authors", ASCENDING)],
+                        "unique": True,
+                    },
+                }
+            }
+        )
+        self.assertTrue(ensure_indexes(db))
+        created = [
+            index.document["name"]
+            for call in collections["papers"].create_indexes.call_args_list
+            for index in call.args[0]
+        ]
+        self.assertEqual(created, ["canonical_urls_unique"])
+
+    def test_ensure_indexes_reports_conflicting_index(self):
+        # same keys as paper_unique, but not unique: paper_unique cannot be created
+        db, collections = fake_db(
+            {"papers": {"url_1_title_1_authors_1": {"key": [("url", 1), ("title", 1), ("authors", 1)]}}}
+        )
+        self.assertFalse(ensure_indexes(db))
+
+    def test_ensure_indexes_reports_failed_index(self):
+        db, collections = fake_db({})
+        db["jobs"].create_indexes.side_effect = Exception("Index build failed")
+        self.assertFalse(ensure_indexes(db))
+        # the other collections are not affected
+        self.assertEqual(collections["papers"].create_indexes.call_count, len(INDEXES["papers"]))
+
+    def test_find_collection_scans(self):
+        collections = {}
+
+        def collection(name):
+            if name not in collections:
+                collections[name] = MagicMock()
+                winning_plan = plan("FETCH", plan("IXSCAN"))
+                if name == "projects":
+                    winning_plan = plan("SUBPLAN", plan("OR", plan("IXSCAN"), plan("COLLSCAN")))
+                cursor = collections[name].find.return_value
+                cursor.sort.return_value = cursor
+                cursor.explain.return_value = {"queryPlanner": {"winningPlan": winning_plan}}
+            return collections[name]
+
+        db = MagicMock()
+        db.__getitem__.side_effect = collection
+        scans = find_collection_scans(db)
+        self.assertEqual(len(scans), 1)
+        self.assertTrue(scans[0].startswith("projects:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
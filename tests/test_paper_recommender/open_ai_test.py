@@ -0,0 +1,96 @@
+import json
+import unittest
+from unittest.mock import patch
+from paper_recommender.engine import open_ai
+from paper_recommender.engine.base import RecommendationOutput
+from paper_recommender.engine.open_ai import (
+    _parse_batch_output,
+    _parse_single_call_output,
+    batch_projects,
+    estimate_tokens,
+)
+
+
+class TestSingleCallMode(unittest.TestCase):
+    """Unit tests for the parsing of the single call responses."""
+
+    def test_parse_single_call_output(self):
+        content = json.dumps({"decision": " Yes. ", "explanation": "Relevant.", "confidence": "high"})
+        self.assertEqual(_parse_single_call_output(content), RecommendationOutput(True, "Relevant."))
+        content = json.dumps({"decision": "NO", "explanation": "Unrelated."})
+        self.assertEqual(_parse_single_call_output(content), RecommendationOutput(False, "Unrelated."))
+
+    def test_parse_single_call_output_malformed(self):
+        for content in [
+            None,
+            "Yes",
+            "{not json",
+            json.dumps({"decision": "Yes"}),
+            json.dumps({"explanation": "Missing decision."}),
+            json.dumps({"decision": True, "explanation": "Not a string."}),
+            json.dumps({"decision": "Yes", "explanation": None}),
+        ]:
+            with self.assertRaises(Exception, msg=content):
+                _parse_single_call_output(content)
+
+    def test_malformed_output_returns_none(self):
+        configs = {"Engine": {"model": "model"}}
+        with patch.object(open_ai.client.chat.completions, "create") as create, patch.object(
+            open_ai.logger, "exception"
+        ):
+            create.return_value.choices[0].message.content = json.dumps({"decision": "Yes"})
+            self.assertIsNone(open_ai.paper_recommendation_single_call("description", "abstract", configs))
+
+
+class TestBatchMode(unittest.TestCase):
+    """Unit tests for the batching of projects and the parsing of the batch responses."""
+
+    def test_parse_batch_output(self):
+        content = json.dumps(
+            {
+                "recommendations": [
+                    {"project": 2, "decision": "No.", "explanation": "Unrelated."},
+                    {"project": "1", "decision": "yes", "explanation": "Relevant."},
+                ]
+            }
+        )
+        self.assertEqual(
+            _parse_batch_output(content, 2),
+            [RecommendationOutput(True, "Relevant."), RecommendationOutput(False, "Unrelated.")],
+        )
+
+    def test_parse_batch_output_missing_and_malformed(self):
+        content = json.dumps(
+            {
+                "recommendations": [
+                    {"project": 1, "decision": "Yes", "explanation": "Relevant."},
+                    # out of range and extra project numbers are ignored
+                    {"project": 0, "decision": "Yes", "explanation": "Out of range."},
+                    {"project": 4, "decision": "Yes", "explanation": "Extra project."},
+                    # malformed recommendations are ignored
+                    {"project": 2, "decision": True, "explanation": "Not a string."},
+                    {"project": "two", "decision": "Yes", "explanation": "Not a number."},
+                    {"decision": "Yes", "explanation": "Missing project."},
+                ]
+            }
+        )
+        with patch.object(open_ai.logger, "warning"):
+            self.assertEqual(_parse_batch_output(content, 3), [RecommendationOutput(True, "Relevant."), None, None])
+        for content in [None, "not json", json.dumps({"answers": []})]:
+            with self.assertRaises(Exception):
+                _parse_batch_output(content, 3)
+
+    def test_batch_projects_within_size_and_budget(self):
+        abstract = "a" * 400
+        base = open_ai.BATCH_PROMPT_OVERHEAD_TOKENS + estimate_tokens(abstract)
+        per_project = estimate_tokens("d" * 40) + open_ai.BATCH_ANSWER_TOKENS_PER_PROJECT
+        descriptions = ["d" * 40] * 5
+        self.assertEqual(batch_projects(descriptions, abstract, 2, 10**6), [[0, 1], [2, 3], [4]])
+        self.assertEqual(batch_projects(descriptions, abstract, 10, base + 3 * per_project), [[0, 1, 2], [3, 4]])
+        # a project over the budget on its own is sent in a batch of its own
+        self.assertEqual(batch_projects(["d" * 4000, "d" * 40], abstract, 10, base + per_project), [[0], [1]])
+        self.assertEqual(batch_projects([], abstract, 10, 10**6), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
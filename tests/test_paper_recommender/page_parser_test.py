@@ -0,0 +1,55 @@
+import unittest
+from pathlib import Path
+from bs4 import BeautifulSoup
+from requests import Response
+from paper_recommender.paper_extraction.aaai import AAAI
+from paper_recommender.paper_extraction.acl_anthology import ACLAnthology
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.paper_extraction.ijcai import IJCAI
+from paper_recommender.paper_extraction.jmlr import JMLR
+from paper_recommender.paper_extraction.nature import Nature
+from paper_recommender.paper_extraction.neurips import NeurIPS
+from paper_recommender.paper_extraction.pmlr import PMLR
+
+FIXTURES = Path(__file__).parent / "fixtures"
+EXTRACTORS = {
+    "nature": Nature,
+    "pmlr": PMLR,
+    "jmlr": JMLR,
+    "ijcai": IJCAI,
+    "aaai": AAAI,
+    "neurips": NeurIPS,
+    "acl_anthology": ACLAnthology,
+}
+
+
+def page_response(name):
+    response = Response()
+    response.status_code = 200
+    response._content = (FIXTURES / f"{name}.html").read_bytes()
+    return response
+
+
+class TestPageParser(unittest.TestCase):
+    """Unit tests for the fast parsing of the scraping extractors, using the saved fixture pages."""
+
+    def test_same_papers_as_full_html_parser_tree(self):
+        for name, extractor in EXTRACTORS.items():
+            with self.subTest(extractor=name):
+                response = page_response(name)
+                paper = extractor.extract_from_response("https://example.org", response)
+                # the extraction before the fast parser: a full tree built by html.parser
+                soup = BeautifulSoup(response.content, "html.parser")
+                expected = Paper(
+                    url="https://example.org",
+                    title=extractor._extract_title(soup),
+                    authors=extractor._extract_authors(soup),
+                    abstract=extractor._extract_abstract(soup),
+                )
+                self.assertEqual(paper, expected)
+                self.assertEqual(len(paper.authors), 4)  # type: ignore
+                self.assertTrue(paper.abstract.endswith("."))  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
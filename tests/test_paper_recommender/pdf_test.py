@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from paper_recommender.paper_extraction import pdf
+from paper_recommender.paper_extraction.pdf import (
+    download_pdf,
+    extract_from_pdf,
+    extract_from_slack_file,
+    shared_in_channel,
+)
+
+LINES = [
+    "arXiv:2401.00001v1 [cs.LG] 1 Jan 2024",
+    "Scalable Attention for Structured Representation Learning",
+    "Alice Smith1, Bob Jones2* and Carol Wang1",
+    "1University of Auckland 2Example Lab",
+    "Abstract",
+    "We propose a scalable attention mechanism for structured data.",
+    "It outperforms previous methods on three benchmarks.",
+    "1 Introduction",
+    "Attention is widely used.",
+]
+
+
+def make_pdf(lines, pages=1, info=None) -> bytes:
+    """Build a minimal PDF file with the lines of text on its first page."""
+    text = "BT /F1 10 Tf 14 TL 50 750 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", ""]
+    kids = []
+    for page in range(pages):
+        stream = text if page == 0 else "BT /F1 10 Tf 50 750 Td (Next page) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        kids.append(len(objects) + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+            "/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>"
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {pages} >>"
+    if info:
+        objects.append("<< " + " ".join(f"/{key} ({value})" for key, value in info.items()) + " >>")
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    trailer = f"/Size {len(objects) + 1} /Root 1 0 R" + (f" /Info {len(objects)} 0 R" if info else "")
+    content += f"trailer\n<< {trailer} >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return content
+
+
+class TestPDF(unittest.TestCase):
+    """Unit tests for the extraction of papers from the PDF files shared in Slack."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def write(self, content: bytes):
+        with open(self.path, "wb") as f:
+            f.write(content)
+
+    def test_extract_from_first_page(self):
+        self.write(make_pdf(LINES, pages=3))
+        paper = extract_from_pdf(self.path, "https://example.slack.com/files/U1/F1/paper.pdf", max_pages=1)
+        self.assertEqual(paper.title, "Scalable Attention for Structured Representation Learning")
+        self.assertEqual(paper.authors, ["Alice Smith", "Bob Jones", "Carol Wang"])
+        self.assertEqual(
+            paper.abstract,
+            "We propose a scalable attention mechanism for structured data. "
+            "It outperforms previous methods on three benchmarks.",
+        )
+
+    def test_document_information_takes_precedence(self):
+        self.write(make_pdf(LINES, info={"Title": "The Title of the Metadata", "Author": "Dan Brown; Eve Green"}))
+        paper = extract_from_pdf(self.path, "https://example.slack.com/files/U1/F1/paper.pdf")
+        self.assertEqual(paper.title, "The Title of the Metadata")
+        self.assertEqual(paper.authors, ["Dan Brown", "Eve Green"])
+        self.write(make_pdf(LINES[:4]))
+        with patch.object(pdf.logger, "warning"):
+            self.assertIsNone(extract_from_pdf(self.path, "https://example.slack.com/files/U1/F1/paper.pdf"))
+
+    def test_download_is_capped(self):
+        content = make_pdf(LINES)
+        response = MagicMock(status_code=200, headers={})
+        response.__enter__.return_value = response
+        response.iter_content.side_effect = lambda size: iter([content[:100], content[100:]])
+        with patch.object(pdf, "http_get", return_value=response) as http_get:
+            path = download_pdf("https://files.slack.com/paper.pdf", "xoxb-token", max_bytes=len(content))
+            with patch.object(pdf.logger, "warning"):
+                self.assertIsNone(download_pdf("https://files.slack.com/paper.pdf", "xoxb-token", max_bytes=200))
+        self.addCleanup(os.remove, path)
+        self.assertEqual(http_get.call_args.kwargs["headers"], {"Authorization": "Bearer xoxb-token"})
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_large_files_are_not_downloaded(self):
+        file = {"filetype": "pdf", "size": 10**9, "permalink": "https://example.slack.com/files/U1/F1/paper.pdf"}
+        with patch.object(pdf, "http_get") as http_get, patch.object(pdf.logger, "warning"):
+            self.assertIsNone(extract_from_slack_file(file, "xoxb-token", max_bytes=1024))
+            self.assertIsNone(extract_from_slack_file({"filetype": "png"}, "xoxb-token"))
+        http_get.assert_not_called()
+
+    def test_shared_in_channel(self):
+        file = {"channels": ["C1"], "groups": ["G1"], "ims": ["D1"]}
+        self.assertTrue(shared_in_channel(file))
+        self.assertTrue(shared_in_channel(file, "C1"))
+        # private channels and direct messages
+        self.assertFalse(shared_in_channel(file, "G1"))
+        self.assertFalse(shared_in_channel(file, "D1"))
+        self.assertFalse(shared_in_channel({"channels": [], "groups": ["G1"]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+import asyncio
+import configparser
+import datetime
+import itertools
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from paper_recommender.engine.base import RecommendationOutput
+from paper_recommender.mangodb import crud
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.pipeline import (
+    ProjectTarget,
+    ResolvedPaper,
+    RecommendationBuffer,
+    all_pairs,
+    delivery_key,
+    fan_out_batch_recommendations,
+    fan_out_recommendations,
+    message_source,
+    recommendation_record,
+    skip_recorded_pairs,
+)
+from paper_recommender.async_pipeline import async_fan_out_batch_recommendations
+
+
+class TestRecommendationRecords(unittest.TestCase):
+    """Unit tests for the bulk insertion of recommendation records, using a mocked database."""
+
+    def test_insert_recommendations_returns_ids(self):
+        db = MagicMock()
+        ids = crud.insert_recommendations(db, [{"user_id": "U1"}, {"user_id": "U2"}])
+        self.assertEqual(len(ids), 2)
+        self.assertTrue(all(isinstance(recommendation_id, ObjectId) for recommendation_id in ids))
+        db.recommendations.insert_many.assert_called_once()
+        self.assertFalse(db.recommendations.insert_many.call_args.kwargs["ordered"])
+
+    def test_insert_recommendations_partial_failure(self):
+        db = MagicMock()
+        db.recommendations.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 1}]})
+        ids = crud.insert_recommendations(db, [{"user_id": "U1"}, {"user_id": "U2"}, {"user_id": "U3"}])
+        self.assertIsInstance(ids[0], ObjectId)
+        self.assertFalse(ids[1])
+        self.assertIsInstance(ids[2], ObjectId)
+
+    def test_insert_recommendations_already_recorded(self):
+        db = MagicMock()
+        db.recommendations.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": crud.DUPLICATE_KEY_ERROR}, {"index": 1, "code": 2}]}
+        )
+        ids = crud.insert_recommendations(db, [{"user_id": "U1"}, {"user_id": "U2"}])
+        # a recommendation recorded by an earlier attempt is not a failure, but it is not sent again
+        self.assertIsNone(ids[0])
+        self.assertIs(ids[1], False)
+        self.assertEqual(ids.count(False), 1)
+
+    def test_buffer_flushes_by_size_and_age(self):
+        target = ProjectTarget("U1", ObjectId(), "description", False)
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        recommendation = RecommendationOutput(decision=True, explanation="explanation")
+        buffer = RecommendationBuffer(batch_size=2, flush_interval=60)
+        buffer.add(target, paper, recommendation)
+        self.assertFalse(buffer.ready())
+        buffer.add(target, paper, recommendation)
+        self.assertTrue(buffer.ready())
+        self.assertEqual(len(buffer.take()), 2)
+        self.assertEqual(len(buffer), 0)
+
+        with patch("paper_recommender.pipeline.time.monotonic", side_effect=[0.0, 61.0]):
+            buffer.add(target, paper, recommendation)
+            self.assertTrue(buffer.ready())
+
+    def test_buffer_time_left(self):
+        target = ProjectTarget("U1", ObjectId(), "description", False)
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        buffer = RecommendationBuffer(batch_size=2, flush_interval=60)
+        self.assertIsNone(buffer.time_left())
+        with patch("paper_recommender.pipeline.time.monotonic", side_effect=[0.0, 45.0, 90.0]):
+            buffer.add(target, paper, RecommendationOutput(decision=True, explanation="explanation"))
+            self.assertEqual(buffer.time_left(), 15.0)
+            self.assertEqual(buffer.time_left(), 0.0)
+
+    def test_record_references_texts(self):
+        target = ProjectTarget("U1", ObjectId(), "description", False)
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        record = recommendation_record(target, paper, RecommendationOutput(decision=True, explanation="explanation"))
+        self.assertNotIn("project_description", record)
+        self.assertNotIn("paper_abstract", record)
+        self.assertEqual(record["content_hash"], crud.recommendation_content_hash("description", "abstract"))
+        self.assertNotEqual(crud.recommendation_content_hash("ab", "c"), crud.recommendation_content_hash("a", "bc"))
+        self.assertNotIn("delivery_key", record)
+
+    def test_records_of_a_message_have_delivery_keys(self):
+        target = ProjectTarget("U1", ObjectId(), "description", False)
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        source = message_source({"channel": "C1", "ts": "1700000000.000100", "text": "a paper"})
+        buffer = RecommendationBuffer(batch_size=2, flush_interval=60, source=source)
+        buffer.add(target, paper, RecommendationOutput(decision=True, explanation="explanation"))
+        record = buffer.take()[0].record
+        self.assertEqual(record["delivery_key"], f"C1:1700000000.000100:{target.project_id}:{paper.paper_id}")
+        self.assertIsNone(message_source({"text": "a paper"}))
+
+    def test_skip_recorded_pairs(self):
+        targets = [ProjectTarget(f"U{i}", ObjectId(), "description", False) for i in range(3)]
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        pairs = all_pairs(targets, [paper])
+        recorded = {delivery_key("C1:1.0", targets[1], paper)}
+        with patch.object(crud, "find_recorded_delivery_keys", return_value=recorded) as mock_find:
+            self.assertEqual(skip_recorded_pairs(MagicMock(), pairs, "C1:1.0"), [pairs[0], pairs[2]])
+        self.assertEqual(len(mock_find.call_args.args[1]), 3)
+        # all the pairs are kept if the lookup fails, since the unique index still prevents duplicates
+        with patch.object(crud, "find_recorded_delivery_keys", return_value=False):
+            self.assertEqual(skip_recorded_pairs(MagicMock(), pairs, "C1:1.0"), pairs)
+
+
+class TestFanOut(unittest.TestCase):
+    """Unit tests for the fan-out of the papers of a message to the projects."""
+
+    def setUp(self):
+        self.targets = [ProjectTarget(f"U{i}", ObjectId(), f"description {i}", False) for i in range(3)]
+        paper = Paper("https://arxiv.org/abs/2301.00001", "title", ["author"], "abstract")
+        paper_id = ObjectId()
+        # the same paper linked twice in a message, by its abstract page and its PDF
+        self.papers = [
+            ResolvedPaper("https://arxiv.org/abs/2301.00001", paper, paper_id),
+            ResolvedPaper("https://arxiv.org/pdf/2301.00001", paper, paper_id),
+        ]
+        self.configs = configparser.ConfigParser()
+        self.configs.read_dict({"Engine": {"batch_size": "10", "batch_token_budget": "12000"}})
+
+    def test_batches_score_each_project_once_per_paper(self):
+        batches = []
+
+        def score_batch(targets, resolved_paper):
+            batches.append(targets)
+            return [RecommendationOutput(True, "explanation")] * len(targets)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(
+                fan_out_batch_recommendations(executor, all_pairs(self.targets, self.papers), score_batch, self.configs)
+            )
+        self.assertEqual(batches, [self.targets])
+        self.assertEqual([target for target, _, _ in results], self.targets)
+        self.assertTrue(all(resolved_paper is self.papers[0] for _, resolved_paper, _ in results))
+
+    def test_pairs_score_each_project_once_per_paper(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(
+                fan_out_recommendations(
+                    executor,
+                    all_pairs(self.targets, self.papers),
+                    lambda target, resolved_paper: RecommendationOutput(True, "explanation"),
+                )
+            )
+        self.assertCountEqual([target.user_id for target, _, _ in results], ["U0", "U1", "U2"])
+
+    def test_yields_none_when_no_result_arrives_in_time(self):
+        # the first project is scored at once, the others wait until the caller has seen a timeout
+        timed_out = threading.Event()
+
+        def score(target, resolved_paper):
+            if target.user_id != "U0":
+                timed_out.wait(5)
+            return RecommendationOutput(True, "explanation")
+
+        results = []
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for result in fan_out_recommendations(
+                executor, all_pairs(self.targets, self.papers[:1]), score, flush_timeout=lambda: 0.05
+            ):
+                if result is None:
+                    timed_out.set()
+                results.append(result and result[0].user_id)
+        self.assertEqual(results[0], "U0")
+        self.assertIsNone(results[1])
+        self.assertCountEqual(results[2:], ["U1", "U2"])
+
+    def test_async_yields_none_when_no_result_arrives_in_time(self):
+        async def run():
+            timed_out = asyncio.Event()
+
+            async def score_batch(targets, resolved_paper):
+                if targets[0].user_id != "U0":
+                    await timed_out.wait()
+                return [RecommendationOutput(True, "explanation")] * len(targets)
+
+            results = []
+            async for result in async_fan_out_batch_recommendations(
+                asyncio.Semaphore(3),
+                all_pairs(self.targets, self.papers[:1]),
+                score_batch,
+                batch_size=1,
+                token_budget=12000,
+                flush_timeout=lambda: 0.05,
+            ):
+                if result is None:
+                    timed_out.set()
+                results.append(result and result[0].user_id)
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(results[0], "U0")
+        self.assertIsNone(results[1])
+        self.assertCountEqual(results[2:], ["U1", "U2"])
+
+
+class TestRecommendationCache(unittest.TestCase):
+    """Unit tests for the recommendation cache, using a mocked database."""
+
+    def test_size_is_checked_periodically(self):
+        db = MagicMock()
+        db.recommendation_cache.estimated_document_count.return_value = 12
+        db.recommendation_cache.find.return_value = [{"_id": 1}, {"_id": 2}]
+        key = crud.recommendation_cache_key("description", ObjectId(), "model")
+        recommendation = RecommendationOutput(decision=True, explanation="explanation")
+        with patch.object(crud, "_cache_writes", itertools.count()):
+            for _ in range(5):
+                self.assertTrue(
+                    crud.cache_recommendation(
+                        db, key, recommendation, datetime.timedelta(days=1), max_entries=10, eviction_interval=4
+                    )
+                )
+        self.assertEqual(db.recommendation_cache.replace_one.call_count, 5)
+        # the first and the fifth writes check the size of the cache
+        self.assertEqual(db.recommendation_cache.estimated_document_count.call_count, 2)
+        self.assertEqual(db.recommendation_cache.find.call_args.kwargs["limit"], 2)
+        self.assertEqual(db.recommendation_cache.delete_many.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+from paper_recommender.paper_extraction import registry as registry_module
+from paper_recommender.paper_extraction.base import PaperExtractionBase
+from paper_recommender.paper_extraction.registry import BUILTIN_EXTRACTORS, ExtractorRegistry
+
+
+class Example(PaperExtractionBase):
+    DOMAIN = "www.example.org"
+
+    @staticmethod
+    def extract_from_url(url):
+        return None
+
+
+class TestExtractorRegistry(unittest.TestCase):
+    """Unit tests for the registry of paper extractors."""
+
+    def test_builtin_domains_match_the_extractors(self):
+        registry = ExtractorRegistry(BUILTIN_EXTRACTORS, discover=False)
+        for domain in BUILTIN_EXTRACTORS:
+            self.assertEqual(registry.load(domain).DOMAIN, domain)
+
+    def test_extractors_are_imported_on_first_use(self):
+        code = (
+            "import sys\n"
+            "from paper_recommender.paper_extraction import from_url\n"
+            "assert from_url.known_domain('https://www.nature.com/articles/x', '/dev/null')\n"
+            "assert 'paper_recommender.paper_extraction.nature' not in sys.modules\n"
+            "assert from_url.get_extractor('https://www.nature.com/articles/x').DOMAIN == 'www.nature.com'\n"
+            "assert 'paper_recommender.paper_extraction.nature' in sys.modules\n"
+            "assert 'paper_recommender.paper_extraction.arxiv' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_register_other_extractors(self):
+        registry = ExtractorRegistry(discover=False)
+        registry.register("www.example.org", f"{__name__}:Example", mirrors=["example.net"])
+        self.assertIs(registry.get("https://example.org/paper"), Example)
+        self.assertIs(registry.get("https://example.net/paper"), Example)
+        # only the exact mirror hosts are matched
+        self.assertIsNone(registry.get("https://papers.example.net/paper"))
+        self.assertIsNone(registry.get("https://example.com/paper"))
+        registry.register("www.example.com", "missing_module:Missing")
+        with patch.object(registry_module.logger, "exception"):
+            self.assertIsNone(registry.get("https://www.example.com/paper"))
+
+
+if __name__ == "__main__":
+    unittest.main()
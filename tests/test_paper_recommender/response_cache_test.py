@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from paper_recommender.paper_extraction import response_cache
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.paper_extraction.http_session import async_cached_http_get
+from paper_recommender.paper_extraction.response_cache import ResponseCache
+
+PAPER = Paper(url="https://example.org/paper", title="Title", authors=["Alice Smith"], abstract="Abstract.")
+
+
+def page_response(content=b"<html></html>"):
+    return MagicMock(status_code=200, headers={"Content-Type": "text/html"}, content=content)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Unit tests for the on-disk cache of responses and papers, in a temporary directory."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def cache(self, max_bytes=10_000, ttl=60):
+        return ResponseCache(self.directory.name, max_bytes, datetime.timedelta(seconds=ttl))
+
+    def test_fresh_response_is_not_requested(self):
+        cache = self.cache()
+        http_get = MagicMock(return_value=page_response())
+        cache.get(PAPER.url, http_get)
+        self.assertEqual(cache.get(PAPER.url, http_get).content, b"<html></html>")
+        http_get.assert_called_once()
+
+    def test_paper_does_not_renew_the_page(self):
+        cache = self.cache()
+        http_get = MagicMock(return_value=page_response())
+        cache.get(PAPER.url, http_get)
+        # the page becomes stale, then a paper is extracted from it
+        with patch("time.time", return_value=time.time() - 120):
+            cache.get("https://example.org/other", http_get)
+            cache.set_paper("https://example.org/other", PAPER)
+        cache.set_paper(PAPER.url, PAPER)
+        self.assertEqual(cache.get_paper(PAPER.url), PAPER)
+        self.assertIsNone(cache.get_paper("https://example.org/other"))
+        # the page is revalidated even though its paper is fresh
+        with patch("time.time", return_value=time.time() + 120):
+            cache.get(PAPER.url, http_get)
+        self.assertEqual(http_get.call_count, 3)
+        self.assertEqual(cache.get_paper(PAPER.url), None)
+
+    def test_evict_with_shared_directory(self):
+        # two processes sharing the directory, each counting only its own writes
+        cache, other = self.cache(max_bytes=3000), self.cache(max_bytes=100_000)
+        for i in range(5):
+            other.get(f"https://example.org/{i}", MagicMock(return_value=page_response(b"x" * 500)))
+            # the last access times, oldest first
+            os.utime(other._paths(f"https://example.org/{i}")[0], (1000 + i, 1000 + i))
+        # an entry removed by the other process meanwhile is skipped
+        os.remove(other._paths("https://example.org/0")[0])
+        cache.evict()
+        _, size = cache._scan()
+        self.assertEqual(cache._size, size)
+        self.assertLessEqual(size, 2700)
+        self.assertIsNotNone(cache._read("https://example.org/4"))
+
+    def test_async_requests_use_the_cache(self):
+        cache = self.cache(ttl=60)
+        send = AsyncMock(return_value=MagicMock(status_code=200, headers={"ETag": '"v1"'}, content=b"page"))
+        with patch.object(response_cache, "_cache", cache):
+            asyncio.run(async_cached_http_get(PAPER.url, send=send))
+            self.assertEqual(asyncio.run(async_cached_http_get(PAPER.url, send=send)).content, b"page")
+            send.assert_awaited_once()
+            # a stale response is revalidated, and reused on 304 Not Modified
+            send.return_value = MagicMock(status_code=304, headers={}, content=b"")
+            with patch("time.time", return_value=time.time() + 120):
+                response = asyncio.run(async_cached_http_get(PAPER.url, send=send))
+        self.assertEqual(send.await_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        self.assertEqual(response.content, b"page")
+
+
+if __name__ == "__main__":
+    unittest.main()
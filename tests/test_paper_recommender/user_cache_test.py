@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock
+from paper_recommender.mangodb import crud
+
+
+class TestUserCache(unittest.TestCase):
+    """Unit tests for the cached projects of users, using a mocked database."""
+
+    def setUp(self):
+        crud._user_cache.clear()
+        self.db = MagicMock()
+        self.db.users.find_one.return_value = {"_id": "U1", "projects": [{"title": "t"}]}
+
+    def test_single_projected_query(self):
+        self.assertEqual(crud.get_user_projects(self.db, "U1"), ([{"title": "t"}], True))
+        self.assertTrue(crud.user_exists(self.db, "U1"))
+        self.assertEqual(crud.get_projects_for_user(self.db, "U1"), [{"title": "t"}])
+        self.db.users.find_one.assert_called_once_with({"_id": "U1"}, projection={"projects": 1})
+
+    def test_missing_user(self):
+        self.db.users.find_one.return_value = None
+        self.assertEqual(crud.get_user_projects(self.db, "U2"), ([], False))
+        self.assertFalse(crud.get_projects_for_user(self.db, "U2"))
+
+    def test_modifications_invalidate_the_cache(self):
+        crud.get_user_projects(self.db, "U1")
+        crud.add_project(self.db, "U1", "title", "description")
+        crud.get_user_projects(self.db, "U1")
+        crud.update_user_vip_status(self.db, "U1", True)
+        crud.get_user_projects(self.db, "U1")
+        crud.delete_project(self.db, "U1", "0123456789ab0123456789ab")
+        crud.get_user_projects(self.db, "U1")
+        self.assertEqual(self.db.users.find_one.call_count, 4)
+
+    def test_cached_projects_are_copies(self):
+        projects, _ = crud.get_user_projects(self.db, "U1")
+        projects[0]["title"] = "changed"
+        projects.append({"title": "new"})
+        self.assertEqual(crud.get_user_projects(self.db, "U1"), ([{"title": "t"}], True))
+        self.db.users.find_one.assert_called_once()
+
+    def test_outdated_read_is_not_cached(self):
+        generation = crud.user_cache_generation()
+        crud.invalidate_user_cache("U3")
+        crud.cache_user("U1", [], True, generation)
+        self.assertIsNone(crud.get_cached_user("U1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from bson.objectid import ObjectId
+from paper_recommender import recommender, worker
+from paper_recommender.paper_extraction.base import Paper
+from paper_recommender.pipeline import MessagePapers, ProjectTarget, ResolvedPaper, delivery_key
+
+
+class TestRunJob(unittest.TestCase):
+    """Unit tests for the processing of queued messages, using a mocked database."""
+
+    @patch("paper_recommender.recommender.recommend_resolved_papers", return_value=0)
+    @patch("paper_recommender.recommender.log_fetches_saved")
+    @patch("paper_recommender.recommender.resolve_papers", return_value=MessagePapers(urls=1, fetches=1, db_errors=1))
+    @patch("paper_recommender.recommender.get_project_targets", return_value=[])
+    def test_recommend_papers_raises_on_unrecorded_paper(self, mock_targets, mock_resolve, mock_log, mock_recommend):
+        with self.assertRaises(RuntimeError):
+            recommender.recommend_papers({"text": "a paper", "user": "U1"}, ["https://arxiv.org/abs/1"])
+
+    @patch("paper_recommender.recommender.recommend_resolved_papers", return_value=2)
+    @patch("paper_recommender.recommender.log_fetches_saved")
+    @patch("paper_recommender.recommender.resolve_papers", return_value=MessagePapers(urls=1, known=1))
+    @patch("paper_recommender.recommender.get_project_targets", return_value=[])
+    def test_recommend_papers_raises_on_unrecorded_recommendations(
+        self, mock_targets, mock_resolve, mock_log, mock_recommend
+    ):
+        with self.assertRaises(RuntimeError):
+            recommender.recommend_papers({"text": "a paper", "user": "U1"}, ["https://arxiv.org/abs/1"])
+
+    @patch("paper_recommender.worker.db_crud")
+    @patch("paper_recommender.worker.recommend_papers", side_effect=RuntimeError("Failed to record 1 paper(s)."))
+    def test_failed_job_is_retried(self, mock_recommend, mock_crud):
+        worker.run_job({"_id": "job1", "attempts": 1, "message": {}, "urls": []}, "worker1", 5, 30)
+        mock_crud.complete_job.assert_not_called()
+        mock_crud.fail_job.assert_called_once()
+        # the first retry waits for the backoff
+        self.assertEqual(mock_crud.fail_job.call_args.args[4].total_seconds(), 30)
+
+    @patch("paper_recommender.worker.dm_sender")
+    @patch("paper_recommender.worker.db_crud")
+    @patch("paper_recommender.worker.recommend_papers", return_value={"U1", "U2"})
+    def test_successful_job_is_completed(self, mock_recommend, mock_crud, mock_sender):
+        mock_sender.flush.return_value = True
+        calls = MagicMock()
+        calls.attach_mock(mock_sender.flush, "flush")
+        calls.attach_mock(mock_crud.complete_job, "complete_job")
+        worker.run_job({"_id": "job1", "attempts": 1, "message": {}, "urls": []}, "worker1", 5, 30, 10)
+        mock_crud.fail_job.assert_not_called()
+        # the messages of the job are sent before it is completed
+        self.assertEqual([name for name, _, _ in calls.mock_calls], ["flush", "complete_job"])
+        mock_sender.flush.assert_called_once_with(timeout=10, user_ids={"U1", "U2"})
+
+    @patch("paper_recommender.recommender.deliver_recommendations", return_value=0)
+    @patch("paper_recommender.recommender.fan_out_recommendations", return_value=[])
+    @patch("paper_recommender.recommender.db_crud.find_recorded_delivery_keys")
+    def test_retry_skips_recorded_pairs(self, mock_find, mock_fan_out, mock_deliver):
+        targets = [ProjectTarget(f"U{i}", ObjectId(), "description", False) for i in range(2)]
+        paper = ResolvedPaper("https://arxiv.org/abs/1", Paper("url", "title", ["author"], "abstract"), ObjectId())
+        mock_find.return_value = {delivery_key("C1:1.0", targets[0], paper)}
+        recommender.recommend_resolved_papers(targets, MessagePapers(papers=[paper]), "C1:1.0")
+        # only the pair that was not recorded by the earlier attempt is scored
+        self.assertEqual(mock_fan_out.call_args.args[1], [(targets[1], paper)])
+
+
+if __name__ == "__main__":
+    unittest.main()